@@ -14,6 +14,8 @@ const DashboardPage = () => {
   const [error, setError] = useState("");
   const API_URL = "http://127.0.0.1:8000/api/tasks/list/";
   const DELETE_URL = "http://127.0.0.1:8000/api/tasks/delete/";
+  const EVENTS_URL = "http://127.0.0.1:8000/api/async/tasks/events/";
+  const POLL_INTERVAL = 30000;
   const token = localStorage.getItem("accessToken");
   const navigate = useNavigate();
 
@@ -110,6 +112,43 @@ const DashboardPage = () => {
     fetchTasks();
   }, []);
 
+  // Apply task changes pushed by the server instead of polling the list
+  useEffect(() => {
+    if (!token) {
+      return undefined;
+    }
+    const events = new EventSource(`${EVENTS_URL}?access_token=${encodeURIComponent(token)}`);
+    const upsertTask = (event) => {
+      const task = JSON.parse(event.data);
+      setTasks((current) =>
+        current.some((t) => t.id === task.id)
+          ? current.map((t) => (t.id === task.id ? task : t))
+          : [task, ...current]
+      );
+    };
+    events.addEventListener("created", upsertTask);
+    events.addEventListener("updated", upsertTask);
+    events.addEventListener("deleted", (event) => {
+      const { id } = JSON.parse(event.data);
+      setTasks((current) => current.filter((t) => t.id !== id));
+    });
+    // Sent when changes were missed: reload the whole list
+    events.addEventListener("reset", () => fetchTasks());
+    // The stream is gone for good (e.g. 501 when not served over ASGI):
+    // keep the list fresh by refetching it instead
+    let poll = null;
+    events.onerror = () => {
+      if (events.readyState === EventSource.CLOSED && !poll) {
+        fetchTasks();
+        poll = setInterval(fetchTasks, POLL_INTERVAL);
+      }
+    };
+    return () => {
+      events.close();
+      clearInterval(poll);
+    };
+  }, [token]);
+
   // Logout user
   const handleLogout = () => {
     localStorage.removeItem("accessToken");
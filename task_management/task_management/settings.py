@@ -36,12 +36,28 @@ ALLOWED_HOSTS = ['localhost', '127.0.0.1', '172.16.20.76']
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# max-age for media that isn't content-addressed (content-addressed files are immutable)
+MEDIA_CACHE_MAX_AGE = 3600
+
+# Hand media bytes to the front proxy: None, 'x-sendfile' (Apache/lighttpd)
+# or 'x-accel-redirect' (nginx, with an internal location at the prefix below).
+# With None and DEBUG off, Django doesn't route MEDIA_URL: the web server must
+# serve MEDIA_ROOT there itself
+MEDIA_SENDFILE = None
+MEDIA_ACCEL_REDIRECT_PREFIX = '/protected-media/'
+
 # Maximum size of uploaded files (5MB)
 MAX_UPLOAD_SIZE = 5242880
 
 # Allowed file types
 ALLOWED_FILE_TYPES = ['image/jpeg', 'image/jpg', 'image/png']
 
+# Profile photo renditions (longest edge in px) built off-request by tasks/images.py.
+# PROFILE_PHOTO_PROCESSING is 'thread' (background pool) or 'sync' (inline, for tests)
+PROFILE_PHOTO_SIZES = {'small': 64, 'medium': 256, 'large': 1024}
+PROFILE_PHOTO_PROCESSING = 'thread'
+PROFILE_PHOTO_WORKERS = 2
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -59,6 +75,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover every other middleware too
+    'tasks.metrics.RequestMetricsMiddleware',
+    # Before anything that can query, so the router knows the request
+    'tasks.routers.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -99,13 +119,27 @@ REST_FRAMEWORK = {
     ),
 }
 
+# Maximum number of tasks accepted by one request to the bulk task endpoint
+TASK_BULK_MAX_ITEMS = 500
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=15),  # Access token lifetime (short-lived)
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),     # Refresh token lifetime (long-lived)
     'ROTATE_REFRESH_TOKENS': True,                    # Enable rotating refresh tokens (good for security)
     'BLACKLIST_AFTER_ROTATION': True,                 # Blacklist old refresh tokens after they are rotated
+    # Adds is_staff/is_superuser claims so task views can skip the User fetch
+    'TOKEN_OBTAIN_SERIALIZER': 'tasks.authentication.UserTokenObtainPairSerializer',
+    # Checks and records revoked refresh tokens in tasks/revocation.py
+    'TOKEN_REFRESH_SERIALIZER': 'tasks.authentication.UserTokenRefreshSerializer',
 }
 
+# Refresh-token revocation (tasks/revocation.py): how often each process tops
+# up its Bloom filter of revoked tokens, how many tokens it is sized for, and
+# how long a user's token generation ("revoke all") is cached
+TOKEN_REVOCATION_SYNC_SECONDS = 5
+TOKEN_REVOCATION_FILTER_CAPACITY = 1_000_000
+TOKEN_GENERATION_CACHE_TIMEOUT = 60
+
 ROOT_URLCONF = 'task_management.urls'
 
 TEMPLATES = [
@@ -134,15 +168,81 @@ WSGI_APPLICATION = 'task_management.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.mysql',
+        # django.db.backends.mysql plus a per-process connection pool (tasks/db/pool.py)
+        'ENGINE': 'tasks.db.backends.mysql',
         'NAME': 'task_management_db',  # Your database name
         'USER': 'root',                # MySQL user
         'PASSWORD': 'admin',   # MySQL user password
         'HOST': 'localhost',           # Use 'localhost' or IP address of MySQL server
         'PORT': '3306',
+        # Connections are returned to the pool after each request instead of
+        # being kept per thread, so CONN_MAX_AGE must stay 0
+        'CONN_MAX_AGE': 0,
+        'OPTIONS': {
+            'pool': {
+                'max_size': 10,       # Connections per worker process, shared by its threads
+                'timeout': 10,        # Seconds a request waits for a free connection
+                'max_lifetime': 1800, # Reopen connections older than this (below MySQL's wait_timeout)
+                'max_idle': 300,      # Close connections unused for this long
+                'check_after': 30,    # Ping connections idle for longer before reuse
+            },
+        },
+    },
+    # Read replicas are listed in DATABASE_REPLICAS, e.g.:
+    # 'replica1': {
+    #     'ENGINE': 'tasks.db.backends.mysql',
+    #     'NAME': 'task_management_db',
+    #     'USER': 'readonly',
+    #     'PASSWORD': '...',
+    #     'HOST': 'replica1.internal',
+    #     'PORT': '3306',
+    #     'CONN_MAX_AGE': 0,
+    #     'OPTIONS': {'pool': {'max_size': 10, 'timeout': 10}},
+    # },
+    # Task shards are listed in TASK_SHARDS and configured like 'default', e.g.:
+    # 'shard1': {
+    #     'ENGINE': 'tasks.db.backends.mysql',
+    #     'NAME': 'task_management_shard1',
+    #     ...
+    # },
+}
+
+# Reads go to DATABASE_REPLICAS, writes to 'default' (tasks/routers.py). A
+# user's reads stay on the primary for REPLICA_STICKY_SECONDS after they
+# write, and replicas that lag or fail their check are skipped. Task data of
+# users placed on a shard goes there first (tasks/sharding.py)
+DATABASE_ROUTERS = ['tasks.sharding.TaskShardRouter', 'tasks.routers.ReplicaRouter']
+DATABASE_REPLICAS = []
+REPLICA_STICKY_SECONDS = 10  # Longer than replication lag normally gets
+REPLICA_MAX_LAG_SECONDS = 5  # Replicas further behind get no reads
+REPLICA_CHECK_INTERVAL = 10  # Seconds between lag checks of a replica, per process
+
+# Databases holding users' task data; empty keeps everything on 'default'.
+# New users are spread over them by consistent hashing; after changing the
+# list, `manage.py rebalance_task_shards` moves the users it reassigns
+TASK_SHARDS = []
+TASK_SHARD_VNODES = 100  # Ring points per shard
+TASK_SHARD_CACHE_TIMEOUT = 300  # Seconds a user's placement is cached
+TASK_SHARD_MOVE_GRACE = 5  # Seconds for in-flight requests before/after a switch
+TASK_SHARD_MOVE_BATCH_SIZE = 500  # Rows copied per query while moving
+
+# The test suite runs against SQLite: task_management/settings_test.py
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Point 'default' at Redis/Memcached in production to share the cache between workers
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'task-management',
     }
 }
 
+# Cache used for task list pages (tasks/cache.py) and how long pages are kept
+TASK_LIST_CACHE_ALIAS = 'default'
+TASK_LIST_CACHE_TIMEOUT = 300
 
 
 # Password validation
@@ -185,3 +285,41 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Request instrumentation (tasks/metrics.py): fraction of requests measured
+# (0 turns it off), samples kept per route, and how many repeats of one SQL
+# statement in a request get logged as a likely N+1
+REQUEST_METRICS_SAMPLE_RATE = 0
+REQUEST_METRICS_WINDOW = 1000
+REQUEST_METRICS_DUPLICATE_THRESHOLD = 5
+
+# Deadline scanner (tasks/deadlines.py, `manage.py scan_deadlines`)
+DEADLINE_DUE_SOON_DAYS = 1  # Remind about tasks due within this many days
+DEADLINE_OVERDUE_LOOKBACK_DAYS = 7  # How far back the first run looks for overdue tasks
+DEADLINE_SCAN_BATCH_SIZE = 1000
+DEADLINE_NOTIFICATION_SINKS = ['tasks.deadlines.EmailSink']  # Add 'tasks.deadlines.WebhookSink' to POST them too
+DEADLINE_WEBHOOK_URL = None
+
+# Task change feed (tasks/events.py, served at /api/async/tasks/events/). The
+# in-process broker only reaches clients of the same process: run one ASGI
+# worker or point TASK_EVENTS_BROKER at a shared BaseBroker implementation
+TASK_EVENTS_BROKER = 'tasks.events.InProcessBroker'
+TASK_EVENTS_BACKLOG = 1000  # Events kept per user for Last-Event-ID resume
+TASK_EVENTS_MAX_USERS = 10000  # Users whose events are kept, most recent writers first
+TASK_EVENTS_QUEUE_SIZE = 100  # Undelivered events per connection before the client is reset
+TASK_EVENTS_HEARTBEAT = 15  # Seconds between keepalive comments on an idle stream
+TASK_EVENTS_RETRY = 3000  # Reconnect delay (ms) sent to EventSource clients
+
+# Incremental sync (tasks/sync.py, /api/tasks/sync/)
+TASK_SYNC_PAGE_SIZE = 500  # Tasks and tombstones returned per response
+TASK_SYNC_OVERLAP_SECONDS = 30  # Re-sent window covering writes that commit late
+TASK_SYNC_TOMBSTONE_DAYS = 30  # Older cursors get 410 and must resync (`manage.py prune_task_tombstones`)
+
+# Archival of completed tasks (tasks/archive.py, run `manage.py archive_tasks`
+# e.g. nightly)
+TASK_ARCHIVE_AFTER_DAYS = 90  # Completed and untouched for this long
+TASK_ARCHIVE_BATCH_SIZE = 1000  # Tasks moved per transaction
+
+# Reminder emails are printed locally until an SMTP backend is configured
+EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+DEFAULT_FROM_EMAIL = 'tasks@localhost'
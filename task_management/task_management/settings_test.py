@@ -0,0 +1,25 @@
+"""
+Settings for the test suite:
+
+    python manage.py test tasks --settings=task_management.settings_test
+
+Runs against SQLite so it doesn't need a MySQL server. The pooled SQLite
+backend can also be tried locally with a file database and OPTIONS
+{'pool': True}. Tests don't use replicas.
+"""
+
+from .settings import *  # noqa: F401,F403
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'tasks.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'test_db.sqlite3',
+    },
+    # Only used by the sharding tests
+    'shard1': {
+        'ENGINE': 'tasks.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'test_shard1.sqlite3',
+    },
+}
+DATABASE_REPLICAS = []
+TASK_SHARDS = []
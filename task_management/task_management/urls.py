@@ -17,12 +17,24 @@ Including another URLconf
 # task_management/urls.py
 
 from django.contrib import admin
-from django.urls import path, include
+import re
+
+from django.urls import path, include, re_path
 from django.conf import settings
-from django.conf.urls.static import static
+
+from tasks.media import serve_media
+
+# Cache headers, conditional/range requests and X-Sendfile (tasks/media.py)
+media_urlpatterns = [
+    re_path(r'^%s(?P<path>.*)$' % re.escape(settings.MEDIA_URL.lstrip('/')), serve_media, name='media'),
+]
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('tasks.urls')),  # Include the tasks app URLs
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+]
 
+# In production the front proxy sends media (MEDIA_SENDFILE) once serve_media
+# has checked the request; without it Django only serves media under DEBUG
+if settings.DEBUG or settings.MEDIA_SENDFILE:
+    urlpatterns += media_urlpatterns
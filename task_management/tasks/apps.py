@@ -7,3 +7,8 @@ class TasksConfig(AppConfig):
 
     def ready(self):
         import tasks.models  # This imports the signals
+        import tasks.search  # Keeps the task search index up to date
+        import tasks.cache  # Invalidates cached task lists on writes
+        import tasks.stats  # Maintains the TaskStats counters
+        import tasks.events  # Publishes task changes to the event stream
+        import tasks.sync  # Records tombstones of deleted tasks
@@ -0,0 +1,116 @@
+# tasks/archive.py
+#
+# Hot/cold split of the task table. `manage.py archive_tasks` moves tasks that
+# have been completed for TASK_ARCHIVE_AFTER_DAYS (not updated since) into
+# ArchivedTask, in batches of TASK_ARCHIVE_BATCH_SIZE, so the Task table and
+# its indexes only hold the tasks users work with.
+#
+# Archiving deletes the Task rows through the usual receivers: their search
+# terms go, the TaskStats counters (and the dashboard totals built on them)
+# stop counting them, sync clients get tombstones and list caches are
+# invalidated. The list still returns them with ?include_archived=true, and
+# restore_tasks() puts them back under the same id, as an update.
+
+from collections import Counter
+from datetime import timedelta
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .cache import invalidate_task_list
+from .events import publish_tasks_saved
+from .models import ArchivedTask, Task, TaskTombstone, UserShard
+from .rebalance import insert_rows
+from .search import index_tasks, tokenize
+from .sharding import all_shards, get_shard_for_write, sharding_enabled
+from .stats import batched_stats, tasks_created
+from .sync import batched_tombstones
+
+# Columns shared by Task and ArchivedTask
+TASK_FIELDS = ['id', 'user_id', 'title', 'description', 'priority', 'status', 'deadline', 'created_at', 'updated_at']
+
+
+def get_setting(name, default):
+    return getattr(settings, name, default)
+
+
+def archivable_tasks(days=None):
+    days = get_setting('TASK_ARCHIVE_AFTER_DAYS', 90) if days is None else days
+    return Task.objects.filter(status='completed', updated_at__lt=timezone.now() - timedelta(days=days))
+
+
+def archive_tasks(days=None, batch_size=None):
+    """Archive the tasks completed more than `days` ago. Returns {shard: count}."""
+    batch_size = batch_size or get_setting('TASK_ARCHIVE_BATCH_SIZE', 1000)
+    tasks = archivable_tasks(days)
+    if sharding_enabled():
+        # Writes for users being moved to another shard are refused; they are
+        # archived by the next run
+        moving = UserShard.objects.using(DEFAULT_DB_ALIAS).filter(moving=True).values_list('user_id', flat=True)
+        tasks = tasks.exclude(user_id__in=list(moving))
+
+    archived = Counter()
+    for shard in all_shards():
+        # Walk the primary key once instead of rescanning old tasks that
+        # aren't completed on every batch
+        last_id = 0
+        while True:
+            ids = list(
+                tasks.using(shard).filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            archived[shard] += archive_batch(tasks.using(shard), ids, shard)
+            last_id = ids[-1]
+    return dict(archived)
+
+
+def archive_batch(tasks, ids, using):
+    with transaction.atomic(using=using):
+        # Re-read under lock: a task reopened since the scan stays
+        batch = list(tasks.select_for_update().filter(id__in=ids).values(*TASK_FIELDS))
+        ArchivedTask.objects.using(using).bulk_create([ArchivedTask(**row) for row in batch])
+        with batched_stats(), batched_tombstones():
+            Task.objects.using(using).filter(id__in=[row['id'] for row in batch]).delete()
+    return len(batch)
+
+
+def restore_tasks(user_id, ids):
+    """Move the user's archived tasks with these ids back to Task. Returns the restored tasks."""
+    using = get_shard_for_write(user_id)
+    now = timezone.now()
+    with transaction.atomic(using=using):
+        archived = ArchivedTask.objects.filter(user_id=user_id, id__in=ids).select_for_update()
+        tasks = [
+            Task(**{name: getattr(row, name) for name in TASK_FIELDS}) for row in archived.using(using)
+        ]
+        if not tasks:
+            return []
+        for task in tasks:
+            # An update as far as sync is concerned, which also supersedes the
+            # tombstone left by archiving
+            task.updated_at = now
+        # Raw insert: created_at keeps its value instead of auto_now_add's
+        insert_rows(Task, tasks, using)
+        restored = [task.pk for task in tasks]
+        ArchivedTask.objects.using(using).filter(id__in=restored).delete()
+        TaskTombstone.objects.using(using).filter(user_id=user_id, task_id__in=restored).delete()
+
+        index_tasks(tasks)
+        tasks_created(tasks)
+        publish_tasks_saved(tasks, 'created', using)
+        invalidate_task_list(user_id, using)
+    return tasks
+
+
+def search_archived(queryset, query):
+    """?search= over archived tasks. There is no index for them, so this scans
+    the user's archive: a match is any query word in the title or description."""
+    terms = set(tokenize(query))
+    if not terms:
+        return queryset.none()
+    return queryset.filter(reduce(or_, (Q(title__icontains=term) | Q(description__icontains=term) for term in terms)))
@@ -0,0 +1,174 @@
+# tasks/async_views.py
+#
+# Async variants of the task list/create/update/delete endpoints for ASGI
+# deployments. DRF's generic views are sync-only, so these are plain Django
+# async views that reuse the DRF pieces that don't touch the database
+# (StatelessJWTAuthentication, permission classes, TaskSerializer validation)
+# and run every query through Django's async ORM. The event stream holds its
+# connection open, so it must be served by an ASGI server (uvicorn); under
+# WSGI (runserver) it answers 501 and clients fall back to refetching.
+
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions, status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.request import Request
+
+from .authentication import EventStreamJWTAuthentication, StatelessJWTAuthentication
+from .events import get_broker, reset_event
+from .filters import TaskFilter
+from .models import Task
+from .pagination import TaskKeysetPagination
+from .serializers import TaskSerializer, task_row_serializer
+
+
+def json_response(data, status=status.HTTP_200_OK):
+    return JsonResponse(data, status=status, encoder=DjangoJSONEncoder, safe=False)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncTaskView(View):
+    authentication_classes = [StatelessJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    async def dispatch(self, request, *args, **kwargs):
+        # Wrap the request so DRF authenticators/permissions can read it
+        self.request = Request(request, authenticators=[auth() for auth in self.authentication_classes])
+        try:
+            self.check_permissions(self.request)
+            return await super().dispatch(request, *args, **kwargs)
+        except exceptions.APIException as exc:
+            return self.handle_exception(exc)
+
+    def check_permissions(self, request):
+        for permission in [permission() for permission in self.permission_classes]:
+            if not permission.has_permission(request, self):
+                if request.successful_authenticator is None:
+                    raise exceptions.NotAuthenticated()
+                raise exceptions.PermissionDenied()
+
+    def handle_exception(self, exc):
+        data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+        response = json_response(data, status=exc.status_code)
+        if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+            response.status_code = status.HTTP_401_UNAUTHORIZED
+            response['WWW-Authenticate'] = self.authentication_classes[0]().authenticate_header(self.request)
+        return response
+
+    def get_data(self):
+        try:
+            return json.loads(self.request._request.body or b'{}')
+        except ValueError:
+            raise exceptions.ParseError()
+
+    def get_queryset(self):
+        return Task.objects.filter(user_id=self.request.user.pk)
+
+    async def get_object(self, pk):
+        try:
+            return await self.get_queryset().aget(pk=pk)
+        except Task.DoesNotExist:
+            raise exceptions.NotFound()
+
+    def http_method_not_allowed(self, request, *args, **kwargs):
+        raise exceptions.MethodNotAllowed(request.method)
+
+
+# Async Task List View: keyset-paginated list of the logged-in user's tasks
+class AsyncTaskListView(AsyncTaskView):
+    async def get(self, request):
+        filterset = TaskFilter(self.request.query_params, queryset=self.get_queryset(), request=self.request)
+        # Validating the 'user' filter may query the database
+        if not await sync_to_async(filterset.is_valid)():
+            raise exceptions.ValidationError(filterset.errors)
+
+        paginator = TaskKeysetPagination()
+        queryset = filterset.qs.values(*task_row_serializer.fields)
+        page = await paginator.apaginate_queryset(queryset, self.request)
+        return json_response(paginator.get_paginated_data(task_row_serializer.many(page)))
+
+
+# Async Task Create View
+class AsyncTaskCreateView(AsyncTaskView):
+    async def post(self, request):
+        serializer = TaskSerializer(data=self.get_data())
+        serializer.is_valid(raise_exception=True)
+        task = await Task.objects.acreate(user_id=self.request.user.pk, **serializer.validated_data)
+        return json_response(TaskSerializer(task).data, status=status.HTTP_201_CREATED)
+
+
+# Async Task Update/Delete View: PUT/PATCH to update, DELETE to remove a task
+class AsyncTaskDetailView(AsyncTaskView):
+    async def update(self, pk, partial):
+        task = await self.get_object(pk)
+        serializer = TaskSerializer(task, data=self.get_data(), partial=partial)
+        serializer.is_valid(raise_exception=True)
+        for name, value in serializer.validated_data.items():
+            setattr(task, name, value)
+        await task.asave()
+        return json_response(TaskSerializer(task).data)
+
+    async def put(self, request, pk):
+        return await self.update(pk, partial=False)
+
+    async def patch(self, request, pk):
+        return await self.update(pk, partial=True)
+
+    async def delete(self, request, pk):
+        task = await self.get_object(pk)
+        await task.adelete()
+        return HttpResponse(status=status.HTTP_204_NO_CONTENT)
+
+
+# Async Task Event Stream View: Server-Sent Events for changes to the user's tasks
+class AsyncTaskEventStreamView(AsyncTaskView):
+    authentication_classes = [EventStreamJWTAuthentication]
+
+    async def get(self, request):
+        if not isinstance(request, ASGIRequest):
+            # WSGI drains the whole (endless) stream before sending any of it
+            return json_response(
+                {'detail': 'Event stream requires an ASGI server.'}, status=status.HTTP_501_NOT_IMPLEMENTED
+            )
+        # EventSource resends the last id it saw in Last-Event-ID on reconnect
+        last_event_id = request.headers.get('Last-Event-ID') or self.request.query_params.get('last_event_id')
+        response = StreamingHttpResponse(
+            self.stream(self.request.user.pk, last_event_id), content_type='text/event-stream'
+        )
+        response['Cache-Control'] = 'no-cache'
+        # Stop nginx from buffering the stream
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    async def stream(self, user_id, last_event_id):
+        broker = get_broker()
+        subscription = broker.subscribe(user_id, last_event_id)
+        heartbeat = getattr(settings, 'TASK_EVENTS_HEARTBEAT', 15)
+        try:
+            yield f"retry: {getattr(settings, 'TASK_EVENTS_RETRY', 3000)}\n\n"
+            if subscription.backlog is None:
+                # Missed events can't be replayed: refetch, then carry on live
+                yield reset_event(subscription.cursor)['message']
+            else:
+                for event in subscription.backlog:
+                    yield event['message']
+            while True:
+                event = await subscription.get(heartbeat)
+                if event is None:
+                    # Comment line: keeps proxies from closing an idle connection
+                    yield ': keepalive\n\n'
+                    continue
+                yield event['message']
+                if event['type'] == 'reset':
+                    # Too slow to keep up; the client reconnects from the reset's id
+                    return
+        finally:
+            broker.unsubscribe(subscription)
@@ -0,0 +1,105 @@
+# tasks/authentication.py
+
+from django.contrib.auth.models import User
+from django.utils.functional import cached_property
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken, TokenError
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .revocation import GENERATION_CLAIM, check_token, get_generation, revoke_token
+
+
+# Refresh token carrying the role claims StatelessJWTAuthentication reads.
+# Access tokens (including ones minted by /api/refresh/) copy these claims.
+# Revocation is checked against tasks/revocation.py whenever a token string
+# is loaded; blacklist() is what simplejwt calls on rotation and logout.
+class UserRefreshToken(RefreshToken):
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token['is_staff'] = user.is_staff
+        token['is_superuser'] = user.is_superuser
+        token[GENERATION_CLAIM] = get_generation(user.pk)
+        return token
+
+    def verify(self):
+        super().verify()
+        reason = check_token(self)
+        if reason:
+            raise TokenError(reason)
+
+    def blacklist(self):
+        # A lost race: the token was used or revoked since verify()
+        if not revoke_token(self):
+            raise TokenError('Token is blacklisted')
+
+
+# Used by TokenObtainPairView (/api/login/) via SIMPLE_JWT['TOKEN_OBTAIN_SERIALIZER']
+class UserTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = UserRefreshToken
+
+
+# Used by TokenRefreshView (/api/refresh/) via SIMPLE_JWT['TOKEN_REFRESH_SERIALIZER']
+class UserTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = UserRefreshToken
+
+
+class LazyTokenUser(TokenUser):
+    """
+    User built from the access token claims (id, is_staff, is_superuser).
+    Any other attribute (email, profile, ...) loads the real User row once.
+    """
+
+    @cached_property
+    def id(self):
+        # Simple JWT stores the user id claim as a string
+        return User._meta.pk.to_python(self.token[api_settings.USER_ID_CLAIM])
+
+    @cached_property
+    def user(self):
+        try:
+            return User.objects.get(pk=self.pk)
+        except User.DoesNotExist:
+            raise AuthenticationFailed('User not found', code='user_not_found')
+
+    @cached_property
+    def username(self):
+        return self.token.get('username') or self.user.username
+
+    def __getattr__(self, attr):
+        # Only reached for attributes TokenUser doesn't define itself
+        if attr.startswith('_'):
+            raise AttributeError(attr)
+        return getattr(self.user, attr)
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that trusts the token claims instead of fetching the
+    User on every request. Views using it must scope queries by
+    ``request.user.pk`` rather than passing ``request.user`` to the ORM.
+    A deactivated user keeps access until their access token expires.
+    """
+
+    def get_user(self, validated_token):
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            raise InvalidToken('Token contained no recognizable user identification')
+        return LazyTokenUser(validated_token)
+
+
+class EventStreamJWTAuthentication(StatelessJWTAuthentication):
+    """
+    Also accepts the access token as ``?access_token=``, since browsers'
+    EventSource can't send an Authorization header. Only for the event
+    stream: tokens in URLs end up in access logs.
+    """
+
+    def authenticate(self, request):
+        raw_token = request.query_params.get('access_token')
+        if raw_token is None or self.get_header(request) is not None:
+            return super().authenticate(request)
+        validated_token = self.get_validated_token(raw_token.encode('utf-8'))
+        return self.get_user(validated_token), validated_token
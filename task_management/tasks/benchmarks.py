@@ -0,0 +1,147 @@
+# tasks/benchmarks.py
+#
+# Shared pieces of the benchmark commands: seed_benchmark_data fills the
+# database with a reproducible data set, run_benchmarks times individual
+# components and load_test drives the real endpoints with concurrency. Both
+# write JSON reports that can be diffed between commits with --compare.
+
+import json
+import platform
+import random
+import statistics
+import time
+from datetime import date, timedelta
+
+import django
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Q
+
+from .bulk import bulk_create_tasks
+from .models import Task, TaskTombstone, UserProfile
+from .sharding import each_shard
+from .sync import batched_tombstones
+
+USERNAME_PREFIX = 'bench-user-'
+ADMIN_USERNAME = 'bench-admin'
+WORDS = (
+    'report review deploy invoice meeting design budget release audit backup '
+    'migrate refactor client server draft plan hire onboard fix test'
+).split()
+
+
+def bench_users():
+    return User.objects.filter(username__startswith=USERNAME_PREFIX).order_by('id')
+
+
+def clear_data():
+    # Tasks, search terms and counters go with their users
+    users = User.objects.filter(Q(username__startswith=USERNAME_PREFIX) | Q(username=ADMIN_USERNAME))
+    user_ids = list(users.values_list('id', flat=True))
+    with transaction.atomic(), batched_tombstones():
+        users.delete()
+    # Nobody is left to sync these
+    for tombstones in each_shard(TaskTombstone.objects.filter(user_id__in=user_ids)):
+        tombstones.delete()
+
+
+def seed_data(users, tasks_per_user, seed=0, batch_size=1000):
+    """Create users x tasks_per_user tasks; the same seed gives the same rows."""
+    rng = random.Random(seed)
+    statuses = [choice for choice, _ in Task.STATUS_CHOICES]
+    priorities = [choice for choice, _ in Task.PRIORITY_CHOICES]
+
+    with transaction.atomic():
+        User.objects.get_or_create(username=ADMIN_USERNAME, defaults={'is_staff': True, 'is_superuser': True})
+        existing = set(bench_users().values_list('username', flat=True))
+        usernames = [f'{USERNAME_PREFIX}{i}' for i in range(users)]
+        new_users = [User(username=name, email=f'{name}@example.com') for name in usernames if name not in existing]
+        for user in new_users:
+            user.set_unusable_password()
+        # bulk_create skips the profile signal; MySQL doesn't return the ids
+        User.objects.bulk_create(new_users, batch_size=batch_size)
+        created = User.objects.filter(username__in=[user.username for user in new_users])
+        UserProfile.objects.bulk_create([UserProfile(user=user) for user in created], batch_size=batch_size)
+
+        user_ids = list(User.objects.filter(username__in=usernames).values_list('id', flat=True))
+        batch = []
+        for user_id in user_ids:
+            for i in range(tasks_per_user):
+                title = ' '.join(rng.choices(WORDS, k=3)).capitalize()
+                batch.append(Task(
+                    user_id=user_id,
+                    title=f'{title} {i}',
+                    description=' '.join(rng.choices(WORDS, k=12)),
+                    priority=rng.choice(priorities),
+                    status=rng.choice(statuses),
+                    deadline=date(2030, 1, 1) + timedelta(days=rng.randrange(-365, 365)),
+                ))
+                if len(batch) >= batch_size:
+                    bulk_create_tasks(batch, fetch_ids=False)
+                    batch = []
+        bulk_create_tasks(batch, fetch_ids=False)
+    return len(user_ids)
+
+
+def time_calls(func, iterations, warmup=1):
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def summarize(samples, wall_time=None):
+    samples = sorted(samples)
+    quantiles = statistics.quantiles(samples, n=100) if len(samples) > 1 else samples * 99
+    summary = {
+        'n': len(samples),
+        'mean_ms': round(statistics.fmean(samples) * 1000, 3),
+        'p50_ms': round(quantiles[49] * 1000, 3),
+        'p95_ms': round(quantiles[94] * 1000, 3),
+        'p99_ms': round(quantiles[98] * 1000, 3),
+    }
+    if wall_time:
+        summary['throughput_rps'] = round(len(samples) / wall_time, 1)
+    return summary
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'bench_users': bench_users().count(),
+        'tasks': sum(tasks.count() for tasks in each_shard(Task.objects.all())),
+    }
+
+
+def write_report(path, kind, results, options):
+    report = {'kind': kind, 'environment': environment(), 'options': options, 'results': results}
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+
+
+def compare_reports(baseline_path, results, metric='p50_ms'):
+    """Rows of (name, baseline, current, change %) for results in both reports."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)['results']
+    rows = []
+    for name, summary in results.items():
+        before = baseline.get(name, {}).get(metric)
+        after = summary.get(metric)
+        if before is None or after is None:
+            continue
+        change = (after - before) / before * 100 if before else 0.0
+        rows.append((name, before, after, change))
+    return rows
+
+
+def format_comparison(rows, metric='p50_ms'):
+    lines = [f'{"benchmark":<28} {"baseline " + metric:>18} {"current":>10} {"change":>8}']
+    for name, before, after, change in rows:
+        lines.append(f'{name:<28} {before:>18.3f} {after:>10.3f} {change:>+7.1f}%')
+    return '\n'.join(lines)
@@ -0,0 +1,84 @@
+# tasks/bulk.py
+
+from django.db import DatabaseError, connections, router, transaction
+
+from .cache import invalidate_task_list
+from .events import publish_tasks_saved
+from .models import Task
+from .search import get_search_backend, index_tasks
+from .sharding import group_by_shard
+from .stats import tasks_created, tasks_updated
+
+# bulk_create/bulk_update don't send post_save, so these wrappers do the
+# bookkeeping the Task signal receivers would otherwise have done. With
+# TASK_SHARDS set, each shard's tasks are written in a transaction of their own.
+
+
+def assign_inserted_ids(tasks, using):
+    """Set the ids of tasks written by one multi-row INSERT on a backend that
+    doesn't return them (MySQL).
+
+    InnoDB hands the rows of a single INSERT consecutive auto-increment values
+    (innodb_autoinc_lock_mode 1 or 2), starting at LAST_INSERT_ID() and
+    auto_increment_increment apart (shards use it for their id ranges). The
+    ids are checked against the stored rows, so a server where that doesn't
+    hold fails the write instead of mislabelling it.
+    """
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            cursor.execute('SELECT LAST_INSERT_ID(), @@auto_increment_increment')
+            first, step = cursor.fetchone()
+        else:
+            # SQLite reports the last row instead
+            cursor.execute('SELECT last_insert_rowid()')
+            first, step = cursor.fetchone()[0] - len(tasks) + 1, 1
+    ids = range(first, first + len(tasks) * step, step)
+    stored = Task.objects.using(using).filter(pk__in=ids).order_by('pk')
+    if list(stored.values_list('user_id', 'title')) != [(task.user_id, task.title) for task in tasks]:
+        raise DatabaseError('Bulk-inserted task ids are not consecutive')
+    for task, pk in zip(tasks, ids):
+        task.pk = pk
+
+
+def bulk_create_tasks(tasks, batch_size=None, fetch_ids=True):
+    """bulk_create() plus bookkeeping, one multi-row INSERT per batch.
+
+    Pass fetch_ids=False when the caller doesn't use the new ids (imports,
+    seeding): MySQL then skips the extra queries that recover them, and the
+    tasks aren't published as events.
+    """
+    # The search index rows reference the tasks by id
+    fetch_ids = fetch_ids or get_search_backend() == 'index'
+    for shard, group in group_by_shard(tasks).items():
+        using = shard or router.db_for_write(Task)
+        returns_ids = connections[using].features.can_return_rows_from_bulk_insert
+        with transaction.atomic(using=using, savepoint=False):
+            if fetch_ids and not returns_ids:
+                size = batch_size or len(group)
+                for start in range(0, len(group), size):
+                    batch = group[start:start + size]
+                    Task.objects.using(using).bulk_create(batch)
+                    assign_inserted_ids(batch, using)
+            else:
+                Task.objects.using(using).bulk_create(group, batch_size=batch_size)
+            if fetch_ids or returns_ids:
+                index_tasks(group)
+                publish_tasks_saved(group, 'created', using)
+            tasks_created(group)
+            for user_id in {task.user_id for task in group}:
+                invalidate_task_list(user_id, using)
+    return tasks
+
+
+def bulk_update_tasks(tasks, fields):
+    for shard, group in group_by_shard(tasks).items():
+        with transaction.atomic(using=shard, savepoint=False):
+            Task.objects.using(shard).bulk_update(group, fields)
+            if {'title', 'description'} & set(fields):
+                index_tasks(group)
+            tasks_updated(group)
+            publish_tasks_saved(group, 'updated', shard)
+            for user_id in {task.user_id for task in group}:
+                invalidate_task_list(user_id, shard)
+    return tasks
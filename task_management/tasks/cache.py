@@ -0,0 +1,84 @@
+# tasks/cache.py
+
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Task
+
+# Cached task list pages are keyed by a per-user version number. Any write to
+# one of the user's tasks bumps the version, which orphans every cached page
+# for that user at once (they simply expire) instead of deleting them.
+
+
+def get_task_cache():
+    return caches[getattr(settings, 'TASK_LIST_CACHE_ALIAS', 'default')]
+
+
+def get_cache_timeout():
+    return getattr(settings, 'TASK_LIST_CACHE_TIMEOUT', 300)
+
+
+def version_key(user_id):
+    return f'tasks:list-version:{user_id}'
+
+
+def new_version():
+    # Time based, so a version evicted from the cache never restarts at a
+    # number that older cached pages were stored under
+    return time.time_ns()
+
+
+def get_task_list_version(user_id):
+    cache = get_task_cache()
+    version = cache.get(version_key(user_id))
+    if version is None:
+        version = new_version()
+        if not cache.add(version_key(user_id), version, timeout=None):
+            version = cache.get(version_key(user_id), version)
+    return version
+
+
+def bump_task_list_version(user_id):
+    cache = get_task_cache()
+    try:
+        cache.incr(version_key(user_id))
+    except ValueError:
+        cache.set(version_key(user_id), new_version(), timeout=None)
+
+
+def invalidate_task_list(user_id, using=None):
+    """Invalidate the user's cached pages now and again once the write commits
+    (on database using, the user's shard when sharded).
+
+    The second bump stops a reader that ran between the write and the commit
+    from keeping its (pre-commit) result under the new version.
+    """
+    bump_task_list_version(user_id)
+    transaction.on_commit(lambda: bump_task_list_version(user_id), using=using)
+
+
+def task_list_cache_key(request, user_id, version):
+    params = sorted(
+        (key, value)
+        for key in request.query_params
+        for value in request.query_params.getlist(key)
+    )
+    # The host is part of the key because pagination links are absolute URLs
+    digest = hashlib.sha1(repr((request.get_host(), params)).encode('utf-8')).hexdigest()
+    return f'tasks:list:{user_id}:{version}:{digest}'
+
+
+def task_list_etag(cache_key):
+    return '"%s"' % hashlib.sha1(cache_key.encode('utf-8')).hexdigest()
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+def invalidate_task_list_on_write(sender, instance, using, **kwargs):
+    invalidate_task_list(instance.user_id, using)
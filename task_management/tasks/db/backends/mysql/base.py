@@ -0,0 +1,23 @@
+# tasks/db/backends/mysql/base.py
+#
+# django.db.backends.mysql with connection pooling (tasks/db/pool.py):
+# ENGINE 'tasks.db.backends.mysql' and OPTIONS {'pool': {...}}.
+
+from django.db.backends.mysql.base import DatabaseWrapper as MySQLDatabaseWrapper
+
+from tasks.db.pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, MySQLDatabaseWrapper):
+    @staticmethod
+    def check_connection(connection):
+        try:
+            connection.ping()
+        except Exception:
+            return False
+        return True
+
+    @staticmethod
+    def reset_connection(connection):
+        connection.rollback()
+
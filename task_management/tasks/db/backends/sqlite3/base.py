@@ -0,0 +1,29 @@
+# tasks/db/backends/sqlite3/base.py
+#
+# django.db.backends.sqlite3 with connection pooling (tasks/db/pool.py), so
+# the pool can be exercised locally without a MySQL server. In-memory
+# databases aren't pooled: closing their connection is already a no-op.
+
+from django.db.backends.sqlite3.base import DatabaseWrapper as SQLiteDatabaseWrapper
+
+from tasks.db.pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, SQLiteDatabaseWrapper):
+    @property
+    def pool(self):
+        if self.is_in_memory_db():
+            return None
+        return super().pool
+
+    @staticmethod
+    def check_connection(connection):
+        try:
+            connection.execute('SELECT 1')
+        except Exception:
+            return False
+        return True
+
+    @staticmethod
+    def reset_connection(connection):
+        connection.rollback()
@@ -0,0 +1,305 @@
+# tasks/db/pool.py
+#
+# Connection pooling for database backends without a native pool (Django 5.1
+# only pools PostgreSQL). Configured the same way, through
+# DATABASES[alias]['OPTIONS']['pool'], and used by the backends in
+# tasks/db/backends. With CONN_MAX_AGE = 0, Django "closes" the connection at
+# the end of every request; here that returns it to a per-process pool, so
+# the next request reuses it instead of paying for a TCP and auth handshake.
+#
+# The pool holds at most max_size connections per process, however many
+# threads a worker runs. When all of them are in use, a checkout waits up to
+# timeout seconds. Connections are closed after max_lifetime seconds, or
+# after max_idle seconds unused. A connection idle for longer than
+# check_after seconds is pinged before it is handed out.
+
+import threading
+import time
+from functools import partial
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.utils import OperationalError
+
+DEFAULT_POOL_OPTIONS = {
+    'max_size': 10,
+    'timeout': 30,
+    'max_lifetime': 3600,
+    'max_idle': 600,
+    'check_after': 30,
+}
+
+
+class PoolTimeout(OperationalError):
+    pass
+
+
+class PoolEntry:
+    __slots__ = ('connection', 'created', 'last_used', 'initialized')
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.created = self.last_used = time.monotonic()
+        # Whether the backend's per-session setup has run on the connection
+        self.initialized = False
+
+
+class ConnectionPool:
+    """
+    A bounded pool of DB-API connections. check(connection) and
+    reset(connection) come from the backend. check tells whether an idle
+    connection still works. reset rolls back a connection returned in the
+    middle of a transaction and raises if it can't.
+    """
+
+    def __init__(self, max_size=10, timeout=30, max_lifetime=3600, max_idle=600, check_after=30,
+                 check=None, reset=None):
+        if max_size < 1:
+            raise ImproperlyConfigured('The connection pool needs a max_size of at least 1')
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.check_after = check_after
+        self.check = check
+        self.reset = reset
+        self.condition = threading.Condition()
+        self.idle = []
+        self.in_use = {}
+        self.size = 0
+        self.counters = dict.fromkeys(
+            ['checkouts', 'created', 'reused', 'closed', 'failed_checks', 'waits', 'timeouts'], 0
+        )
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    def expired(self, entry, now):
+        return now - entry.created >= self.max_lifetime or now - entry.last_used >= self.max_idle
+
+    def needs_check(self, entry):
+        # A connection used moments ago is almost certainly still alive
+        return self.check is not None and time.monotonic() - entry.last_used >= self.check_after
+
+    def acquire(self, connect):
+        """A connection from the pool, opened with connect() if none is idle."""
+        started = time.monotonic()
+        deadline = started + self.timeout
+        waited = False
+        while True:
+            entry, stale = None, []
+            with self.condition:
+                while True:
+                    now = time.monotonic()
+                    while self.idle:
+                        # Most recently used first: the warmest connection
+                        candidate = self.idle.pop()
+                        if self.expired(candidate, now):
+                            stale.append(candidate)
+                        else:
+                            entry = candidate
+                            break
+                    self.size -= len(stale)
+                    if entry is not None or self.size < self.max_size:
+                        break
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self.counters['timeouts'] += 1
+                        self.record_wait(now - started)
+                        raise PoolTimeout(
+                            f'No database connection became free within {self.timeout}s '
+                            f'({self.max_size} in use)'
+                        )
+                    waited = True
+                    self.condition.wait(remaining)
+                if entry is None:
+                    # Reserve the slot before connecting outside the lock
+                    self.size += 1
+            self.close_entries(stale)
+
+            if entry is None:
+                try:
+                    entry = PoolEntry(connect())
+                except BaseException:
+                    self.free_slot()
+                    raise
+                self.count('created')
+            elif self.needs_check(entry) and not self.check(entry.connection):
+                self.count('failed_checks')
+                self.close_entries([entry])
+                self.free_slot()
+                continue
+            else:
+                self.count('reused')
+
+            with self.condition:
+                self.in_use[id(entry.connection)] = entry
+                self.counters['checkouts'] += 1
+                if waited:
+                    self.counters['waits'] += 1
+                self.record_wait(time.monotonic() - started)
+            return entry.connection
+
+    def get_entry(self, connection):
+        with self.condition:
+            return self.in_use.get(id(connection))
+
+    def release(self, connection, discard=False, reset=False):
+        """Return a connection. discard closes it instead (unknown state);
+        reset means it may be inside a transaction."""
+        with self.condition:
+            entry = self.in_use.pop(id(connection), None)
+        if entry is None:
+            # Not ours (e.g. the pool was replaced): just close it
+            self.close_entries([PoolEntry(connection)])
+            return
+        now = time.monotonic()
+        if not discard and now - entry.created < self.max_lifetime:
+            try:
+                if reset and self.reset:
+                    self.reset(connection)
+            except Exception:
+                discard = True
+        else:
+            discard = True
+
+        if discard:
+            self.close_entries([entry])
+            self.free_slot()
+            return
+        entry.last_used = now
+        with self.condition:
+            self.idle.append(entry)
+            self.condition.notify()
+
+    def free_slot(self):
+        with self.condition:
+            self.size -= 1
+            self.condition.notify()
+
+    def count(self, name, amount=1):
+        with self.condition:
+            self.counters[name] += amount
+
+    def close_entries(self, entries):
+        if entries:
+            self.count('closed', len(entries))
+        for entry in entries:
+            try:
+                entry.connection.close()
+            except Exception:
+                pass
+
+    def record_wait(self, seconds):
+        self.wait_time += seconds
+        self.max_wait_time = max(self.max_wait_time, seconds)
+
+    def close(self):
+        with self.condition:
+            idle, self.idle = self.idle, []
+            self.size -= len(idle)
+        self.close_entries(idle)
+
+    def stats(self):
+        with self.condition:
+            checkouts = self.counters['checkouts']
+            return {
+                'max_size': self.max_size,
+                'size': self.size,
+                'in_use': len(self.in_use),
+                'idle': len(self.idle),
+                **self.counters,
+                'avg_wait_ms': round(self.wait_time / checkouts * 1000, 3) if checkouts else 0.0,
+                'max_wait_ms': round(self.max_wait_time * 1000, 3),
+            }
+
+
+class PooledDatabaseWrapperMixin:
+    """
+    DatabaseWrapper mixin drawing connections from a ConnectionPool when
+    OPTIONS['pool'] is set (True or a dict of ConnectionPool options).
+    Subclasses provide check_connection() and reset_connection().
+    """
+
+    _connection_pools = {}
+    _pools_lock = threading.Lock()
+
+    @property
+    def pool(self):
+        options = self.settings_dict['OPTIONS'].get('pool')
+        if not options:
+            return None
+        if self.alias not in self._connection_pools:
+            if self.settings_dict.get('CONN_MAX_AGE', 0) != 0:
+                raise ImproperlyConfigured("Pooling doesn't support persistent connections (CONN_MAX_AGE).")
+            options = {**DEFAULT_POOL_OPTIONS, **(options if isinstance(options, dict) else {})}
+            with self._pools_lock:
+                self._connection_pools.setdefault(self.alias, ConnectionPool(
+                    check=self.check_connection, reset=self.reset_connection, **options
+                ))
+        return self._connection_pools[self.alias]
+
+    def close_pool(self):
+        pool = self._connection_pools.pop(self.alias, None)
+        if pool is not None:
+            pool.close()
+
+    def get_connection_params(self):
+        # The backend passes OPTIONS to the driver's connect()
+        params = super().get_connection_params()
+        params.pop('pool', None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        if pool is None:
+            return super().get_new_connection(conn_params)
+        return pool.acquire(partial(super().get_new_connection, conn_params))
+
+    def init_connection_state(self):
+        # Session settings survive on a pooled connection: only set them up
+        # on connections the pool just opened
+        entry = self.pool.get_entry(self.connection) if self.pool is not None else None
+        if entry is None or not entry.initialized:
+            super().init_connection_state()
+        if entry is not None:
+            entry.initialized = True
+
+    def _close(self):
+        pool = self.pool
+        if pool is None or self.connection is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            # Django resets its own transaction state on the next connect();
+            # the pool rolls back the connection's
+            pool.release(
+                self.connection,
+                discard=self.errors_occurred and not self.is_usable(),
+                reset=self.in_atomic_block or not self.autocommit,
+            )
+        # Closing inside an atomic block keeps self.connection; it's no longer ours
+        self.connection = None
+
+    def close_if_health_check_failed(self):
+        if self.pool is not None:
+            # The pool checks connections when handing them out
+            return
+        return super().close_if_health_check_failed()
+
+    @staticmethod
+    def check_connection(connection):
+        raise NotImplementedError
+
+    @staticmethod
+    def reset_connection(connection):
+        raise NotImplementedError
+
+
+def get_pool_stats(connections):
+    """{alias: pool stats} for every configured database that uses a pool."""
+    stats = {}
+    for alias in connections:
+        wrapper = connections[alias]
+        pool = getattr(wrapper, 'pool', None)
+        if pool is not None:
+            stats[alias] = pool.stats()
+    return stats
+
@@ -0,0 +1,207 @@
+# tasks/deadlines.py
+#
+# Deadline scanner: finds open tasks that are due soon or overdue and sends
+# one notification per user and batch through the configured sinks.
+#
+# Each run only reads the deadline range added since the previous run
+# (DeadlineScan.covered_until, via the deadline index) plus the tasks edited
+# since then (updated_at index), walking both in keyset batches so memory
+# stays bounded however many tasks match. TaskReminder rows make re-scans
+# idempotent; delivery is at-least-once (a crash after sending but before
+# recording repeats that batch). Run a single scanner at a time.
+#
+# A sink that fails is logged and skipped: the batch is recorded as soon as
+# one sink delivered it, so the others don't send it again next run. When
+# every sink fails, the scan stops with DeliveryFailed before recording or
+# moving past the batch, and the next run retries it.
+#
+# With TASK_SHARDS set, each shard is scanned separately (using=<alias>) and
+# keeps its own DeadlineScan progress and TaskReminder ledger.
+
+import json
+import logging
+from collections import defaultdict
+from datetime import timedelta
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.mail import EmailMessage, get_connection
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import DeadlineScan, Task, TaskReminder
+
+logger = logging.getLogger(__name__)
+
+TASK_FIELDS = ['id', 'user_id', 'title', 'deadline', 'status', 'priority']
+SUBJECTS = {'due_soon': 'Tasks due soon', 'overdue': 'Overdue tasks'}
+
+
+def get_setting(name, default):
+    return getattr(settings, name, default)
+
+
+class DeliveryFailed(Exception):
+    """No sink could send a batch of notifications."""
+
+
+def get_sinks():
+    return [import_string(path)() for path in get_setting('DEADLINE_NOTIFICATION_SINKS', ['tasks.deadlines.EmailSink'])]
+
+
+class EmailSink:
+    """One email per notification, all sent over a single backend connection."""
+
+    def send(self, notifications):
+        messages = []
+        for notification in notifications:
+            user = notification['user']
+            if not user.email:
+                continue
+            lines = [
+                f"- {task['title']} (due {task['deadline']:%Y-%m-%d}, {task['priority']} priority, {task['status']})"
+                for task in notification['tasks']
+            ]
+            messages.append(EmailMessage(
+                subject=f"{SUBJECTS[notification['kind']]} ({len(lines)})",
+                body='\n'.join(lines),
+                to=[user.email],
+            ))
+        if messages:
+            get_connection().send_messages(messages)
+
+
+class WebhookSink:
+    """POSTs each batch of notifications as JSON to DEADLINE_WEBHOOK_URL."""
+
+    def send(self, notifications):
+        url = get_setting('DEADLINE_WEBHOOK_URL', None)
+        if not url or not notifications:
+            return
+        payload = [
+            {'user_id': n['user'].pk, 'username': n['user'].username, 'kind': n['kind'], 'tasks': n['tasks']}
+            for n in notifications
+        ]
+        body = json.dumps(payload, cls=DjangoJSONEncoder).encode('utf-8')
+        request = Request(url, data=body, headers={'Content-Type': 'application/json'}, method='POST')
+        with urlopen(request, timeout=get_setting('DEADLINE_WEBHOOK_TIMEOUT', 10)) as response:
+            response.read()
+
+
+def iter_batches(queryset, field, batch_size):
+    """Rows of queryset in (field, id) order, batch_size at a time (keyset)."""
+    last = None
+    while True:
+        page = queryset
+        if last is not None:
+            page = page.filter(Q(**{f'{field}__gt': last[field]}) | Q(**{field: last[field], 'id__gt': last['id']}))
+        fields = TASK_FIELDS if field in TASK_FIELDS else [*TASK_FIELDS, field]
+        rows = list(page.order_by(field, 'id').values(*fields)[:batch_size])
+        if not rows:
+            return
+        yield rows
+        last = rows[-1]
+
+
+class DeadlineScanner:
+    def __init__(self, sinks=None, today=None, batch_size=None, using=None):
+        self.using = using
+        self.sinks = get_sinks() if sinks is None else sinks
+        self.today = today or timezone.localdate()
+        self.batch_size = batch_size or get_setting('DEADLINE_SCAN_BATCH_SIZE', 1000)
+        self.due_soon_days = get_setting('DEADLINE_DUE_SOON_DAYS', 1)
+        self.lookback_days = get_setting('DEADLINE_OVERDUE_LOOKBACK_DAYS', 7)
+
+    def get_range(self, kind):
+        """(floor, horizon): deadlines after floor and up to horizon are in scope."""
+        if kind == 'due_soon':
+            return self.today - timedelta(days=1), self.today + timedelta(days=self.due_soon_days)
+        return self.today - timedelta(days=self.lookback_days + 1), self.today - timedelta(days=1)
+
+    def open_tasks(self):
+        return Task.objects.using(self.using).exclude(status='completed')
+
+    def run(self, kinds=('due_soon', 'overdue')):
+        results = {}
+        for kind in kinds:
+            results[kind] = self.scan(kind)
+        self.prune()
+        return results
+
+    def scan(self, kind):
+        started = timezone.now()
+        state, _ = DeadlineScan.objects.using(self.using).get_or_create(kind=kind)
+        floor, horizon = self.get_range(kind)
+        self.counts = {'tasks': 0, 'notifications': 0}
+
+        # Tasks edited since the last run whose deadline is in the range that
+        # run already covered (new tasks, moved deadlines, reopened tasks)
+        covered = min(state.covered_until, horizon) if state.covered_until else None
+        if state.last_run_at and covered and covered > floor:
+            edited = self.open_tasks().filter(
+                updated_at__gte=state.last_run_at, deadline__gt=floor, deadline__lte=covered
+            )
+            for rows in iter_batches(edited, 'updated_at', self.batch_size):
+                self.notify(kind, rows)
+
+        # Deadlines that entered the range since the last run
+        start = max(floor, state.covered_until) if state.covered_until else floor
+        if start < horizon:
+            fresh = self.open_tasks().filter(deadline__gt=start, deadline__lte=horizon)
+            for rows in iter_batches(fresh, 'deadline', self.batch_size):
+                self.notify(kind, rows)
+                # Resume from the day before, in case that day's rows continue
+                # in the next batch (the reminder ledger drops repeats)
+                state.covered_until = rows[-1]['deadline'] - timedelta(days=1)
+                state.save(update_fields=['covered_until'])
+
+        state.covered_until = max(horizon, state.covered_until or horizon)
+        state.last_run_at = started
+        state.save(update_fields=['covered_until', 'last_run_at'])
+        return self.counts
+
+    def notify(self, kind, rows):
+        sent = set(
+            TaskReminder.objects.using(self.using).filter(kind=kind, task_id__in=[row['id'] for row in rows])
+            .values_list('task_id', 'deadline')
+        )
+        rows = [row for row in rows if (row['id'], row['deadline']) not in sent]
+        if not rows:
+            return
+
+        by_user = defaultdict(list)
+        for row in rows:
+            by_user[row['user_id']].append({
+                'id': row['id'], 'title': row['title'], 'deadline': row['deadline'],
+                'status': row['status'], 'priority': row['priority'],
+            })
+        users = User.objects.only('id', 'username', 'email').in_bulk(list(by_user))
+        notifications = [
+            {'user': users[user_id], 'kind': kind, 'tasks': tasks}
+            for user_id, tasks in by_user.items() if user_id in users
+        ]
+        delivered = not self.sinks
+        for sink in self.sinks:
+            try:
+                sink.send(notifications)
+            except Exception:
+                logger.exception('%s failed to send %d %s notifications', type(sink).__name__, len(notifications), kind)
+            else:
+                delivered = True
+        if not delivered:
+            raise DeliveryFailed(f'No sink could send {len(notifications)} {kind} notifications')
+
+        TaskReminder.objects.using(self.using).bulk_create(
+            [TaskReminder(task_id=row['id'], kind=kind, deadline=row['deadline']) for row in rows],
+            ignore_conflicts=True,
+        )
+        self.counts['tasks'] += len(rows)
+        self.counts['notifications'] += len(notifications)
+
+    def prune(self):
+        # Reminders for deadlines before the overdue range can't repeat
+        floor = self.get_range('overdue')[0]
+        TaskReminder.objects.using(self.using).filter(deadline__lte=floor).delete()
@@ -0,0 +1,239 @@
+# tasks/events.py
+#
+# Task change feed. Every committed create/update/delete of a task is
+# published to a broker as an event for the task's owner, and
+# AsyncTaskEventStreamView streams a user's events as Server-Sent Events so
+# clients can apply the changes instead of polling the task list.
+#
+# Event ids are "<broker generation>-<sequence>". The broker keeps the last
+# TASK_EVENTS_BACKLOG events for each of the TASK_EVENTS_MAX_USERS users who
+# wrote most recently, so a reconnecting client can resume from its
+# Last-Event-ID; an id the broker can no longer replay (too old, or from
+# before a restart) gets a "reset" event telling the client to refetch its
+# list. Each connection queues at most TASK_EVENTS_QUEUE_SIZE events: a
+# client that falls further behind is sent a reset and disconnected rather
+# than buffering without bound.
+#
+# InProcessBroker only reaches streams served by the same process; deployments
+# with several ASGI workers need a shared broker (TASK_EVENTS_BROKER)
+# implementing the BaseBroker methods. Until it has served a stream it isn't
+# active, and writes (WSGI workers, management commands) publish nothing.
+
+import asyncio
+import itertools
+import json
+import threading
+import time
+from collections import OrderedDict, defaultdict, deque
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from .models import Task
+from .serializers import TaskSerializer, task_row_serializer
+
+
+def get_setting(name, default):
+    return getattr(settings, name, default)
+
+
+def format_message(event_id, event_type, data):
+    """One SSE message; data is JSON, so it never contains a newline."""
+    return f'id: {event_id}\nevent: {event_type}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n'
+
+
+def reset_event(event_id):
+    return {'id': event_id, 'type': 'reset', 'message': format_message(event_id, 'reset', {})}
+
+
+class Subscription:
+    """One stream's queue of events. Filled from any thread, read on its event loop."""
+
+    def __init__(self, user_id, max_size):
+        self.user_id = user_id
+        self.max_size = max_size
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+        self.overflowed = False
+        # Set by the broker: events to send before live ones (None: client must
+        # reset) and the id of the latest event at subscription time
+        self.backlog = []
+        self.cursor = None
+
+    def push(self, event):
+        self.loop.call_soon_threadsafe(self.deliver, event)
+
+    def deliver(self, event):
+        if self.overflowed:
+            return
+        if self.queue.qsize() >= self.max_size:
+            # Everything up to this event is covered by the client's refetch
+            self.overflowed = True
+            event = reset_event(event['id'])
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout):
+        """The next event, or None if none arrived within timeout seconds."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class BaseBroker:
+    # False while no stream could receive what is published
+    active = True
+
+    def publish(self, user_id, event_type, data):
+        raise NotImplementedError
+
+    def subscribe(self, user_id, last_event_id=None):
+        """A Subscription whose backlog holds the events after last_event_id."""
+        raise NotImplementedError
+
+    def unsubscribe(self, subscription):
+        raise NotImplementedError
+
+
+class InProcessBroker(BaseBroker):
+    def __init__(self, backlog=None, queue_size=None, max_users=None):
+        self.backlog = backlog or get_setting('TASK_EVENTS_BACKLOG', 1000)
+        self.queue_size = queue_size or get_setting('TASK_EVENTS_QUEUE_SIZE', 100)
+        self.max_users = max_users or get_setting('TASK_EVENTS_MAX_USERS', 10000)
+        self.active = False
+        self.lock = threading.Lock()
+        # Ids from an earlier process can't be replayed, and never match these
+        self.generation = f'{time.time_ns():x}'
+        self.sequence = itertools.count(1)
+        self.last_sequence = 0
+        # Per-user histories, least recently written first
+        self.history = OrderedDict()
+        # Sequence of the newest event dropped from each user's history
+        self.evicted = {}
+        # Sequence of the newest event in any history dropped whole
+        self.forgotten = 0
+        self.subscribers = defaultdict(set)
+
+    def event_id(self, sequence):
+        return f'{self.generation}-{sequence}'
+
+    def parse_event_id(self, event_id):
+        generation, _, sequence = (event_id or '').partition('-')
+        if generation != self.generation or not sequence.isdigit():
+            return None
+        return int(sequence)
+
+    def publish(self, user_id, event_type, data):
+        with self.lock:
+            sequence = self.last_sequence = next(self.sequence)
+            event_id = self.event_id(sequence)
+            # Encoded once, whatever the number of subscribers
+            event = {
+                'id': event_id, 'sequence': sequence, 'type': event_type,
+                'message': format_message(event_id, event_type, data),
+            }
+            history = self.get_history(user_id)
+            if len(history) == history.maxlen:
+                self.evicted[user_id] = history[0]['sequence']
+            history.append(event)
+            # Pushed under the lock so every subscriber sees the publish order
+            for subscription in list(self.subscribers.get(user_id, ())):
+                try:
+                    subscription.push(event)
+                except RuntimeError:
+                    # Its event loop has closed
+                    self.subscribers[user_id].discard(subscription)
+        return event
+
+    def get_history(self, user_id):
+        history = self.history.get(user_id)
+        if history is None:
+            history = self.history[user_id] = deque(maxlen=self.backlog)
+            # Earlier events of this user may have gone with a dropped history
+            self.evicted[user_id] = self.forgotten
+            if len(self.history) > self.max_users:
+                dropped_user, dropped = self.history.popitem(last=False)
+                del self.evicted[dropped_user]
+                if dropped:
+                    self.forgotten = max(self.forgotten, dropped[-1]['sequence'])
+        else:
+            self.history.move_to_end(user_id)
+        return history
+
+    def subscribe(self, user_id, last_event_id=None):
+        subscription = Subscription(user_id, self.queue_size)
+        with self.lock:
+            self.active = True
+            subscription.cursor = self.event_id(self.last_sequence)
+            subscription.backlog = self.replay(user_id, last_event_id)
+            self.subscribers[user_id].add(subscription)
+        return subscription
+
+    def replay(self, user_id, last_event_id):
+        if not last_event_id:
+            return []
+        sequence = self.parse_event_id(last_event_id)
+        if sequence is None or sequence < self.evicted.get(user_id, self.forgotten):
+            return None
+        return [event for event in self.history.get(user_id, ()) if event['sequence'] > sequence]
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            subscribers = self.subscribers.get(subscription.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self.subscribers[subscription.user_id]
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(get_setting('TASK_EVENTS_BROKER', 'tasks.events.InProcessBroker'))()
+    return _broker
+
+
+def publish_task_event(user_id, event_type, data, using=None):
+    if not get_broker().active:
+        return
+    # Only committed changes are published; a rolled back write sends nothing
+    transaction.on_commit(lambda: get_broker().publish(user_id, event_type, data), using=using)
+
+
+def publish_tasks_saved(tasks, event_type, using=None):
+    """Events for tasks written by bulk_create/bulk_update (no post_save)."""
+    if not get_broker().active:
+        return
+    rows = task_row_serializer.many([
+        {field: getattr(task, field) for field in task_row_serializer.fields} for task in tasks
+    ])
+    events = [(task.user_id, row) for task, row in zip(tasks, rows)]
+
+    def publish():
+        broker = get_broker()
+        for user_id, data in events:
+            broker.publish(user_id, event_type, data)
+
+    transaction.on_commit(publish, using=using)
+
+
+@receiver(post_save, sender=Task)
+def publish_task_saved(sender, instance, created, using, raw=False, **kwargs):
+    if raw or not get_broker().active:
+        return
+    publish_task_event(instance.user_id, 'created' if created else 'updated', TaskSerializer(instance).data, using)
+
+
+@receiver(post_delete, sender=Task)
+def publish_task_deleted(sender, instance, using, **kwargs):
+    publish_task_event(instance.user_id, 'deleted', {'id': instance.pk}, using)
@@ -2,15 +2,18 @@
 
 import django_filters
 from django.contrib.auth.models import User
-from .models import Task
+from .models import ArchivedTask, Task
+from .archive import search_archived
+from .search import search_tasks
 from django_filters import DateFilter
 
 class TaskFilter(django_filters.FilterSet):
-    # Filter by status
-    status = django_filters.ChoiceFilter(choices=Task.STATUS_CHOICES, lookup_expr='iexact')
+    # Filter by status (exact: the choice values are already validated, and
+    # iexact would wrap the column in UPPER()/LIKE and skip the index)
+    status = django_filters.ChoiceFilter(choices=Task.STATUS_CHOICES)
     
     # Filter by priority
-    priority = django_filters.ChoiceFilter(choices=Task.PRIORITY_CHOICES, lookup_expr='iexact')
+    priority = django_filters.ChoiceFilter(choices=Task.PRIORITY_CHOICES)
 
     # Filter by description (partial match)
     description = django_filters.CharFilter(field_name='description', lookup_expr='icontains')
@@ -18,6 +21,9 @@ class TaskFilter(django_filters.FilterSet):
     # Filter by title (partial match)
     title = django_filters.CharFilter(field_name='title', lookup_expr='icontains')
 
+    # Full-text search over title and description, ranked by relevance
+    search = django_filters.CharFilter(method='filter_search')
+
     # Filter by user (assumes user is related to Task, one-to-many relation)
     user = django_filters.ModelChoiceFilter(queryset=User.objects.all(), required=False)
 
@@ -27,4 +33,16 @@ class TaskFilter(django_filters.FilterSet):
 
     class Meta:
         model = Task
-        fields = ['status', 'priority', 'description', 'title', 'user', 'start_date', 'end_date']
+        fields = ['status', 'priority', 'description', 'title', 'search', 'user', 'start_date', 'end_date']
+
+    def filter_search(self, queryset, name, value):
+        return search_tasks(queryset, value)
+
+
+class ArchivedTaskFilter(TaskFilter):
+    # Same parameters, over the archive (TaskListView ?include_archived=true)
+    class Meta(TaskFilter.Meta):
+        model = ArchivedTask
+
+    def filter_search(self, queryset, name, value):
+        return search_archived(queryset, value)
@@ -0,0 +1,176 @@
+# tasks/images.py
+#
+# Profile photo pipeline. The upload request only stores the file and queues a
+# job; a background worker decodes it once, writes metadata-free JPEG/WebP
+# renditions at fixed sizes and deletes the files the upload superseded.
+# Photos are stored under their content digest (tasks/storage.py) and
+# rendition names derive from it, so identical uploads share every file.
+
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from PIL import Image, ImageOps
+
+from .models import UserProfile
+from .storage import get_photo_storage
+
+logger = logging.getLogger(__name__)
+
+# Longest edge in pixels for each rendition
+DEFAULT_SIZES = {'small': 64, 'medium': 256, 'large': 1024}
+FORMATS = {'jpeg': ('JPEG', 'jpg'), 'webp': ('WEBP', 'webp')}
+QUALITY = 85
+
+_executor = None
+
+
+def get_sizes():
+    return getattr(settings, 'PROFILE_PHOTO_SIZES', DEFAULT_SIZES)
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'PROFILE_PHOTO_WORKERS', 2),
+            thread_name_prefix='profile-photos',
+        )
+    return _executor
+
+
+def profile_files(profile):
+    """Every stored file belonging to the profile's current photo."""
+    files = [profile.photo.name] if profile.photo else []
+    for renditions in profile.thumbnails.values():
+        files.extend(renditions.values())
+    return files
+
+
+def replace_profile_photo(profile, upload):
+    """Store a new upload and queue its processing once the request commits."""
+    superseded = profile_files(profile)
+    superseded_photo = profile.photo.name or None
+    profile.photo.save(upload.name, upload, save=False)
+    profile.thumbnails = {}
+    profile.photo_status = 'processing'
+    # update() rather than save(): the old files are removed by the worker
+    UserProfile.objects.filter(pk=profile.pk).update(
+        photo=profile.photo.name, thumbnails={}, photo_status='processing'
+    )
+    photo_name = profile.photo.name
+    transaction.on_commit(
+        lambda: schedule(process_profile_photo, profile.pk, photo_name, superseded, superseded_photo)
+    )
+
+
+def schedule(func, *args):
+    if getattr(settings, 'PROFILE_PHOTO_PROCESSING', 'thread') == 'sync':
+        func(*args)
+    else:
+        get_executor().submit(run_in_worker, func, *args)
+
+
+def run_in_worker(func, *args):
+    try:
+        func(*args)
+    except Exception:
+        logger.exception('Profile photo job failed')
+    finally:
+        # Worker threads hold their own database connections
+        connections.close_all()
+
+
+def render(image, size, image_format):
+    rendition = image.copy()
+    rendition.thumbnail((size, size), Image.LANCZOS)
+    buffer = BytesIO()
+    # A fresh image carries no EXIF/ICC/XMP, so nothing is copied over
+    rendition.save(buffer, format=image_format, quality=QUALITY, optimize=True)
+    return buffer.getvalue()
+
+
+def rendition_name(photo_name, size_name, size, extension):
+    # The source digest plus the exact size fully determine the bytes
+    base = os.path.splitext(os.path.basename(photo_name))[0]
+    return f'profile_photos/thumbs/{base}_{size_name}_{size}.{extension}'
+
+
+def build_renditions(photo_name):
+    image = None
+    thumbnails = {}
+    for size_name, size in get_sizes().items():
+        thumbnails[size_name] = {}
+        for format_name, (image_format, extension) in FORMATS.items():
+            name = rendition_name(photo_name, size_name, size, extension)
+            # Already rendered for an identical upload
+            if not default_storage.exists(name):
+                if image is None:
+                    with get_photo_storage().open(photo_name, 'rb') as source:
+                        image = Image.open(source)
+                        image = ImageOps.exif_transpose(image).convert('RGB')
+                name = default_storage.save(name, ContentFile(render(image, size, image_format)))
+            thumbnails[size_name][format_name] = name
+    return thumbnails
+
+
+def delete_files(names):
+    for name in names:
+        try:
+            default_storage.delete(name)
+        except OSError:
+            logger.warning('Could not delete %s', name, exc_info=True)
+
+
+def release_files(names, photo_name=None, keep=()):
+    """Delete files derived from photo_name unless a profile still uses that photo."""
+    if photo_name and UserProfile.objects.filter(photo=photo_name).exists():
+        return
+    delete_files(set(names) - set(keep))
+
+
+def process_profile_photo(profile_id, photo_name, superseded=(), superseded_photo=None):
+    try:
+        thumbnails = build_renditions(photo_name)
+    except (OSError, Image.DecompressionBombError):
+        logger.warning('Could not process profile photo %s', photo_name, exc_info=True)
+        UserProfile.objects.filter(pk=profile_id, photo=photo_name).update(photo_status='failed')
+        release_files(superseded, superseded_photo, keep=[photo_name])
+        return
+
+    # Only publish if no newer upload replaced this one meanwhile
+    rendered = [name for renditions in thumbnails.values() for name in renditions.values()]
+    updated = UserProfile.objects.filter(pk=profile_id, photo=photo_name).update(
+        thumbnails=thumbnails, photo_status='ready'
+    )
+    if not updated:
+        release_files(rendered, photo_name)
+    release_files(superseded, superseded_photo, keep=[photo_name, *rendered])
+
+
+def profile_photo_data(request, profile):
+    """Photo fields for API responses: thumbnail URLs instead of the original."""
+    if profile is None or profile.photo_status != 'ready':
+        return {'photo': None, 'thumbnails': {}, 'photo_status': profile.photo_status if profile else 'none'}
+    thumbnails = {
+        size_name: {
+            format_name: request.build_absolute_uri(default_storage.url(name))
+            for format_name, name in renditions.items()
+        }
+        for size_name, renditions in profile.thumbnails.items()
+    }
+    medium = thumbnails.get('medium') or next(iter(thumbnails.values()), {})
+    return {'photo': medium.get('jpeg'), 'thumbnails': thumbnails, 'photo_status': 'ready'}
+
+
+def user_photo_data(request, user):
+    try:
+        profile = user.profile
+    except UserProfile.DoesNotExist:
+        profile = None
+    return profile_photo_data(request, profile)
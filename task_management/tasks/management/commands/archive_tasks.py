@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from tasks.archive import archive_tasks
+
+
+class Command(BaseCommand):
+    help = (
+        'Move tasks completed more than TASK_ARCHIVE_AFTER_DAYS ago to the archive table. '
+        'They stay listed with ?include_archived=true and can be restored.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Archive tasks completed this many days ago (default: TASK_ARCHIVE_AFTER_DAYS)')
+        parser.add_argument('--batch-size', type=int, help='Tasks moved per transaction (TASK_ARCHIVE_BATCH_SIZE)')
+
+    def handle(self, *args, **options):
+        archived = archive_tasks(options['days'], options['batch_size'])
+        for shard, count in archived.items():
+            if shard is not None:
+                self.stdout.write(f'{shard}: {count} tasks')
+        self.stdout.write(self.style.SUCCESS(f'Archived {sum(archived.values())} tasks'))
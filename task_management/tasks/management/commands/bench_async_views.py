@@ -0,0 +1,84 @@
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+
+from tasks.authentication import UserRefreshToken
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the sync (WSGI) task list endpoint with its async (ASGI) variant '
+        'by driving both handler stacks in-process at the given concurrency'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help='User whose task list is requested')
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--concurrency', type=int, default=50)
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['username']} does not exist")
+
+        headers = {'Authorization': f'Bearer {UserRefreshToken.for_user(user).access_token}'}
+        total, concurrency = options['requests'], options['concurrency']
+
+        # The test clients always send Host: testserver. The sync list's
+        # response cache is switched off so both sides run the same queries.
+        with override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+            CACHES={**settings.CACHES, 'bench': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+            TASK_LIST_CACHE_ALIAS='bench',
+        ):
+            self.report('sync  (WSGI)', *self.run_sync(reverse('task-list'), headers, total, concurrency))
+            self.report('async (ASGI)', *asyncio.run(
+                self.run_async(reverse('async-task-list'), headers, total, concurrency)
+            ))
+
+    def run_sync(self, url, headers, total, concurrency):
+        def request(_):
+            client = Client()
+            started = time.perf_counter()
+            response = client.get(url, {'pagination': 'cursor'}, headers=headers)
+            elapsed = time.perf_counter() - started
+            connections.close_all()
+            return response.status_code, elapsed
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(request, range(total)))
+        return results, time.perf_counter() - started
+
+    async def run_async(self, url, headers, total, concurrency):
+        client = AsyncClient()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def request():
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.get(url, {'pagination': 'cursor'}, headers=headers)
+                return response.status_code, time.perf_counter() - started
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(request() for _ in range(total)))
+        return results, time.perf_counter() - started
+
+    def report(self, label, results, wall_time):
+        latencies = sorted(elapsed for _, elapsed in results)
+        errors = sum(1 for code, _ in results if code != 200)
+        quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+        self.stdout.write(
+            f'{label}: {len(results) / wall_time:8.1f} req/s  '
+            f'p50 {quantiles[49] * 1000:7.1f} ms  p95 {quantiles[94] * 1000:7.1f} ms  '
+            f'p99 {quantiles[98] * 1000:7.1f} ms  errors {errors}'
+        )
@@ -0,0 +1,110 @@
+import re
+from itertools import combinations
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from tasks.filters import TaskFilter
+from tasks.models import Task
+from tasks.pagination import TaskKeysetPagination
+
+# Filter values used for each TaskFilter parameter in the generated queries
+FILTERS = {
+    'status': {'status': 'completed'},
+    'priority': {'priority': 'high'},
+    'deadline': {'start_date': '2030-01-01', 'end_date': '2030-03-01'},
+}
+TEXT_FILTERS = {
+    'title': {'title': 'report'},
+    'search': {'search': 'report'},
+}
+# Orderings the task list can ask for (page-number pagination uses
+# Meta.ordering, keyset pagination adds the id tie-breaker)
+ORDERINGS = ['-created_at', 'created_at', 'deadline', '-deadline']
+
+# Plan lines meaning every row of the task table is read, or the result is
+# sorted after the fact, per backend
+TABLE = re.escape(Task._meta.db_table)
+SCAN_PATTERNS = {
+    'sqlite': re.compile(rf'\bSCAN {TABLE}\b(?! USING)'),
+    'mysql': re.compile(rf'Table scan on {TABLE}\b'),
+    'postgresql': re.compile(rf'Seq Scan on {TABLE}\b'),
+}
+SORT_PATTERNS = {
+    'sqlite': re.compile(r'USE TEMP B-TREE FOR (RIGHT PART OF )?ORDER BY'),
+    'mysql': re.compile(r'-> Sort\b|filesort'),
+    'postgresql': re.compile(r'\bSort\b'),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'EXPLAIN the task list query for each TaskFilter combination and ordering and '
+        'report which ones scan the whole task table or sort in a temporary structure. '
+        'Run it against realistic data (e.g. seed_benchmark_data) with fresh statistics.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Username whose task list is explained (default: first user with tasks)')
+        parser.add_argument('--verbose-plans', action='store_true', help='Print the full plan of every query')
+        parser.add_argument('--fail-on-scan', action='store_true', help='Exit with an error if any query scans the table')
+
+    def handle(self, *args, **options):
+        vendor = connection.vendor
+        if vendor not in SCAN_PATTERNS:
+            raise CommandError(f'Plans from {vendor} databases are not supported')
+        user = self.get_user(options['user'])
+
+        scans = []
+        for name, params in self.combinations():
+            for ordering in ORDERINGS:
+                queryset = self.build_queryset(user, params, ordering)
+                plan = queryset.explain(**self.explain_options(vendor))
+                scan = bool(SCAN_PATTERNS[vendor].search(plan))
+                sort = bool(SORT_PATTERNS[vendor].search(plan))
+                if scan:
+                    scans.append((name, ordering))
+                status = self.style.ERROR('SCAN') if scan else self.style.SUCCESS('index')
+                self.stdout.write(f'{name:<32} {ordering:<12} {status:<6} {"sort" if sort else ""}')
+                if options['verbose_plans']:
+                    self.stdout.write('    ' + plan.replace('\n', '\n    '))
+
+        if scans and options['fail_on_scan']:
+            raise CommandError(f'{len(scans)} queries scan the {Task._meta.db_table} table')
+        self.stdout.write(f'{len(scans)} of the explained queries scan the {Task._meta.db_table} table')
+
+    def get_user(self, username):
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f'User {username} does not exist')
+        user = User.objects.filter(tasks__isnull=False).order_by('id').first()
+        if user is None:
+            raise CommandError('No user has any tasks to explain')
+        return user
+
+    def combinations(self):
+        names = list(FILTERS)
+        for size in range(len(names) + 1):
+            for combination in combinations(names, size):
+                params = {}
+                for name in combination:
+                    params.update(FILTERS[name])
+                yield '+'.join(combination) or '(user only)', params
+        for name, params in TEXT_FILTERS.items():
+            yield name, params
+
+    def build_queryset(self, user, params, ordering):
+        # The same query TaskListView/TaskKeysetPagination run for a first page
+        filterset = TaskFilter(params, queryset=Task.objects.filter(user_id=user.pk))
+        if not filterset.is_valid():
+            raise CommandError(filterset.errors)
+        prefix = '-' if ordering.startswith('-') else ''
+        queryset = filterset.qs.order_by(ordering, f'{prefix}id')
+        return queryset[:TaskKeysetPagination.page_size + 1]
+
+    def explain_options(self, vendor):
+        # MySQL's tree format names the access path of each step
+        return {'format': 'TREE'} if vendor == 'mysql' else {}
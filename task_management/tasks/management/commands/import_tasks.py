@@ -0,0 +1,125 @@
+import csv
+import json
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework import serializers
+
+from tasks.bulk import bulk_create_tasks
+from tasks.models import Task
+from tasks.serializers import TaskSerializer
+
+FORMATS = ('csv', 'ndjson')
+
+
+class Command(BaseCommand):
+    help = (
+        'Import tasks from a CSV or NDJSON file. Each row needs username, title, '
+        'description and deadline; priority and status are optional.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import')
+        parser.add_argument('--format', choices=FORMATS, help='Defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Rows written per bulk_create/transaction')
+        parser.add_argument('--rejects', help='Write rejected rows and their errors here (NDJSON)')
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or options['path'].rsplit('.', 1)[-1].lower()
+        if file_format not in FORMATS:
+            raise CommandError(f'Cannot tell the file format, pass --format ({"/".join(FORMATS)})')
+
+        self.verbosity = options['verbosity']
+        self.batch_size = options['batch_size']
+        self.user_ids = {}
+        self.validator = TaskSerializer()
+        self.imported = 0
+        self.rejected = 0
+        self.started = time.monotonic()
+
+        rejects = open(options['rejects'], 'w') if options['rejects'] else None
+        try:
+            with open(options['path'], newline='', encoding='utf-8') as source:
+                rows = self.read_csv(source) if file_format == 'csv' else self.read_ndjson(source)
+                batch = []
+                for line, row in rows:
+                    batch.append((line, row))
+                    if len(batch) >= self.batch_size:
+                        self.import_batch(batch, rejects)
+                        batch = []
+                self.import_batch(batch, rejects)
+        finally:
+            if rejects:
+                rejects.close()
+
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {self.imported} tasks, rejected {self.rejected} rows '
+            f'in {elapsed:.1f}s ({self.imported / elapsed if elapsed else 0:.0f} rows/s)'
+        ))
+
+    def read_csv(self, source):
+        for line, row in enumerate(csv.DictReader(source), start=2):
+            yield line, row
+
+    def read_ndjson(self, source):
+        for line, text in enumerate(source, start=1):
+            if not text.strip():
+                continue
+            try:
+                row = json.loads(text)
+            except ValueError as e:
+                row = serializers.ValidationError({'row': [f'Invalid JSON: {e}']})
+            yield line, row
+
+    def resolve_users(self, batch):
+        # One query per batch for usernames we haven't seen yet
+        # Only string usernames: a list or object from NDJSON isn't hashable
+        # and is rejected by validate()
+        missing = {
+            row.get('username') for _, row in batch
+            if isinstance(row, dict) and isinstance(row.get('username'), str)
+            and row.get('username') not in self.user_ids
+        }
+        if missing:
+            found = dict(User.objects.filter(username__in=missing).values_list('username', 'id'))
+            for username in missing:
+                self.user_ids[username] = found.get(username)
+
+    def validate(self, row):
+        if isinstance(row, serializers.ValidationError):
+            raise row
+        if not isinstance(row, dict):
+            raise serializers.ValidationError({'row': ['Expected an object']})
+        username = row.get('username')
+        if not isinstance(username, str):
+            raise serializers.ValidationError({'username': ['Expected a username string']})
+        user_id = self.user_ids.get(username)
+        if user_id is None:
+            raise serializers.ValidationError({'username': ['Unknown user']})
+        # Blank optional columns fall back to the model defaults
+        data = {key: value for key, value in row.items() if value not in ('', None)}
+        return user_id, self.validator.run_validation(data)
+
+    def import_batch(self, batch, rejects):
+        if not batch:
+            return
+        self.resolve_users(batch)
+        tasks = []
+        for line, row in batch:
+            try:
+                user_id, validated = self.validate(row)
+            except serializers.ValidationError as e:
+                self.rejected += 1
+                if rejects:
+                    rejects.write(json.dumps({'line': line, 'errors': e.detail, 'row': row if isinstance(row, dict) else None}) + '\n')
+                continue
+            tasks.append(Task(user_id=user_id, **validated))
+
+        bulk_create_tasks(tasks, batch_size=self.batch_size, fetch_ids=False)
+        self.imported += len(tasks)
+        if self.verbosity > 1:
+            elapsed = time.monotonic() - self.started
+            self.stdout.write(f'{self.imported} imported, {self.rejected} rejected ({self.imported / elapsed:.0f} rows/s)')
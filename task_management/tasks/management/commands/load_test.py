@@ -0,0 +1,114 @@
+import random
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from tasks.authentication import UserRefreshToken
+from tasks.benchmarks import (
+    ADMIN_USERNAME, bench_users, compare_reports, format_comparison, summarize, write_report
+)
+
+# name: (url name, query parameters, needs the admin user)
+ENDPOINTS = {
+    'task-list': ('task-list', {}, False),
+    'task-list-cursor': ('task-list', {'pagination': 'cursor'}, False),
+    'task-search': ('task-list', {'search': 'report'}, False),
+    'task-stats': ('task-stats', {}, False),
+    'dashboard': ('superuser_dashboard', {}, True),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Drive the task API endpoints with concurrent requests as the seeded benchmark '
+        'users (see seed_benchmark_data) and report throughput and latency per endpoint'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--endpoints', nargs='+', choices=list(ENDPOINTS), default=list(ENDPOINTS))
+        parser.add_argument('--requests', type=int, default=1000, help='Total requests across all endpoints')
+        parser.add_argument('--concurrency', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the request mix')
+        parser.add_argument('--base-url', help='Send HTTP requests to a running server instead of in-process')
+        parser.add_argument('--output', help='Write the results as JSON')
+        parser.add_argument('--compare', help='Baseline JSON report to diff p50 latencies against')
+
+    def handle(self, *args, **options):
+        users = list(bench_users()[:1000])
+        admin = User.objects.filter(username=ADMIN_USERNAME).first()
+        if not users or admin is None:
+            raise CommandError('No benchmark data, run seed_benchmark_data first')
+
+        tokens = [str(UserRefreshToken.for_user(user).access_token) for user in users]
+        admin_token = str(UserRefreshToken.for_user(admin).access_token)
+        rng = random.Random(options['seed'])
+        plan = []
+        for i in range(options['requests']):
+            name = options['endpoints'][i % len(options['endpoints'])]
+            url_name, params, as_admin = ENDPOINTS[name]
+            token = admin_token if as_admin else rng.choice(tokens)
+            plan.append((name, reverse(url_name), params, token))
+
+        send = self.http_request(options['base_url']) if options['base_url'] else self.client_request
+        # The test client sends Host: testserver
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+                outcomes = list(pool.map(lambda request: self.timed(send, *request), plan))
+            wall_time = time.perf_counter() - started
+
+        samples, errors = defaultdict(list), defaultdict(int)
+        for name, status_code, elapsed in outcomes:
+            samples[name].append(elapsed)
+            samples['all'].append(elapsed)
+            if status_code != 200:
+                errors[name] += 1
+                errors['all'] += 1
+
+        results = {}
+        for name in [*options['endpoints'], 'all']:
+            results[name] = {**summarize(samples[name], wall_time), 'errors': errors[name]}
+            self.stdout.write(
+                f'{name:<18} {results[name]["throughput_rps"]:8.1f} req/s  p50 {results[name]["p50_ms"]:8.2f} ms  '
+                f'p95 {results[name]["p95_ms"]:8.2f} ms  p99 {results[name]["p99_ms"]:8.2f} ms  '
+                f'errors {results[name]["errors"]}'
+            )
+
+        if options['output']:
+            write_report(options['output'], 'load', results, {
+                key: options[key] for key in ('endpoints', 'requests', 'concurrency', 'seed', 'base_url')
+            })
+        if options['compare']:
+            self.stdout.write(format_comparison(compare_reports(options['compare'], results)))
+
+    def timed(self, send, name, path, params, token):
+        started = time.perf_counter()
+        status_code = send(path, params, token)
+        return name, status_code, time.perf_counter() - started
+
+    def client_request(self, path, params, token):
+        try:
+            return Client().get(path, params, headers={'Authorization': f'Bearer {token}'}).status_code
+        finally:
+            connections.close_all()
+
+    def http_request(self, base_url):
+        def send(path, params, token):
+            url = base_url.rstrip('/') + path + (f'?{urlencode(params)}' if params else '')
+            try:
+                with urlopen(Request(url, headers={'Authorization': f'Bearer {token}'})) as response:
+                    response.read()
+                    return response.status
+            except HTTPError as e:
+                return e.code
+        return send
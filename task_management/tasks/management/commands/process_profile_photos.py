@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from tasks.images import process_profile_photo
+from tasks.models import UserProfile
+
+
+class Command(BaseCommand):
+    help = 'Build thumbnails for profile photos that have none yet (e.g. uploaded before the pipeline existed)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Rebuild thumbnails for every profile photo')
+
+    def handle(self, *args, **options):
+        profiles = UserProfile.objects.exclude(photo='').exclude(photo__isnull=True)
+        if not options['all']:
+            profiles = profiles.exclude(photo_status='ready')
+
+        processed = 0
+        for profile in profiles.iterator():
+            # Rebuilt renditions replace the current ones, which are then removed
+            superseded = [name for renditions in profile.thumbnails.values() for name in renditions.values()]
+            process_profile_photo(profile.pk, profile.photo.name, superseded)
+            processed += 1
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} profile photos'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from tasks.sync import prune_tombstones
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete tombstones of tasks deleted more than TASK_SYNC_TOMBSTONE_DAYS ago. '
+        'Sync cursors older than that are refused with 410, so clients resync from scratch.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Keep tombstones this many days (default: TASK_SYNC_TOMBSTONE_DAYS)')
+
+    def handle(self, *args, **options):
+        deleted = prune_tombstones(options['days'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} task tombstones'))
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks.rebalance import move_users, plan_moves
+from tasks.sharding import all_shards, sharding_enabled
+
+
+class Command(BaseCommand):
+    help = (
+        'Move users whose tasks are not on the shard TASK_SHARDS assigns them (e.g. after adding '
+        'a shard). Users keep working meanwhile; writes are refused for a few seconds per batch.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', help='Only move this user id (repeatable)')
+        parser.add_argument('--to', help='Move the --user ids to this shard instead of their ring shard')
+        parser.add_argument('--dry-run', action='store_true', help='List the moves without making them')
+        parser.add_argument('--batch-size', type=int, help='Rows copied per query (TASK_SHARD_MOVE_BATCH_SIZE)')
+        parser.add_argument('--users-per-move', type=int, default=100,
+                            help='Users frozen and switched together')
+
+    def handle(self, *args, **options):
+        if not sharding_enabled():
+            raise CommandError('TASK_SHARDS is not set')
+        if options['to'] is not None:
+            if options['to'] not in all_shards():
+                raise CommandError(f'Unknown shard: {options["to"]}')
+            if not options['user']:
+                raise CommandError('--to needs --user')
+            moves = [(user_id, options['to']) for user_id in options['user']]
+        else:
+            moves = plan_moves()
+            if options['user']:
+                users = set(options['user'])
+                moves = (move for move in moves if move[0] in users)
+
+        total_users = total_tasks = 0
+        batch = []
+        for move in moves:
+            if options['dry_run']:
+                self.stdout.write(f'user {move[0]} -> {move[1]}')
+                continue
+            batch.append(move)
+            if len(batch) >= options['users_per_move']:
+                total_users, total_tasks = self.move(batch, options, total_users, total_tasks)
+                batch = []
+        if batch:
+            total_users, total_tasks = self.move(batch, options, total_users, total_tasks)
+        if not options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'Moved {total_tasks} tasks of {total_users} users'))
+
+    def move(self, batch, options, total_users, total_tasks):
+        moved, failed = move_users(batch, options['batch_size'])
+        for user_id, error in failed.items():
+            self.stderr.write(f'user {user_id} not moved: {error}')
+        return total_users + len(moved), total_tasks + sum(moved.values())
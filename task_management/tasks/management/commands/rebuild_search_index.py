@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from tasks.models import Task, TaskSearchTerm
+from tasks.search import get_search_backend, index_tasks
+from tasks.sharding import all_shards
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the task search index table from scratch'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if get_search_backend() != 'index':
+            self.stdout.write('Search uses the database FULLTEXT index; nothing to rebuild.')
+            return
+
+        batch_size = options['batch_size']
+        indexed = 0
+        for shard in all_shards():
+            TaskSearchTerm.objects.using(shard).all().delete()
+            batch = []
+            tasks = Task.objects.using(shard).order_by().only('id', 'user_id', 'title', 'description')
+            for task in tasks.iterator(chunk_size=batch_size):
+                batch.append(task)
+                if len(batch) >= batch_size:
+                    index_tasks(batch)
+                    indexed += len(batch)
+                    batch = []
+            index_tasks(batch)
+            indexed += len(batch)
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} tasks'))
@@ -0,0 +1,34 @@
+from django.db import transaction
+from django.db.models import Count
+from django.core.management.base import BaseCommand
+
+from tasks.models import Task, TaskStats
+from tasks.sharding import all_shards
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the TaskStats counters from the Task table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help='Only rebuild the counters of this user id')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rebuilt = 0
+        # Each shard's counters are rebuilt from its own tasks
+        for shard in all_shards():
+            tasks = Task.objects.using(shard).order_by()
+            stats = TaskStats.objects.using(shard).all()
+            if options['user'] is not None:
+                tasks = tasks.filter(user_id=options['user'])
+                stats = stats.filter(user_id=options['user'])
+
+            rows = tasks.values('user_id', 'status', 'priority').annotate(count=Count('id'))
+            with transaction.atomic(using=shard):
+                stats.delete()
+                created = TaskStats.objects.using(shard).bulk_create(
+                    (TaskStats(**row) for row in rows.iterator(chunk_size=options['batch_size'])),
+                    batch_size=options['batch_size'],
+                )
+            rebuilt += len(created)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rebuilt} task counters'))
@@ -0,0 +1,92 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from tasks.authentication import StatelessJWTAuthentication, UserRefreshToken
+from tasks.benchmarks import (
+    ADMIN_USERNAME, bench_users, compare_reports, format_comparison, summarize, time_calls, write_report
+)
+from tasks.filters import TaskFilter
+from tasks.models import Task
+from tasks.renderers import FastJSONRenderer
+from tasks.serializers import TaskSerializer, task_row_serializer
+from tasks.views import SuperuserDashboardView
+
+
+class Command(BaseCommand):
+    help = (
+        'Time TaskSerializer (and its .values() fast path), JSON rendering, TaskFilter queries, '
+        'JWT authentication and the superuser dashboard against the seeded benchmark data '
+        '(see seed_benchmark_data)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--only', nargs='+', help='Run only these benchmarks')
+        parser.add_argument('--output', help='Write the results as JSON')
+        parser.add_argument('--compare', help='Baseline JSON report to diff p50 latencies against')
+
+    def handle(self, *args, **options):
+        user = bench_users().first()
+        admin = User.objects.filter(username=ADMIN_USERNAME).first()
+        if user is None or admin is None:
+            raise CommandError('No benchmark data, run seed_benchmark_data first')
+
+        benchmarks = self.get_benchmarks(user, admin)
+        names = options['only'] or list(benchmarks)
+        unknown = set(names) - set(benchmarks)
+        if unknown:
+            raise CommandError(f'Unknown benchmarks: {", ".join(sorted(unknown))} (choose from {", ".join(benchmarks)})')
+
+        results = {}
+        # Requests from APIRequestFactory carry Host: testserver
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            for name in names:
+                results[name] = summarize(time_calls(benchmarks[name], options['iterations']))
+                self.stdout.write(
+                    f'{name:<28} p50 {results[name]["p50_ms"]:9.3f} ms  p95 {results[name]["p95_ms"]:9.3f} ms'
+                )
+
+        if options['output']:
+            write_report(options['output'], 'micro', results, {'iterations': options['iterations']})
+        if options['compare']:
+            self.stdout.write(format_comparison(compare_reports(options['compare'], results)))
+
+    def get_benchmarks(self, user, admin):
+        tasks = list(Task.objects.filter(user=user).order_by('id')[:100])
+        rows = list(Task.objects.filter(user=user).order_by('id').values(*task_row_serializer.fields)[:100])
+        data = TaskSerializer(tasks, many=True).data
+        if task_row_serializer.many(rows) != data:
+            raise CommandError('task_row_serializer output differs from TaskSerializer')
+        queryset = Task.objects.filter(user_id=user.pk)
+        factory = APIRequestFactory()
+        auth_request = factory.get('/', HTTP_AUTHORIZATION=f'Bearer {UserRefreshToken.for_user(user).access_token}')
+        dashboard = SuperuserDashboardView.as_view()
+
+        def filter_tasks(params):
+            return lambda: list(TaskFilter(params, queryset=queryset).qs[:50])
+
+        def authenticate(backend):
+            return lambda: backend().authenticate(auth_request)
+
+        def dashboard_view():
+            request = factory.get('/api/superuser/dashboard/')
+            force_authenticate(request, admin)
+            dashboard(request).render()
+
+        return {
+            'serialize_100_tasks': lambda: TaskSerializer(tasks, many=True).data,
+            'serialize_100_task_rows': lambda: task_row_serializer.many(rows),
+            'render_100_tasks_drf': lambda: JSONRenderer().render(data),
+            'render_100_tasks_fast': lambda: FastJSONRenderer().render(data),
+            'filter_status_priority': filter_tasks({'status': 'completed', 'priority': 'high'}),
+            'filter_deadline_range': filter_tasks({'start_date': '2030-01-01', 'end_date': '2030-03-01'}),
+            'filter_search': filter_tasks({'search': 'report'}),
+            'jwt_auth_stateless': authenticate(StatelessJWTAuthentication),
+            'jwt_auth_db_lookup': authenticate(JWTAuthentication),
+            'superuser_dashboard': dashboard_view,
+        }
@@ -0,0 +1,46 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from tasks.deadlines import DeadlineScanner
+from tasks.sharding import all_shards
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        'Notify users about open tasks that are due soon or overdue. Each run only scans '
+        'deadlines and edits since the previous one; --loop keeps it running as a worker.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', choices=['due_soon', 'overdue'], action='append',
+                            help='Scan only this kind (repeatable, default: both)')
+        parser.add_argument('--batch-size', type=int, help='Tasks read per query (DEADLINE_SCAN_BATCH_SIZE)')
+        parser.add_argument('--loop', action='store_true', help='Keep scanning every --interval seconds')
+        parser.add_argument('--interval', type=int, default=300)
+
+    def handle(self, *args, **options):
+        kinds = options['kind'] or ['due_soon', 'overdue']
+        while True:
+            failed = False
+            for shard in all_shards():
+                prefix = f'{shard}: ' if shard else ''
+                try:
+                    results = DeadlineScanner(batch_size=options['batch_size'], using=shard).run(kinds)
+                except Exception:
+                    # Progress is saved per batch; the next run picks up from there
+                    logger.exception('%sDeadline scan failed', prefix)
+                    failed = True
+                    continue
+                for kind, counts in results.items():
+                    self.stdout.write(f'{prefix}{kind}: {counts["tasks"]} tasks, {counts["notifications"]} notifications')
+            if not options['loop']:
+                if failed:
+                    raise CommandError('Deadline scan failed, see the log')
+                return
+            close_old_connections()
+            time.sleep(options['interval'])
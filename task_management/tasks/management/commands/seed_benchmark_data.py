@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from tasks.benchmarks import clear_data, seed_data
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a reproducible benchmark data set: N bench users with M tasks each '
+        '(bulk inserted) plus a bench-admin superuser'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--tasks', type=int, default=100, help='Tasks per user')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the generated rows')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--clear', action='store_true', help='Remove existing benchmark data first')
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            clear_data()
+        users = seed_data(options['users'], options['tasks'], seed=options['seed'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {options["tasks"]} tasks for each of {users} benchmark users'
+        ))
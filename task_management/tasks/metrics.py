@@ -0,0 +1,184 @@
+# tasks/metrics.py
+#
+# Per-route request instrumentation. A sampled request records its wall time,
+# query count and SQL time (through connection.execute_wrapper), logs any SQL
+# statement repeated often enough to look like an N+1 loop, and gets a
+# Server-Timing header. Samples are kept per process in bounded windows and
+# summarised as percentiles by SuperuserRequestMetricsView. Unsampled requests
+# only pay for one settings lookup and a random() call.
+
+import logging
+import random
+import threading
+import time
+from collections import Counter, deque
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WINDOW = 1000
+DEFAULT_DUPLICATE_THRESHOLD = 5
+
+
+def get_sample_rate():
+    return getattr(settings, 'REQUEST_METRICS_SAMPLE_RATE', 0)
+
+
+def percentile(values, fraction):
+    # Nearest-rank percentile of a sorted list
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, round(fraction * len(values)) - 1))]
+
+
+class QueryRecorder:
+    """execute_wrapper that counts and times every query of one request."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            # Parameters are passed separately, so equal SQL means the same query shape
+            self.statements[sql] += 1
+
+    def duplicates(self):
+        threshold = getattr(settings, 'REQUEST_METRICS_DUPLICATE_THRESHOLD', DEFAULT_DUPLICATE_THRESHOLD)
+        return {sql: count for sql, count in self.statements.items() if count >= threshold}
+
+    def install(self):
+        for alias in connections:
+            connections[alias].execute_wrappers.append(self)
+
+    def uninstall(self):
+        for alias in connections:
+            wrappers = connections[alias].execute_wrappers
+            if self in wrappers:
+                wrappers.remove(self)
+
+
+class RouteMetrics:
+    def __init__(self, window):
+        self.requests = 0
+        self.duplicate_requests = 0
+        self.wall_times = deque(maxlen=window)
+        self.query_counts = deque(maxlen=window)
+        self.sql_times = deque(maxlen=window)
+
+    def add(self, wall_time, recorder, has_duplicates):
+        self.requests += 1
+        self.wall_times.append(wall_time)
+        self.query_counts.append(recorder.count)
+        self.sql_times.append(recorder.duration)
+        if has_duplicates:
+            self.duplicate_requests += 1
+
+    def summary(self):
+        data = {'requests': self.requests, 'duplicate_query_requests': self.duplicate_requests}
+        for name, values, scale in (
+            ('wall_ms', self.wall_times, 1000),
+            ('queries', self.query_counts, 1),
+            ('sql_ms', self.sql_times, 1000),
+        ):
+            values = sorted(values)
+            data[name] = {
+                f'p{p}': round(percentile(values, p / 100) * scale, 2) if values else None
+                for p in (50, 95, 99)
+            }
+        return data
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.routes = {}
+
+    def record(self, route, wall_time, recorder, has_duplicates=False):
+        window = getattr(settings, 'REQUEST_METRICS_WINDOW', DEFAULT_WINDOW)
+        with self.lock:
+            if route not in self.routes:
+                self.routes[route] = RouteMetrics(window)
+            self.routes[route].add(wall_time, recorder, has_duplicates)
+
+    def snapshot(self):
+        with self.lock:
+            return {route: metrics.summary() for route, metrics in sorted(self.routes.items())}
+
+    def reset(self):
+        with self.lock:
+            self.routes.clear()
+
+
+registry = MetricsRegistry()
+
+
+def get_route(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return f'{request.method} <unresolved>'
+    return f'{request.method} /{match.route}'
+
+
+class RequestMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if random.random() >= get_sample_rate():
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        recorder.install()
+        try:
+            response = self.get_response(request)
+        finally:
+            recorder.uninstall()
+        return self.finish(request, response, recorder, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        if random.random() >= get_sample_rate():
+            return await self.get_response(request)
+
+        # Async views run their queries in the request's thread-sensitive
+        # executor thread, whose connections are not the event loop's
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        await sync_to_async(recorder.install)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(recorder.uninstall)()
+        return self.finish(request, response, recorder, time.perf_counter() - started)
+
+    def finish(self, request, response, recorder, wall_time):
+        route = get_route(request)
+        duplicates = recorder.duplicates()
+        registry.record(route, wall_time, recorder, bool(duplicates))
+        for sql, count in duplicates.items():
+            logger.warning('%s ran the same query %d times: %s', route, count, sql)
+
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={recorder.duration * 1000:.1f};desc="{recorder.count} queries"',
+            f'app;dur={(wall_time - recorder.duration) * 1000:.1f}',
+            f'total;dur={wall_time * 1000:.1f}',
+        ])
+        return response
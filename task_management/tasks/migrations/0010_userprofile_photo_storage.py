@@ -0,0 +1,19 @@
+# Generated by Django 5.1.3 on 2026-10-18 19:26
+
+import tasks.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0009_userprofile_thumbnails'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='userprofile',
+            name='photo',
+            field=models.ImageField(blank=True, null=True, storage=tasks.storage.get_photo_storage, upload_to='profile_photos/'),
+        ),
+    ]
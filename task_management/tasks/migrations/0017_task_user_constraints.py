@@ -0,0 +1,35 @@
+# Generated by Django 5.1.3 on 2026-10-18 22:10
+#
+# Restores the user FK constraints 0015 dropped, on 'default' only: shard
+# databases keep them off, as their users table is empty.
+
+import django.db.models.deletion
+import tasks.sharding
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0016_archived_task'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        tasks.sharding.AlterFieldOutsideShards(
+            model_name='task',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tasks', to=settings.AUTH_USER_MODEL),
+        ),
+        tasks.sharding.AlterFieldOutsideShards(
+            model_name='tasksearchterm',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        tasks.sharding.AlterFieldOutsideShards(
+            model_name='taskstats',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='task_stats', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
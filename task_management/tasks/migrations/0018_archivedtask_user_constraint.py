@@ -0,0 +1,24 @@
+# Generated by Django 5.1.3 on 2026-10-18 22:20
+#
+# Adds the user FK constraint on 'default' only, as 0017 does for Task.
+
+import django.db.models.deletion
+import tasks.sharding
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0017_task_user_constraints'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        tasks.sharding.AlterFieldOutsideShards(
+            model_name='archivedtask',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
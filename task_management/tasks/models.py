@@ -1,7 +1,11 @@
 from django.contrib.auth.models import User
-from django.db import models
+from django.db import models, router, transaction
 from django.db.models.signals import post_save
 from django.dispatch import receiver
+from django.utils import timezone
+
+from .sharding import ShardedQuerySet
+from .storage import get_photo_storage
 
 class Task(models.Model):
     PRIORITY_CHOICES = [
@@ -27,11 +31,203 @@ class Task(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ShardedQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
+        # Check access paths with `manage.py explain_task_filters`
         indexes = [
             models.Index(fields=['user', 'status']),
+            models.Index(fields=['user', 'priority', 'status']),
             models.Index(fields=['deadline']),
+            # Tasks edited since the deadline scanner's last run
+            models.Index(fields=['updated_at']),
+            # Keyset pagination of a user's task list (see TaskKeysetPagination)
+            models.Index(fields=['user', 'created_at', 'id']),
+            models.Index(fields=['user', 'deadline', 'id']),
+            # Incremental sync: a user's tasks changed since a cursor (tasks/sync.py)
+            models.Index(fields=['user', 'updated_at', 'id']),
+        ]
+
+    def __str__(self):
+        return self.title
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored (user, status, priority) so a status/priority
+        # change can move the task between TaskStats counters (tasks/stats.py)
+        if {'user_id', 'status', 'priority'} <= set(field_names):
+            instance._loaded_stats_key = instance.stats_key
+        return instance
+
+    @property
+    def stats_key(self):
+        return (self.user_id, self.status, self.priority)
+
+    def save(self, *args, **kwargs):
+        # Keep the post_save receivers (TaskStats counters) in the same
+        # transaction as the row write. Deletes already run in one.
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using, savepoint=False):
+            super().save(*args, **kwargs)
+
+
+# Materialized task counts per user x status x priority, kept in step with
+# Task writes by tasks/stats.py and rebuilt by `manage.py rebuild_task_stats`
+class TaskStats(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='task_stats')
+    status = models.CharField(max_length=20, choices=Task.STATUS_CHOICES)
+    priority = models.CharField(max_length=6, choices=Task.PRIORITY_CHOICES)
+    count = models.IntegerField(default=0)
+
+    objects = ShardedQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'status', 'priority'], name='unique_task_stats'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.status}/{self.priority}: {self.count}"
+
+
+# Progress of the deadline scanner (tasks/deadlines.py), one row per kind:
+# deadlines up to covered_until have been scanned, and tasks updated after
+# last_run_at are re-checked in case their deadline moved into that range
+class DeadlineScan(models.Model):
+    KIND_CHOICES = [
+        ('due_soon', 'Due soon'),
+        ('overdue', 'Overdue'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, unique=True)
+    covered_until = models.DateField(null=True, blank=True)
+    last_run_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.kind} up to {self.covered_until}"
+
+
+# Reminders already sent, so re-scanned tasks aren't notified twice for the
+# same deadline. No FK constraint/cascade: deleting a task shouldn't pay for
+# it, and the scanner prunes rows past the overdue lookback.
+class TaskReminder(models.Model):
+    task = models.ForeignKey(Task, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    kind = models.CharField(max_length=10, choices=DeadlineScan.KIND_CHOICES)
+    deadline = models.DateField()
+    sent_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['task', 'kind', 'deadline'], name='unique_task_reminder'),
+        ]
+        indexes = [
+            models.Index(fields=['deadline']),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} reminder for task {self.task_id} ({self.deadline})"
+
+
+# A deleted task, so incremental sync can tell clients to drop it. No FK
+# constraint: rows may outlive their user, and `manage.py prune_task_tombstones`
+# removes them after TASK_SYNC_TOMBSTONE_DAYS.
+class TaskTombstone(models.Model):
+    user = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    task_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    objects = ShardedQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'deleted_at', 'id']),
+            models.Index(fields=['deleted_at']),
+        ]
+
+    def __str__(self):
+        return f"Task {self.task_id} deleted at {self.deleted_at}"
+
+
+# A revoked refresh token (tasks/revocation.py), kept until the token would
+# have expired anyway; `manage.py prune_revoked_tokens` deletes it after that.
+# No FK constraint, like TaskReminder: revoking shouldn't need the user row.
+class RevokedToken(models.Model):
+    jti = models.CharField(max_length=255, unique=True)
+    user = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, null=True, related_name='+')
+    expires_at = models.DateTimeField(db_index=True)
+    revoked_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"Revoked token {self.jti}"
+
+
+# Refresh tokens carry the user's generation when issued; bumping it revokes
+# every token issued before. Users without a row are at generation 0.
+class TokenGeneration(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='+')
+    generation = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Token generation {self.generation} of user {self.user_id}"
+
+
+# Shard holding a user's task data when TASK_SHARDS is set (tasks/sharding.py).
+# Users without a row keep their tasks on 'default'.
+class UserShard(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='+')
+    shard = models.CharField(max_length=100)
+    # Set while tasks/rebalance.py moves the user's tasks; writes are refused
+    moving = models.BooleanField(default=False)
+
+    def __str__(self):
+        return f"User {self.user_id} on {self.shard}"
+
+
+# Inverted index over task title/description, used for ?search= on backends
+# without a native FULLTEXT index (see tasks/search.py)
+class TaskSearchTerm(models.Model):
+    task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='search_terms')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    term = models.CharField(max_length=64)
+    weight = models.PositiveIntegerField(default=1)
+
+    objects = ShardedQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'term']),
+            models.Index(fields=['term']),
+        ]
+
+    def __str__(self):
+        return self.term
+
+
+# Completed tasks moved out of the Task table by `manage.py archive_tasks`
+# (tasks/archive.py), keeping their id and timestamps so they can be restored.
+# Only listed with ?include_archived=true; lives on the user's shard like Task.
+class ArchivedTask(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    title = models.CharField(max_length=255)
+    description = models.TextField()
+    priority = models.CharField(max_length=6, choices=Task.PRIORITY_CHOICES)
+    status = models.CharField(max_length=20, choices=Task.STATUS_CHOICES)
+    deadline = models.DateField()
+
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    objects = ShardedQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['-created_at']
+        # The list's keyset paginations; the archive is only read per user
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'id']),
+            models.Index(fields=['user', 'deadline', 'id']),
         ]
 
     def __str__(self):
@@ -39,9 +235,20 @@ class Task(models.Model):
 
 
 class UserProfile(models.Model):
+    PHOTO_STATUS_CHOICES = [
+        ('none', 'None'),
+        ('processing', 'Processing'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    ]
+
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
-    photo = models.ImageField(upload_to='profile_photos/', null=True, blank=True)
-    
+    # Stored under the sha256 of its content (tasks/storage.py)
+    photo = models.ImageField(upload_to='profile_photos/', storage=get_photo_storage, null=True, blank=True)
+    # Resized renditions of photo built by tasks/images.py: {size: {format: name}}
+    thumbnails = models.JSONField(default=dict, blank=True)
+    photo_status = models.CharField(max_length=10, choices=PHOTO_STATUS_CHOICES, default='none')
+
     def __str__(self):
         return f"{self.user.username}'s profile"
 
@@ -50,29 +257,33 @@ class UserProfile(models.Model):
             models.Index(fields=['user']),
         ]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored photo so save() can spot a replacement without refetching
+        if 'photo' in field_names:
+            instance._loaded_photo = instance.photo.name
+        return instance
+
     def save(self, *args, **kwargs):
-        # Delete old photo when updating
-        if self.pk:
-            try:
-                old_profile = UserProfile.objects.get(pk=self.pk)
-                if old_profile.photo and old_profile.photo != self.photo:
-                    old_profile.photo.delete(save=False)
-            except UserProfile.DoesNotExist:
-                pass
+        old_photo = getattr(self, '_loaded_photo', None)
         super().save(*args, **kwargs)
+        self._loaded_photo = self.photo.name
+        # Delete the replaced photo once committed
+        if old_photo and old_photo != self.photo.name:
+            transaction.on_commit(lambda: delete_unused_photo(self.photo.storage, old_photo))
 
 
-# Signals to automatically create/update UserProfile
-@receiver(post_save, sender=User)
-def create_user_profile(sender, instance, created, **kwargs):
-    """Create UserProfile when User is created"""
-    if created:
-        UserProfile.objects.get_or_create(user=instance)
+def delete_unused_photo(storage, name):
+    # Identical uploads share one file; keep it while referenced
+    if not UserProfile.objects.filter(photo=name).exists():
+        storage.delete(name)
 
+
+# Signal to automatically create the UserProfile. Later User saves (e.g. the
+# last_login update on every login) don't touch the profile.
 @receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    """Save UserProfile when User is saved"""
-    try:
-        instance.profile.save()
-    except UserProfile.DoesNotExist:
-        UserProfile.objects.create(user=instance)
\ No newline at end of file
+def create_user_profile(sender, instance, created, raw=False, **kwargs):
+    """Create UserProfile when User is created"""
+    if created and not raw:
+        UserProfile.objects.create(user=instance)
@@ -0,0 +1,151 @@
+# tasks/pagination.py
+
+import json
+from base64 import b64decode, b64encode
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, CursorPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+# Cursor pagination for the superuser dashboard sub-resources.
+# Pages are located with an indexed WHERE clause instead of OFFSET and no
+# COUNT(*) is issued, so every page costs the same single query.
+class DashboardCursorPagination(CursorPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = '-id'
+
+
+# Keyset pagination for the task list on (created_at, id) or (deadline, id).
+# The cursor carries the sort value and id of the boundary row, so every page
+# is an index range scan on the matching (user, <field>, id) index and costs
+# the same as the first one. No COUNT(*) is run unless ?count=true is passed.
+class TaskKeysetPagination(BasePagination):
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    ordering_query_param = 'ordering'
+    ordering_fields = ['created_at', 'deadline']
+    default_ordering = '-created_at'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_queryset = self.get_page_queryset(queryset, request)
+        if self.count_requested:
+            self.count = queryset.count()
+        return self.set_page(list(page_queryset))
+
+    async def apaginate_queryset(self, queryset, request):
+        # Same as paginate_queryset, for async views
+        page_queryset = self.get_page_queryset(queryset, request)
+        if self.count_requested:
+            self.count = await queryset.acount()
+        return self.set_page([obj async for obj in page_queryset])
+
+    def get_page_queryset(self, queryset, request):
+        """Build (without running) the query for the requested page plus one row."""
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(request)
+        self.field_name = self.ordering.lstrip('-')
+        field = queryset.model._meta.get_field(self.field_name)
+        self.cursor = self.decode_cursor(request, field)
+        self.count = None
+        self.count_requested = request.query_params.get('count') in ('1', 'true')
+
+        # Walking backwards (previous page) flips the scan direction
+        field_name, cursor = self.field_name, self.cursor
+        descending = self.ordering.startswith('-') != cursor['reverse']
+        if cursor['value'] is not None:
+            lookup = 'lt' if descending else 'gt'
+            queryset = queryset.filter(
+                Q(**{f'{field_name}__{lookup}': cursor['value']}) |
+                Q(**{field_name: cursor['value'], f'id__{lookup}': cursor['id']})
+            )
+        prefix = '-' if descending else ''
+        queryset = queryset.order_by(f'{prefix}{field_name}', f'{prefix}id')
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, results):
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if self.cursor['reverse']:
+            results.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.cursor['value'] is not None
+
+        self.page = results
+        return results
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+            if page_size > 0:
+                return min(page_size, self.max_page_size)
+        except (KeyError, ValueError):
+            pass
+        return self.page_size
+
+    def get_ordering(self, request):
+        ordering = request.query_params.get(self.ordering_query_param, self.default_ordering)
+        if ordering.lstrip('-') not in self.ordering_fields:
+            return self.default_ordering
+        return ordering
+
+    def decode_cursor(self, request, field):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return {'value': None, 'id': None, 'reverse': False}
+        try:
+            data = json.loads(b64decode(encoded.encode('ascii')).decode('utf-8'))
+            return {
+                'value': field.to_python(data['v']),
+                'id': int(data['id']),
+                'reverse': bool(data.get('r', False)),
+            }
+        except (TypeError, ValueError, KeyError, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, obj, reverse):
+        # Pages hold model instances or .values() rows (TaskListView)
+        if isinstance(obj, dict):
+            value, pk = obj[self.field_name], obj['id']
+        else:
+            value, pk = getattr(obj, self.field_name), obj.pk
+        data = {'v': value.isoformat(), 'id': pk}
+        if reverse:
+            data['r'] = True
+        encoded = b64encode(json.dumps(data).encode('utf-8')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_data(self, data):
+        response = {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        }
+        if self.count is not None:
+            response = {'count': self.count, **response}
+        return response
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
@@ -0,0 +1,179 @@
+# tasks/rebalance.py
+#
+# Moves users' task data to another shard while they keep using the app
+# (`manage.py rebalance_task_shards`). For a batch of users:
+#
+# 1. copy: their tasks, search terms and archived tasks are copied to the target shard in
+#    id-ordered batches. Users keep reading and writing on the source.
+# 2. freeze: their UserShard rows are marked moving. Writes to their tasks
+#    are refused with 503 (ShardMoving), reads still use the source. Writes
+#    that passed the check just before get TASK_SHARD_MOVE_GRACE seconds to
+#    finish.
+# 3. catch up: tasks changed since the copy started (with the same
+#    TASK_SYNC_OVERLAP_SECONDS margin as incremental sync) are copied again,
+#    ones deleted meanwhile are dropped, and reminders, tombstones and the
+#    TaskStats counters are brought over.
+# 4. switch: the rows point at the target and writes are accepted again.
+#    After another grace period, for requests still reading the source, the
+#    data is deleted there.
+#
+# If anything fails before the switch, the copies are removed and the users
+# stay where they were. A user left frozen by an interrupted run is simply
+# moved again by the next one.
+
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, DatabaseError
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import ArchivedTask, Task, TaskReminder, TaskSearchTerm, TaskStats, TaskTombstone, UserShard
+from .sharding import get_ring, get_setting, set_placement
+
+
+def chunks(items, size):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def plan_moves():
+    """(user_id, target) for every user not on the shard the ring assigns them."""
+    ring = get_ring()
+    placements = dict(UserShard.objects.using(DEFAULT_DB_ALIAS).values_list('user_id', 'shard'))
+    frozen = set(UserShard.objects.using(DEFAULT_DB_ALIAS).filter(moving=True).values_list('user_id', flat=True))
+    users = User.objects.using(DEFAULT_DB_ALIAS)
+    for user_id in users.order_by('id').values_list('id', flat=True).iterator(chunk_size=10000):
+        target = ring.get(user_id)
+        if placements.get(user_id, DEFAULT_DB_ALIAS) != target or user_id in frozen:
+            yield user_id, target
+
+
+def insert_rows(model, objs, using):
+    # Raw, as loaddata does: auto_now/auto_now_add fields keep the copied values
+    model._base_manager.using(using)._insert(objs, fields=model._meta.concrete_fields, raw=True, using=using)
+
+
+def copy_search_terms(task_ids, source, target):
+    rows = TaskSearchTerm.objects.using(source).filter(task_id__in=task_ids).values('task_id', 'user_id', 'term', 'weight')
+    TaskSearchTerm.objects.using(target).bulk_create([TaskSearchTerm(**row) for row in rows])
+
+
+def delete_tasks(task_ids, using):
+    TaskSearchTerm.objects.using(using).filter(task_id__in=task_ids).delete()
+    # _raw_delete skips the Task receivers: the tasks move, they aren't deleted
+    Task.objects.using(using).filter(id__in=task_ids)._raw_delete(using)
+
+
+def clear_user(user_id, using, batch_size):
+    """Delete the user's task data from one database."""
+    task_ids = Task.objects.using(using).filter(user_id=user_id).values_list('id', flat=True)
+    for ids in chunks(task_ids, batch_size):
+        TaskReminder.objects.using(using).filter(task_id__in=ids).delete()
+        delete_tasks(ids, using)
+    TaskStats.objects.using(using).filter(user_id=user_id).delete()
+    TaskTombstone.objects.using(using).filter(user_id=user_id).delete()
+    ArchivedTask.objects.using(using).filter(user_id=user_id)._raw_delete(using)
+
+
+def copy_user(user_id, source, target, batch_size):
+    # Leftovers of an interrupted move would collide with the copies
+    clear_user(user_id, target, batch_size)
+    for model in (Task, ArchivedTask):
+        rows = model.objects.using(source).filter(user_id=user_id).order_by('id')
+        last_id = 0
+        while True:
+            batch = list(rows.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            insert_rows(model, batch, target)
+            if model is Task:
+                copy_search_terms([task.pk for task in batch], source, target)
+            last_id = batch[-1].pk
+
+
+def catch_up(user_id, source, target, since, batch_size):
+    """Bring the target in line with the (now frozen) source. Returns the number of tasks."""
+    source_tasks = Task.objects.using(source).filter(user_id=user_id)
+    source_ids = set(source_tasks.values_list('id', flat=True))
+    target_ids = set(Task.objects.using(target).filter(user_id=user_id).values_list('id', flat=True))
+    changed = set(source_tasks.filter(updated_at__gte=since).values_list('id', flat=True))
+
+    for ids in chunks((target_ids - source_ids) | (changed & target_ids), batch_size):
+        delete_tasks(ids, target)
+    for ids in chunks(sorted((source_ids - target_ids) | changed), batch_size):
+        insert_rows(Task, list(source_tasks.filter(id__in=ids)), target)
+        copy_search_terms(ids, source, target)
+
+    # Archived rows don't change, but tasks may have been archived or
+    # restored since the copy
+    source_archived = ArchivedTask.objects.using(source).filter(user_id=user_id)
+    archived_ids = set(source_archived.values_list('id', flat=True))
+    target_archived = set(ArchivedTask.objects.using(target).filter(user_id=user_id).values_list('id', flat=True))
+    ArchivedTask.objects.using(target).filter(id__in=list(target_archived - archived_ids))._raw_delete(target)
+    for ids in chunks(sorted(archived_ids - target_archived), batch_size):
+        insert_rows(ArchivedTask, list(source_archived.filter(id__in=ids)), target)
+
+    for ids in chunks(sorted(source_ids), batch_size):
+        reminders = TaskReminder.objects.using(source).filter(task_id__in=ids).values('task_id', 'kind', 'deadline')
+        TaskReminder.objects.using(target).bulk_create([TaskReminder(**row) for row in reminders], ignore_conflicts=True)
+    tombstones = TaskTombstone.objects.using(source).filter(user_id=user_id).values('user_id', 'task_id', 'deleted_at')
+    TaskTombstone.objects.using(target).bulk_create([TaskTombstone(**row) for row in tombstones], batch_size=batch_size)
+    counters = (
+        Task.objects.using(target).filter(user_id=user_id).order_by()
+        .values('status', 'priority').annotate(count=Count('id'))
+    )
+    TaskStats.objects.using(target).bulk_create([TaskStats(user_id=user_id, **row) for row in counters])
+    return len(source_ids)
+
+
+def move_users(moves, batch_size=None):
+    """
+    Move each (user_id, target) of moves. Returns ({user_id: tasks moved},
+    {user_id: error}); users whose copy fails (e.g. a task id already taken
+    on the target) stay where they are.
+    """
+    batch_size = batch_size or get_setting('TASK_SHARD_MOVE_BATCH_SIZE', 500)
+    grace = get_setting('TASK_SHARD_MOVE_GRACE', 5)
+    since = timezone.now() - timedelta(seconds=get_setting('TASK_SYNC_OVERLAP_SECONDS', 30))
+    placements = dict(
+        UserShard.objects.using(DEFAULT_DB_ALIAS).filter(user_id__in=[user_id for user_id, _ in moves])
+        .values_list('user_id', 'shard')
+    )
+    pending, moved, failed = {}, {}, {}
+    for user_id, target in moves:
+        source = placements.get(user_id, DEFAULT_DB_ALIAS)
+        if source == target:
+            # Nothing to move; lifts a freeze left by an interrupted run
+            set_placement(user_id, source)
+            continue
+        try:
+            copy_user(user_id, source, target, batch_size)
+        except DatabaseError as e:
+            clear_user(user_id, target, batch_size)
+            failed[user_id] = str(e)
+        else:
+            pending[user_id] = (source, target)
+    if not pending:
+        return moved, failed
+
+    try:
+        for user_id, (source, _) in pending.items():
+            set_placement(user_id, source, moving=True)
+        time.sleep(grace)
+        for user_id, (source, target) in pending.items():
+            moved[user_id] = catch_up(user_id, source, target, since, batch_size)
+    except BaseException:
+        for user_id, (source, target) in pending.items():
+            clear_user(user_id, target, batch_size)
+            set_placement(user_id, source)
+        raise
+
+    for user_id, (_, target) in pending.items():
+        set_placement(user_id, target)
+    time.sleep(grace)
+    for user_id, (source, _) in pending.items():
+        clear_user(user_id, source, batch_size)
+    return moved, failed
@@ -0,0 +1,174 @@
+# tasks/revocation.py
+#
+# Refresh-token revocation. Replaces simplejwt's token_blacklist app, whose
+# OutstandingToken/BlacklistedToken tables keep a row per issued token
+# forever and cost several queries per refresh.
+#
+# - A revoked token is one RevokedToken row keyed by its jti. The row expires
+#   with the token, and `manage.py prune_revoked_tokens` deletes expired rows
+#   in batches.
+# - Revoking a token is a single INSERT. The unique jti also makes rotation
+#   atomic: if two refreshes race on one token, only one of them succeeds.
+# - Every process keeps a Bloom filter of the revoked jtis. It is topped up
+#   from the revoked_at index every TOKEN_REVOCATION_SYNC_SECONDS, so most
+#   "is this token revoked?" checks are answered without a query. A
+#   revocation made by another process may go unseen for up to that long;
+#   rotation still catches it because the INSERT conflicts.
+# - Revoking all of a user's tokens bumps their TokenGeneration. Refresh
+#   tokens carry the generation they were issued under (GENERATION_CLAIM).
+
+import hashlib
+import math
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from .models import RevokedToken, TokenGeneration
+
+GENERATION_CLAIM = 'gen'
+
+
+def get_setting(name, default):
+    return getattr(settings, name, default)
+
+
+class BloomFilter:
+    """Set membership with no false negatives and error_rate false positives."""
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def positions(self, key):
+        # Double hashing: k positions from the two halves of one digest
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        a, b = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(a + i * b) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        for position in self.positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(key))
+
+
+class RevocationFilter:
+    """This process's Bloom filter of revoked jtis, kept in step with the table."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.bloom = None
+        self.synced_at = None
+        self.checked = 0.0
+
+    def sync(self, force=False):
+        interval = get_setting('TOKEN_REVOCATION_SYNC_SECONDS', 5)
+        if not force and time.monotonic() - self.checked < interval:
+            return
+        with self.lock:
+            now = timezone.now()
+            capacity = get_setting('TOKEN_REVOCATION_FILTER_CAPACITY', 1_000_000)
+            if self.bloom is None or self.bloom.count >= self.bloom.capacity:
+                # First use, or full (expired entries included): rebuild from
+                # the tokens that are still live
+                rows = RevokedToken.objects.filter(expires_at__gt=now)
+                count = rows.count()
+                self.bloom = BloomFilter(max(capacity, count * 2))
+            else:
+                # Rows written by a transaction that committed late can carry an
+                # earlier revoked_at, so re-read a little before the last sync
+                rows = RevokedToken.objects.filter(revoked_at__gte=self.synced_at - timedelta(seconds=interval))
+            for jti in rows.values_list('jti', flat=True).iterator(chunk_size=10000):
+                self.bloom.add(jti)
+            self.synced_at = now
+            self.checked = time.monotonic()
+
+    def add(self, jti):
+        with self.lock:
+            if self.bloom is not None:
+                self.bloom.add(jti)
+
+    def __contains__(self, jti):
+        self.sync()
+        return jti in self.bloom
+
+
+revocation_filter = RevocationFilter()
+
+
+def is_revoked(jti):
+    # Only a Bloom filter hit (revoked, or a false positive) needs the query
+    return jti in revocation_filter and RevokedToken.objects.filter(jti=jti).exists()
+
+
+def revoke_token(token):
+    """Revoke a refresh token. False if it had already been revoked."""
+    jti = token[api_settings.JTI_CLAIM]
+    try:
+        with transaction.atomic():
+            RevokedToken.objects.create(
+                jti=jti,
+                user_id=token.get(api_settings.USER_ID_CLAIM),
+                expires_at=datetime_from_epoch(token['exp']),
+            )
+    except IntegrityError:
+        return False
+    revocation_filter.add(jti)
+    return True
+
+
+def generation_key(user_id):
+    return f'tokens:generation:{user_id}'
+
+
+def get_generation(user_id):
+    key = generation_key(user_id)
+    generation = cache.get(key)
+    if generation is None:
+        generation = TokenGeneration.objects.filter(user_id=user_id).values_list('generation', flat=True).first() or 0
+        cache.set(key, generation, get_setting('TOKEN_GENERATION_CACHE_TIMEOUT', 60))
+    return generation
+
+
+def revoke_all_tokens(user_id):
+    """Revoke every refresh token issued to the user so far."""
+    with transaction.atomic():
+        TokenGeneration.objects.get_or_create(user_id=user_id)
+        TokenGeneration.objects.filter(user_id=user_id).update(generation=F('generation') + 1)
+    # Processes caching the old generation in a local (non-shared) cache
+    # notice within TOKEN_GENERATION_CACHE_TIMEOUT
+    transaction.on_commit(lambda: cache.delete(generation_key(user_id)))
+
+
+def check_token(token):
+    """The reason the refresh token was revoked, or None if it is still valid."""
+    user_id = token.get(api_settings.USER_ID_CLAIM)
+    if user_id is not None and token.get(GENERATION_CLAIM, 0) < get_generation(user_id):
+        return 'Token has been revoked'
+    if is_revoked(token[api_settings.JTI_CLAIM]):
+        return 'Token is blacklisted'
+    return None
+
+
+def prune_revoked_tokens(batch_size=1000):
+    """Delete expired RevokedToken rows, batch_size at a time."""
+    deleted = 0
+    expired = RevokedToken.objects.filter(expires_at__lte=timezone.now())
+    while True:
+        ids = list(expired.values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += RevokedToken.objects.filter(id__in=ids).delete()[0]
@@ -0,0 +1,218 @@
+# tasks/routers.py
+#
+# Primary/replica routing. Writes go to the primary ('default'); reads go to
+# a healthy alias from DATABASE_REPLICAS, except:
+#
+# - inside a transaction on the primary, which must see its own writes;
+# - for the rest of a request that has written anything;
+# - for REPLICA_STICKY_SECONDS after the requesting user last wrote, so a
+#   task created through TaskCreateView is in that user's next list even
+#   though the replicas haven't caught up yet. The marker is kept in the
+#   cache, which must be shared between workers for this to hold across them;
+# - when no replica is healthy. Each process checks a replica at most every
+#   REPLICA_CHECK_INTERVAL seconds; one that is unreachable, or more than
+#   REPLICA_MAX_LAG_SECONDS behind, gets no reads until a later check passes.
+#
+# ReplicaRoutingMiddleware gives the router the current request. Outside of
+# requests (commands, scanners) only the transaction and health rules apply.
+
+import logging
+import random
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.functional import empty
+
+logger = logging.getLogger(__name__)
+
+PRIMARY = DEFAULT_DB_ALIAS
+
+_request_state = ContextVar('replica_routing_state', default=None)
+
+
+def get_setting(name, default):
+    return getattr(settings, name, default)
+
+
+def get_replicas():
+    return get_setting('DATABASE_REPLICAS', [])
+
+
+def pin_key(user_id):
+    return f'db:pinned:{user_id}'
+
+
+def pin_user(user_id):
+    """Send the user's reads to the primary for the next REPLICA_STICKY_SECONDS."""
+    cache.set(pin_key(user_id), True, get_setting('REPLICA_STICKY_SECONDS', 10))
+
+
+def get_request_user_id(request):
+    # Only a user that is already known: evaluating the session-backed lazy
+    # user would run a query from inside the router
+    user = request.__dict__.get('user')
+    if user is None or getattr(user, '_wrapped', None) is empty:
+        return None
+    if not user.is_authenticated:
+        return None
+    return user.pk
+
+
+class RequestState:
+    __slots__ = ('request', 'pinned', 'checked_user_id')
+
+    def __init__(self, request):
+        self.request = request
+        self.pinned = False
+        self.checked_user_id = None
+
+    def uses_primary(self):
+        if self.pinned:
+            return True
+        user_id = get_request_user_id(self.request)
+        if user_id is not None and user_id != self.checked_user_id:
+            # One cache lookup per request, once authentication has run
+            self.checked_user_id = user_id
+            self.pinned = bool(cache.get(pin_key(user_id)))
+        return self.pinned
+
+    def wrote(self):
+        self.pinned = True
+        user_id = get_request_user_id(self.request)
+        if user_id is not None:
+            pin_user(user_id)
+
+
+def get_lag(alias):
+    """Seconds the replica is behind its primary; None if it isn't replicating."""
+    connection = connections[alias]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            try:
+                cursor.execute('SHOW REPLICA STATUS')
+                column = 'Seconds_Behind_Source'
+            except Exception:
+                # MySQL before 8.0.22 and MariaDB
+                cursor.execute('SHOW SLAVE STATUS')
+                column = 'Seconds_Behind_Master'
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            columns = [col[0] for col in cursor.description]
+            return dict(zip(columns, row)).get(column)
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)')
+            return float(cursor.fetchone()[0])
+        # No replication to measure (e.g. SQLite stand-ins in development)
+        cursor.execute('SELECT 1')
+        return 0
+
+
+class ReplicaHealth:
+    """Per-process view of which replicas can take reads."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.status = {}
+
+    def is_healthy(self, alias):
+        healthy, checked_at = self.status.get(alias, (None, None))
+        if checked_at is None or time.monotonic() - checked_at >= get_setting('REPLICA_CHECK_INTERVAL', 10):
+            # Other threads keep using the previous result meanwhile
+            if self.lock.acquire(blocking=checked_at is None):
+                try:
+                    healthy = self.check(alias)
+                finally:
+                    self.lock.release()
+        return bool(healthy)
+
+    def check(self, alias):
+        try:
+            lag = get_lag(alias)
+        except Exception as e:
+            lag, error = None, e
+        else:
+            error = None
+        healthy = lag is not None and lag <= get_setting('REPLICA_MAX_LAG_SECONDS', 5)
+        previous = self.status.get(alias, (None, None))[0]
+        # Log changes, and a replica that is unhealthy from the start
+        if healthy != previous and (previous is not None or not healthy):
+            logger.warning(
+                'Replica %s is %s (lag: %s%s)', alias, 'healthy again' if healthy else 'not taking reads',
+                lag, f', error: {error}' if error else '',
+            )
+        self.status[alias] = (healthy, time.monotonic())
+        return healthy
+
+
+health = ReplicaHealth()
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = get_replicas()
+        if not replicas or self.use_primary():
+            return PRIMARY
+        healthy = [alias for alias in replicas if health.is_healthy(alias)]
+        return random.choice(healthy) if healthy else PRIMARY
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None and get_replicas():
+            state.wrote()
+        return PRIMARY
+
+    def use_primary(self):
+        if connections[PRIMARY].in_atomic_block:
+            return True
+        state = _request_state.get()
+        return state is not None and state.uses_primary()
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        databases = {PRIMARY, *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get the schema through replication
+        if db in get_replicas():
+            return False
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """Makes the current request available to ReplicaRouter."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        token = _request_state.set(RequestState(request))
+        try:
+            return self.get_response(request)
+        finally:
+            _request_state.reset(token)
+
+    async def __acall__(self, request):
+        # sync_to_async copies the context, so ORM calls made from async
+        # views see the same state
+        token = _request_state.set(RequestState(request))
+        try:
+            return await self.get_response(request)
+        finally:
+            _request_state.reset(token)
@@ -0,0 +1,92 @@
+# tasks/search.py
+
+import re
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Sum
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import Task, TaskSearchTerm
+from .sharding import group_by_shard
+
+# Title matches count for more than description matches when ranking
+TITLE_WEIGHT = 3
+DESCRIPTION_WEIGHT = 1
+
+MAX_TERM_LENGTH = 64
+WORD_RE = re.compile(r'\w+')
+
+
+def get_search_backend():
+    """'fulltext' on MySQL (native FULLTEXT index), 'index' everywhere else."""
+    backend = getattr(settings, 'TASK_SEARCH_BACKEND', None)
+    if backend:
+        return backend
+    return 'fulltext' if connection.vendor == 'mysql' else 'index'
+
+
+def tokenize(text):
+    return [
+        word[:MAX_TERM_LENGTH] for word in WORD_RE.findall(text.lower())
+        if len(word) > 1
+    ]
+
+
+def build_terms(task):
+    weights = Counter()
+    for term in tokenize(task.title):
+        weights[term] += TITLE_WEIGHT
+    for term in tokenize(task.description):
+        weights[term] += DESCRIPTION_WEIGHT
+    return [
+        TaskSearchTerm(task_id=task.pk, user_id=task.user_id, term=term, weight=weight)
+        for term, weight in weights.items()
+    ]
+
+
+def index_tasks(tasks):
+    """(Re)build the inverted index rows for the given saved tasks.
+
+    Call this after bulk_create/bulk_update, which bypass the post_save hook.
+    """
+    if get_search_backend() != 'index':
+        return
+    tasks = list(tasks)
+    if not tasks:
+        return
+    for shard, group in group_by_shard(tasks).items():
+        terms = TaskSearchTerm.objects.using(shard)
+        terms.filter(task__in=[task.pk for task in group]).delete()
+        terms.bulk_create([term for task in group for term in build_terms(task)], batch_size=1000)
+
+
+def search_tasks(queryset, query):
+    """Filter queryset to tasks matching query, best matches first."""
+    if get_search_backend() == 'fulltext':
+        rank = RawSQL(
+            'MATCH (tasks_task.title, tasks_task.description) AGAINST (%s IN NATURAL LANGUAGE MODE)',
+            (query,),
+        )
+        return queryset.annotate(rank=rank).filter(rank__gt=0).order_by('-rank', '-id')
+
+    terms = set(tokenize(query))
+    if not terms:
+        return queryset.none()
+    return (
+        queryset.filter(search_terms__term__in=terms)
+        .annotate(rank=Sum('search_terms__weight'))
+        .order_by('-rank', '-id')
+    )
+
+
+# Keep the index in step with task writes. Deleting a task removes its terms
+# through the CASCADE foreign key.
+@receiver(post_save, sender=Task)
+def index_task(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not {'title', 'description'} & set(update_fields):
+        return
+    index_tasks([instance])
@@ -1,9 +1,15 @@
 # tasks/serializers.py
 
+from datetime import date
+
+from django.conf import settings
 from django.contrib.auth.models import User
-from rest_framework import serializers
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
 from django.contrib.auth import authenticate
 from .models import Task,UserProfile
+from .images import replace_profile_photo, user_photo_data
 from django.contrib.auth.password_validation import validate_password
 
 class TaskSerializer(serializers.ModelSerializer):
@@ -11,8 +17,95 @@ class TaskSerializer(serializers.ModelSerializer):
         model = Task
         fields = ['id', 'title', 'description', 'priority', 'status', 'deadline', 'created_at', 'updated_at']
         read_only_fields = ['id', 'user', 'created_at', 'updated_at']
-        
-        
+
+
+def is_iso(field, default_format):
+    output_format = getattr(field, 'format', default_format)
+    return isinstance(output_format, str) and output_format.lower() == ISO_8601
+
+
+def datetime_converter(field, current_timezone):
+    field_timezone = getattr(field, 'timezone', current_timezone)
+
+    # DateTimeField.to_representation for ISO output, minus the per-value
+    # timezone lookup
+    def convert(value):
+        if field_timezone is not None:
+            if value.tzinfo is None:
+                return field.to_representation(value)
+            value = value.astimezone(field_timezone)
+        value = value.isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+    return convert
+
+
+class RowSerializer:
+    """
+    Read-only fast path for listings: turns .values() rows into the dicts the
+    serializer would produce. The per-field conversions are picked once from
+    the serializer's fields; strings, choices and integers pass through and
+    ISO dates/datetimes are formatted directly, anything else falls back to
+    the DRF field. Only flat fields (no dotted sources) are supported.
+    """
+
+    def __init__(self, serializer_class):
+        self.pairs = []
+        self.converters = []
+        for name, field in serializer_class().fields.items():
+            if field.write_only:
+                continue
+            self.pairs.append((name, field.source))
+            make_converter = self.get_converter_factory(field)
+            if make_converter is not None:
+                self.converters.append((name, make_converter))
+        self.fields = [source for _, source in self.pairs]
+
+    def get_converter_factory(self, field):
+        # Factories take the active timezone, looked up once per call to many()
+        if isinstance(field, (serializers.CharField, serializers.ChoiceField, serializers.IntegerField)):
+            return None
+        if isinstance(field, serializers.DateTimeField) and is_iso(field, api_settings.DATETIME_FORMAT):
+            return lambda current_timezone: datetime_converter(field, current_timezone)
+        if isinstance(field, serializers.DateField) and is_iso(field, api_settings.DATE_FORMAT):
+            return lambda current_timezone: date.isoformat
+        return lambda current_timezone: field.to_representation
+
+    def many(self, rows):
+        current_timezone = timezone.get_current_timezone() if settings.USE_TZ else None
+        pairs = self.pairs
+        converters = [(name, make_converter(current_timezone)) for name, make_converter in self.converters]
+        results = []
+        for row in rows:
+            data = {name: row[source] for name, source in pairs}
+            for name, convert in converters:
+                value = data[name]
+                if value is not None:
+                    data[name] = convert(value)
+            results.append(data)
+        return results
+
+
+task_row_serializer = RowSerializer(TaskSerializer)
+
+
+# Serializers for the superuser dashboard sub-resources
+class DashboardUserSerializer(serializers.ModelSerializer):
+    task_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = User
+        fields = ['id', 'username', 'email', 'is_active', 'task_count']
+
+
+class DashboardTaskSerializer(serializers.ModelSerializer):
+    user = serializers.CharField(source='user.username', read_only=True)
+
+    class Meta:
+        model = Task
+        fields = ['id', 'title', 'description', 'priority', 'status', 'deadline', 'created_at', 'user']
+
+
+
 # Serializer for user registration
 class UserRegisterSerializer(serializers.ModelSerializer):
     class Meta:
@@ -85,35 +178,28 @@ class UpdateProfileSerializer(serializers.Serializer):
 
     def update(self, instance, validated_data):
         # Update user fields
-        if 'username' in validated_data:
-            instance.username = validated_data['username']
-        if 'email' in validated_data:
-            instance.email = validated_data['email']
+        update_fields = [name for name in ('username', 'email') if name in validated_data]
+        for name in update_fields:
+            setattr(instance, name, validated_data[name])
         if 'password' in validated_data:
             instance.set_password(validated_data['password'])
+            update_fields.append('password')
         
-        # Update profile photo
+        # Update profile photo (processed in the background)
         if 'photo' in validated_data:
             profile, created = UserProfile.objects.get_or_create(user=instance)
-            profile.photo = validated_data['photo']
-            profile.save()
+            replace_profile_photo(profile, validated_data['photo'])
         
-        instance.save()
+        if update_fields:
+            instance.save(update_fields=update_fields)
         return instance
 
     def to_representation(self, instance):
         request = self.context.get('request')
-        photo_url = None
-        try:
-            if instance.profile.photo:
-                photo_url = request.build_absolute_uri(instance.profile.photo.url)
-        except UserProfile.DoesNotExist:
-            pass
-
         return {
             'username': instance.username,
             'email': instance.email,
-            'photo': photo_url
+            **user_photo_data(request, instance)
         }
     
 class SuperuserLoginSerializer(serializers.Serializer):
@@ -0,0 +1,395 @@
+# tasks/sharding.py
+#
+# Optional sharding of task data by user. With TASK_SHARDS set to a list of
+# database aliases, each user's tasks and the rows derived from them (search
+# terms, TaskStats counters, tombstones, archived tasks) live in one of those
+# databases. Users, profiles and tokens stay on 'default'.
+#
+# - New users are placed by a consistent-hash ring over TASK_SHARDS
+#   (TASK_SHARD_VNODES points per shard), recorded in the UserShard directory
+#   on 'default'. Users without a row (created before sharding was turned on)
+#   keep their tasks on 'default'.
+# - Sharded models use ShardedQuerySet. Filtering on a user (user_id=...,
+#   user=...) sends the query to that user's shard when it runs, so the
+#   user-scoped views work unchanged. create() and bulk_create() route each
+#   row by its user, and TaskShardRouter routes instance saves and deletes.
+# - Queries over every user's tasks (superuser views, the deadline scanner,
+#   maintenance commands) visit each shard via all_shards(), each_shard()
+#   or scatter().
+# - Adding a shard to TASK_SHARDS only changes the placement of about 1/N of
+#   the users; `manage.py rebalance_task_shards` moves them online
+#   (tasks/rebalance.py).
+#
+# Shards are migrated like 'default' (`migrate --database=<alias>`), except
+# that their user FKs have no constraint: the users live on 'default'
+# (AlterFieldOutsideShards). Task ids
+# must stay unique across shards, so give each shard its own id range (e.g.
+# MySQL auto_increment_offset/auto_increment_increment). Placements are
+# cached in the default cache, which must be shared between workers.
+
+import bisect
+import hashlib
+from functools import cmp_to_key
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, migrations
+from django.db.models import QuerySet
+from django.db.models.signals import post_save, pre_delete
+from django.dispatch import receiver
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+# Models of the tasks app stored on the owner's shard
+SHARDED_MODELS = {'task', 'taskstats', 'tasksearchterm', 'tasktombstone', 'archivedtask'}
+
+# Filters that pin a query to one user
+SHARD_KEYS = ('user_id', 'user', 'user__id', 'user__pk', 'user_id__exact', 'user__exact')
+
+
+def get_setting(name, default):
+    return getattr(settings, name, default)
+
+
+def get_shards():
+    return get_setting('TASK_SHARDS', [])
+
+
+def sharding_enabled():
+    return bool(get_shards())
+
+
+def all_shards():
+    """Aliases to visit for a query over every user's task data. [None] (the
+    routers' choice, as for any query) when sharding is off."""
+    if not sharding_enabled():
+        return [None]
+    # 'default' too: users placed before sharding keep their tasks there
+    return list(dict.fromkeys([DEFAULT_DB_ALIAS, *get_shards()]))
+
+
+def is_shard_database(alias):
+    """Whether alias only holds task data. Every database but 'default' is
+    treated as one, whatever TASK_SHARDS says when it is migrated."""
+    return alias != DEFAULT_DB_ALIAS
+
+
+class AlterFieldOutsideShards(migrations.AlterField):
+    """AlterField that leaves shard schemas alone. Used to keep the FK
+    constraint of a sharded model's user on 'default' only: a shard's own
+    users table is empty."""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if not is_shard_database(schema_editor.connection.alias):
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if not is_shard_database(schema_editor.connection.alias):
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class HashRing:
+    """Consistent hashing: adding a node only remaps the keys it takes over."""
+
+    def __init__(self, nodes, vnodes=100):
+        self.points = sorted((self.hash(f'{node}#{i}'), node) for node in nodes for i in range(vnodes))
+        self.hashes = [point for point, _ in self.points]
+
+    @staticmethod
+    def hash(key):
+        return int.from_bytes(hashlib.blake2b(str(key).encode('utf-8'), digest_size=8).digest(), 'big')
+
+    def get(self, key):
+        index = bisect.bisect(self.hashes, self.hash(key)) % len(self.points)
+        return self.points[index][1]
+
+
+_rings = {}
+
+
+def get_ring():
+    key = (tuple(get_shards()), get_setting('TASK_SHARD_VNODES', 100))
+    if key not in _rings:
+        _rings[key] = HashRing(*key)
+    return _rings[key]
+
+
+def placement_key(user_id):
+    return f'tasks:shard:{user_id}'
+
+
+def get_placement(user_id):
+    """(alias, moving) of the user's task data."""
+    key = placement_key(user_id)
+    placement = cache.get(key)
+    if placement is None:
+        from .models import UserShard
+
+        row = UserShard.objects.using(DEFAULT_DB_ALIAS).filter(user_id=user_id).values_list('shard', 'moving').first()
+        placement = tuple(row) if row else (DEFAULT_DB_ALIAS, False)
+        # add, not set: never overwrite a placement set_placement() just stored
+        cache.add(key, placement, get_setting('TASK_SHARD_CACHE_TIMEOUT', 300))
+    return placement
+
+
+def set_placement(user_id, shard, moving=False):
+    from .models import UserShard
+
+    UserShard.objects.using(DEFAULT_DB_ALIAS).update_or_create(
+        user_id=user_id, defaults={'shard': shard, 'moving': moving}
+    )
+    cache.set(placement_key(user_id), (shard, moving), get_setting('TASK_SHARD_CACHE_TIMEOUT', 300))
+
+
+class ShardMoving(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Your tasks are being moved, try again in a few seconds.'
+    default_code = 'shard_moving'
+
+
+def get_shard(user_id):
+    """The alias holding the user's tasks; None when sharding is off."""
+    if not sharding_enabled():
+        return None
+    return get_placement(user_id)[0]
+
+
+def get_shard_for_write(user_id):
+    """get_shard(), refusing writes while the user's tasks are being moved."""
+    if not sharding_enabled():
+        return None
+    shard, moving = get_placement(user_id)
+    if moving:
+        raise ShardMoving()
+    return shard
+
+
+def group_by_shard(objs):
+    """{alias: objs} to write each of objs on its user's shard ({None: objs} when off)."""
+    if not sharding_enabled():
+        return {None: list(objs)}
+    shards, groups = {}, {}
+    for obj in objs:
+        if obj.user_id not in shards:
+            shards[obj.user_id] = get_shard_for_write(obj.user_id)
+        groups.setdefault(shards[obj.user_id], []).append(obj)
+    return groups
+
+
+class ShardedQuerySet(QuerySet):
+    """
+    QuerySet of a model sharded by user. A filter on one user routes the
+    query to that user's shard, resolved when the query runs (so building
+    querysets in async code stays query-free). Queries not scoped to a user
+    go through the routers as usual.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._shard_user_id = None
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._shard_user_id = self._shard_user_id
+        return clone
+
+    def _filter_or_exclude(self, negate, args, kwargs):
+        clone = super()._filter_or_exclude(negate, args, kwargs)
+        if not negate and clone._shard_user_id is None:
+            for key in SHARD_KEYS:
+                if key in kwargs:
+                    clone._shard_user_id = getattr(kwargs[key], 'pk', kwargs[key])
+                    break
+        return clone
+
+    def for_user(self, user_id):
+        clone = self._chain()
+        clone._shard_user_id = user_id
+        return clone
+
+    @property
+    def db(self):
+        if self._db is None and self._shard_user_id is not None and sharding_enabled():
+            if self._for_write:
+                return get_shard_for_write(self._shard_user_id)
+            return get_shard(self._shard_user_id)
+        return super().db
+
+    def create(self, **kwargs):
+        if self._shard_user_id is None:
+            user_id = kwargs['user'].pk if kwargs.get('user') is not None else kwargs.get('user_id')
+            if user_id is not None:
+                return self.for_user(user_id).create(**kwargs)
+        return super().create(**kwargs)
+
+    def bulk_create(self, objs, *args, **kwargs):
+        if self._db is not None or not sharding_enabled():
+            return super().bulk_create(objs, *args, **kwargs)
+        objs = list(objs)
+        for shard, group in group_by_shard(objs).items():
+            self.using(shard).bulk_create(group, *args, **kwargs)
+        return objs
+
+    def bulk_update(self, objs, *args, **kwargs):
+        if self._db is not None or not sharding_enabled():
+            return super().bulk_update(objs, *args, **kwargs)
+        return sum(
+            self.using(shard).bulk_update(group, *args, **kwargs)
+            for shard, group in group_by_shard(objs).items()
+        )
+
+
+def each_shard(queryset):
+    """queryset on every database holding task data."""
+    return [queryset.using(shard) for shard in all_shards()]
+
+
+def scatter(queryset):
+    """queryset run on every shard (itself when sharding is off)."""
+    if not sharding_enabled():
+        return queryset
+    return ScatterQuerySet(each_shard(queryset))
+
+
+class ScatterQuerySet:
+    """
+    The same query on several databases (or tables with the same columns,
+    see tasks/archive.py), for paginators and exports. Chained calls apply
+    to every queryset; slicing, iteration and get() merge the rows in the
+    first queryset's ordering. A slice fetches up to its
+    end from every shard, so keep slices to page size.
+    """
+
+    def __init__(self, querysets):
+        self.querysets = querysets
+        self.model = querysets[0].model
+
+    def _chain(self, name, *args, **kwargs):
+        return ScatterQuerySet([getattr(queryset, name)(*args, **kwargs) for queryset in self.querysets])
+
+    def all(self):
+        return self._chain('all')
+
+    def filter(self, *args, **kwargs):
+        return self._chain('filter', *args, **kwargs)
+
+    def exclude(self, *args, **kwargs):
+        return self._chain('exclude', *args, **kwargs)
+
+    def order_by(self, *fields):
+        return self._chain('order_by', *fields)
+
+    def values(self, *fields, **kwargs):
+        return self._chain('values', *fields, **kwargs)
+
+    def values_list(self, *fields, **kwargs):
+        return self._chain('values_list', *fields, **kwargs)
+
+    def sort_key(self):
+        queryset = self.querysets[0]
+        query = queryset.query
+        ordering = query.order_by or (self.model._meta.ordering if query.default_ordering else ())
+        # values_list() rows are tuples in the order of these fields
+        fields = list(getattr(queryset, '_fields', None) or ())
+
+        def value(row, name):
+            name = 'id' if name == 'pk' else name
+            if isinstance(row, dict):
+                return row[name]
+            if isinstance(row, tuple):
+                return row[fields.index(name)]
+            return getattr(row, name)
+
+        def compare(a, b):
+            for field in ordering:
+                name = field.lstrip('-')
+                x, y = value(a, name), value(b, name)
+                if x != y:
+                    result = -1 if x < y else 1
+                    return -result if field.startswith('-') else result
+            return 0
+
+        return cmp_to_key(compare) if ordering else None
+
+    def fetch(self, limit=None):
+        rows = []
+        for queryset in self.querysets:
+            rows.extend(queryset if limit is None else queryset[:limit])
+        key = self.sort_key()
+        if key is not None:
+            rows.sort(key=key)
+        return rows
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return self.fetch(key.stop)[key]
+        return self.fetch(key + 1)[key]
+
+    def __iter__(self):
+        return iter(self.fetch())
+
+    def count(self):
+        return sum(queryset.count() for queryset in self.querysets)
+
+    def get(self, *args, **kwargs):
+        found = []
+        for queryset in self.querysets:
+            found.extend(queryset.filter(*args, **kwargs)[:2])
+        if not found:
+            raise self.model.DoesNotExist(f'{self.model._meta.object_name} matching query does not exist.')
+        if len(found) > 1:
+            raise self.model.MultipleObjectsReturned(f'get() returned more than one {self.model._meta.object_name}')
+        return found[0]
+
+
+def is_sharded(model):
+    return model._meta.app_label == 'tasks' and model._meta.model_name in SHARDED_MODELS
+
+
+class TaskShardRouter:
+    """Routes saves, deletes and related lookups of sharded rows by their user.
+    Everything else is left to the next router."""
+
+    def db_for_read(self, model, **hints):
+        return self.route(model, hints.get('instance'), write=False)
+
+    def db_for_write(self, model, **hints):
+        return self.route(model, hints.get('instance'), write=True)
+
+    def route(self, model, instance, write):
+        if instance is None or not is_sharded(model) or not sharding_enabled():
+            return None
+        if isinstance(instance, User):
+            # user.tasks, or Task(user=user) picking its database
+            return get_shard(instance.pk)
+        user_id = getattr(instance, 'user_id', None)
+        if user_id is None:
+            return None
+        return get_shard_for_write(user_id) if write else get_shard(user_id)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if not sharding_enabled() or not (is_sharded(type(obj1)) or is_sharded(type(obj2))):
+            return None
+        # Sharded rows point at users on 'default', and at each other on one shard
+        if isinstance(obj1, User) or isinstance(obj2, User):
+            return True
+        return obj1._state.db == obj2._state.db
+
+
+@receiver(post_save, sender=User)
+def place_new_user(sender, instance, created, raw=False, **kwargs):
+    if created and not raw and sharding_enabled():
+        set_placement(instance.pk, get_ring().get(instance.pk))
+
+
+@receiver(pre_delete, sender=User)
+def delete_sharded_tasks(sender, instance, using, **kwargs):
+    # The user's deletion only cascades on their own database
+    shard = get_shard(instance.pk)
+    if shard is not None and shard != using:
+        from .models import ArchivedTask, Task, TaskStats
+
+        Task.objects.using(shard).filter(user_id=instance.pk).delete()
+        TaskStats.objects.using(shard).filter(user_id=instance.pk).delete()
+        ArchivedTask.objects.using(shard).filter(user_id=instance.pk).delete()
@@ -0,0 +1,140 @@
+# tasks/stats.py
+
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+from django.db import IntegrityError, router, transaction
+from django.db.models import F, Sum
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import Task, TaskStats
+from .sharding import each_shard, get_shard
+
+_batch = threading.local()
+
+
+def apply_stats_changes(changes):
+    """Apply a Counter of {(user_id, status, priority): delta} to TaskStats."""
+    for (user_id, status, priority), delta in changes.items():
+        if not delta:
+            continue
+        rows = TaskStats.objects.filter(user_id=user_id, status=status, priority=priority)
+        # No row to decrement means it went with its user (cascade delete)
+        if rows.update(count=F('count') + delta) or delta < 0:
+            continue
+        try:
+            with transaction.atomic(using=get_shard(user_id)):
+                TaskStats.objects.create(user_id=user_id, status=status, priority=priority, count=delta)
+        except IntegrityError:
+            # Another writer created the row first
+            rows.update(count=F('count') + delta)
+
+
+def record_stats_changes(changes):
+    pending = getattr(_batch, 'changes', None)
+    if pending is not None:
+        pending.update(changes)
+    else:
+        apply_stats_changes(changes)
+
+
+@contextmanager
+def batched_stats():
+    """Collect counter changes made by the signal handlers and write them once
+    per (user, status, priority) when the block exits, e.g. around a
+    QuerySet.delete() that removes many tasks."""
+    if getattr(_batch, 'changes', None) is not None:
+        yield
+        return
+    _batch.changes = Counter()
+    try:
+        yield
+        changes = _batch.changes
+    finally:
+        _batch.changes = None
+    apply_stats_changes(changes)
+
+
+def tasks_created(tasks):
+    """Count tasks written with bulk_create, which doesn't send post_save."""
+    record_stats_changes(Counter(task.stats_key for task in tasks))
+    for task in tasks:
+        task._loaded_stats_key = task.stats_key
+
+
+def tasks_updated(tasks):
+    """Move tasks written with bulk_update between counters."""
+    changes = Counter()
+    for task in tasks:
+        old_key = getattr(task, '_loaded_stats_key', None)
+        if old_key is not None and old_key != task.stats_key:
+            changes[old_key] -= 1
+            changes[task.stats_key] += 1
+        task._loaded_stats_key = task.stats_key
+    record_stats_changes(changes)
+
+
+def get_user_stats(user_id):
+    """Task counts for one user by status and by priority (one query)."""
+    by_status, by_priority = Counter(), Counter()
+    rows = TaskStats.objects.filter(user_id=user_id, count__gt=0).values_list('status', 'priority', 'count')
+    for status, priority, count in rows:
+        by_status[status] += count
+        by_priority[priority] += count
+    return {
+        'total_tasks': sum(by_status.values()),
+        'tasks_by_status': dict(by_status),
+        'tasks_by_priority': dict(by_priority),
+    }
+
+
+def get_totals_by(field):
+    totals = Counter()
+    for stats in each_shard(TaskStats.objects.order_by()):
+        totals.update(dict(stats.values_list(field).annotate(total=Sum('count')).filter(total__gt=0)))
+    return dict(totals)
+
+
+def get_task_counts(user_ids):
+    """{user_id: number of tasks} for the given users, from the counters."""
+    counts = Counter()
+    for stats in each_shard(TaskStats.objects.filter(user_id__in=user_ids).order_by()):
+        counts.update(dict(stats.values_list('user_id').annotate(total=Sum('count'))))
+    return counts
+
+
+@receiver(pre_save, sender=Task)
+def load_stats_key(sender, instance, update_fields=None, **kwargs):
+    # The counter to decrement is the one for the stored row, re-read and
+    # locked inside the save's transaction: the values the instance was loaded
+    # with may be stale, and two concurrent status changes would then both
+    # move the task out of the same counter
+    if not instance.pk or instance._state.adding:
+        return
+    if update_fields is not None and not {'user', 'user_id', 'status', 'priority'} & set(update_fields):
+        return
+    # The database the save goes to, never a lagging replica
+    using = router.db_for_write(Task, instance=instance)
+    instance._loaded_stats_key = (
+        Task.objects.using(using).select_for_update().filter(pk=instance.pk)
+        .values_list('user_id', 'status', 'priority').first()
+    )
+
+
+@receiver(post_save, sender=Task)
+def update_stats_on_save(sender, instance, created, **kwargs):
+    old_key = None if created else getattr(instance, '_loaded_stats_key', None)
+    if old_key != instance.stats_key:
+        changes = Counter({instance.stats_key: 1})
+        if old_key is not None:
+            changes[old_key] -= 1
+        record_stats_changes(changes)
+    instance._loaded_stats_key = instance.stats_key
+
+
+@receiver(post_delete, sender=Task)
+def update_stats_on_delete(sender, instance, **kwargs):
+    key = getattr(instance, '_loaded_stats_key', None) or instance.stats_key
+    record_stats_changes(Counter({key: -1}))
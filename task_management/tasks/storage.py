@@ -0,0 +1,56 @@
+# tasks/storage.py
+
+import hashlib
+import os
+import re
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+# Names written by ContentAddressedStorage (and renditions derived from them)
+# embed a sha256 digest, so their bytes never change and can be cached forever
+CONTENT_ADDRESSED_RE = re.compile(r'(^|/)[0-9a-f]{64}[^/]*$')
+
+
+def is_content_addressed(name):
+    return bool(CONTENT_ADDRESSED_RE.search(name))
+
+
+def content_digest(content):
+    digest = hashlib.sha256()
+    for chunk in content.chunks():  # chunks() rewinds the file first
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Stores each file under the sha256 of its bytes, keeping the directory and
+    extension of the requested name. Identical uploads share one file, and a
+    name always refers to the same content.
+    """
+
+    def __init__(self, **kwargs):
+        # Rewriting a file under its own digest writes the same bytes
+        kwargs.setdefault('allow_overwrite', True)
+        super().__init__(**kwargs)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        dirname, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        name = os.path.join(dirname, content_digest(content) + extension).replace('\\', '/')
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length=max_length)
+
+
+photo_storage = ContentAddressedStorage()
+
+
+# Referenced by UserProfile.photo, so migrations don't serialize the instance
+def get_photo_storage():
+    return photo_storage
@@ -0,0 +1,162 @@
+# tasks/sync.py
+#
+# Incremental sync: the tasks a user created or updated since a cursor, plus
+# tombstones for the ones deleted since. Both are read in keyset order, tasks
+# on the (user, updated_at, id) index and tombstones on (user, deleted_at, id),
+# so a sync after a small edit reads a handful of rows.
+#
+# updated_at/deleted_at are set when a row is written, not when it commits.
+# A write still in flight when a sync reads could therefore commit behind the
+# returned cursor. To catch it, a caught-up cursor never goes past
+# TASK_SYNC_OVERLAP_SECONDS ago, and the next sync re-sends that window.
+# Clients must apply changes idempotently: upsert tasks by id, drop
+# tombstoned ids.
+
+import json
+import threading
+from base64 import b64decode, b64encode
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Task, TaskTombstone
+from .serializers import task_row_serializer
+from .sharding import each_shard
+
+_batch = threading.local()
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class CursorExpired(Exception):
+    """The cursor predates the oldest tombstones kept; the client must resync."""
+
+
+def get_setting(name, default):
+    return getattr(settings, name, default)
+
+
+def record_tombstones(tombstones):
+    pending = getattr(_batch, 'tombstones', None)
+    if pending is not None:
+        pending.extend(tombstones)
+    else:
+        TaskTombstone.objects.bulk_create(tombstones)
+
+
+@contextmanager
+def batched_tombstones():
+    """Collect the tombstones of tasks deleted in the block and insert them in
+    one query when it exits, e.g. around a QuerySet.delete() of many tasks."""
+    if getattr(_batch, 'tombstones', None) is not None:
+        yield
+        return
+    _batch.tombstones = []
+    try:
+        yield
+        tombstones = _batch.tombstones
+    finally:
+        _batch.tombstones = None
+    TaskTombstone.objects.bulk_create(tombstones, batch_size=1000)
+
+
+@receiver(post_delete, sender=Task)
+def record_tombstone_on_delete(sender, instance, **kwargs):
+    record_tombstones([TaskTombstone(user_id=instance.user_id, task_id=instance.pk)])
+
+
+def encode_cursor(tasks_position, tombstones_position):
+    def encode(position):
+        return None if position is None else [position[0].isoformat(), position[1]]
+
+    data = {'t': encode(tasks_position), 'd': encode(tombstones_position)}
+    return b64encode(json.dumps(data, separators=(',', ':')).encode('ascii')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """(tasks position, tombstones position); a position is (timestamp, id)."""
+    def decode(position):
+        if position is None:
+            return None
+        value, pk = position
+        value = datetime.fromisoformat(value)
+        if timezone.is_naive(value) or not isinstance(pk, int):
+            raise ValueError
+        return value, pk
+
+    try:
+        data = json.loads(b64decode(cursor.encode('ascii'), validate=True))
+        tombstones_position = decode(data['d'])
+        if tombstones_position is None:
+            raise ValueError
+        return decode(data['t']), tombstones_position
+    except (TypeError, ValueError, KeyError, UnicodeEncodeError):
+        raise InvalidCursor()
+
+
+def after(queryset, field, position):
+    if position is not None:
+        value, pk = position
+        queryset = queryset.filter(Q(**{f'{field}__gt': value}) | Q(**{field: value, 'id__gt': pk}))
+    return queryset.order_by(field, 'id')
+
+
+def get_changes(user_id, cursor=None, limit=None):
+    """
+    Changes to the user's tasks since cursor (None: a full initial sync).
+    Returns {'tasks', 'deleted', 'cursor', 'has_more'}. While has_more is
+    set, the client should keep syncing with the returned cursor.
+    """
+    limit = limit or get_setting('TASK_SYNC_PAGE_SIZE', 500)
+    now = timezone.now()
+    horizon = (now - timedelta(seconds=get_setting('TASK_SYNC_OVERLAP_SECONDS', 30)), 0)
+
+    if cursor is None:
+        # Nothing to delete on a client that has no tasks yet
+        tasks_position, tombstones_position = None, horizon
+    else:
+        tasks_position, tombstones_position = decode_cursor(cursor)
+        retention = timedelta(days=get_setting('TASK_SYNC_TOMBSTONE_DAYS', 30))
+        if tombstones_position[0] < now - retention:
+            raise CursorExpired()
+
+    fields = task_row_serializer.fields
+    tasks = list(
+        after(Task.objects.filter(user_id=user_id), 'updated_at', tasks_position).values(*fields)[:limit + 1]
+    )
+    tombstones = list(
+        after(TaskTombstone.objects.filter(user_id=user_id), 'deleted_at', tombstones_position)
+        .values_list('deleted_at', 'id', 'task_id')[:limit + 1]
+    )
+    has_more = len(tasks) > limit or len(tombstones) > limit
+    tasks, tombstones = tasks[:limit], tombstones[:limit]
+
+    if tasks:
+        tasks_position = (tasks[-1]['updated_at'], tasks[-1]['id'])
+    if tombstones:
+        tombstones_position = tombstones[-1][:2]
+    if not has_more:
+        # Caught up: re-read the overlap window next time
+        if tasks_position is not None:
+            tasks_position = min(tasks_position, horizon)
+        tombstones_position = min(tombstones_position, horizon)
+
+    return {
+        'tasks': task_row_serializer.many(tasks),
+        'deleted': [task_id for _, _, task_id in tombstones],
+        'cursor': encode_cursor(tasks_position, tombstones_position),
+        'has_more': has_more,
+    }
+
+
+def prune_tombstones(days=None):
+    days = get_setting('TASK_SYNC_TOMBSTONE_DAYS', 30) if days is None else days
+    expired = TaskTombstone.objects.filter(deleted_at__lt=timezone.now() - timedelta(days=days))
+    return sum(tombstones.delete()[0] for tombstones in each_shard(expired))
@@ -1,3 +1,1579 @@
-from django.test import TestCase
+import asyncio
+import csv
+import hashlib
+import importlib
+import json
+import os
+import tempfile
+import threading
+from datetime import date, timedelta
+from types import SimpleNamespace
+from io import BytesIO, StringIO
+from unittest import skipUnless
+from unittest.mock import patch
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, connections
+from django.db.utils import ConnectionHandler, OperationalError
+from django.test import AsyncClient, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.tokens import AccessToken
+
+from task_management import urls as root_urls
+from task_management.urls import media_urlpatterns
+
+from .archive import archive_tasks
+from .authentication import StatelessJWTAuthentication, UserRefreshToken
+from .benchmarks import bench_users
+from .db.pool import ConnectionPool, PoolTimeout, get_pool_stats
+from .bulk import bulk_create_tasks
+from .deadlines import DeadlineScanner, DeliveryFailed
+from .events import InProcessBroker, get_broker
+from .filters import TaskFilter
+from .images import profile_files
+from .metrics import registry as metrics_registry
+from .renderers import FastJSONRenderer
+from .revocation import BloomFilter, revocation_filter
+from .routers import ReplicaRouter, ReplicaRoutingMiddleware, health as replica_health, pin_key
+from .serializers import TaskSerializer, task_row_serializer
+from .search import index_tasks
+from .sharding import HashRing, get_placement, set_placement
+from .models import ArchivedTask, RevokedToken, Task, TaskReminder, TaskSearchTerm, TaskStats, TaskTombstone, UserProfile, UserShard
+from .rebalance import move_users
+from .stats import get_user_stats, tasks_created
+from .storage import photo_storage
+
+
+def create_tasks(user, count, **kwargs):
+    tasks = Task.objects.bulk_create([
+        Task(user=user, title=f'Task {i}', description='Description',
+             deadline=kwargs.get('deadline', date(2030, 1, 1)),
+             status=kwargs.get('status', 'yet-to-start'),
+             priority=kwargs.get('priority', 'low'))
+        for i in range(count)
+    ])
+    tasks_created(tasks)
+    return tasks
+
+
+class APITestCase(TestCase):
+    def setUp(self):
+        # Cached task lists would otherwise leak between tests reusing user ids
+        cache.clear()
+
+
+class SuperuserDashboardTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def add_users(self, count, tasks_per_user):
+        for i in range(count):
+            user = User.objects.create_user(f'user{User.objects.count()}')
+            create_tasks(user, tasks_per_user, status='in-progress')
+
+    def test_dashboard_query_count_is_constant(self):
+        self.add_users(2, 2)
+        with self.assertNumQueries(4):
+            small = self.client.get(reverse('superuser_dashboard'))
+
+        self.add_users(10, 5)
+        with self.assertNumQueries(4):
+            large = self.client.get(reverse('superuser_dashboard'))
+
+        self.assertEqual(small.data['data']['stats']['total_tasks'], 4)
+        stats = large.data['data']['stats']
+        self.assertEqual(stats['total_users'], 12)
+        self.assertEqual(stats['total_admins'], 1)
+        self.assertEqual(stats['total_tasks'], 54)
+        self.assertEqual(stats['tasks_by_status'], {'in-progress': 54})
+
+    def test_dashboard_users_and_tasks_are_cursor_paginated(self):
+        self.add_users(10, 5)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('superuser_dashboard_users'), {'page_size': 4})
+        self.assertEqual(len(response.data['results']), 4)
+        self.assertEqual(response.data['results'][0]['task_count'], 5)
+        self.assertIsNotNone(response.data['next'])
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('superuser_dashboard_tasks'), {'page_size': 20})
+        self.assertEqual(len(response.data['results']), 20)
+        self.assertTrue(response.data['results'][0]['user'].startswith('user'))
+
+        with self.assertNumQueries(1):
+            response = self.client.get(response.data['next'])
+        self.assertEqual(len(response.data['results']), 20)
+
+
+class TaskKeysetPaginationTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('owner')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        for day in (3, 1, 2):
+            create_tasks(self.user, 5, deadline=date(2030, 1, day))
+
+    def walk(self, url, params):
+        seen = []
+        response = self.client.get(url, params)
+        while True:
+            seen.extend(task['id'] for task in response.data['results'])
+            if not response.data['next']:
+                return seen, response
+            with self.assertNumQueries(1):
+                response = self.client.get(response.data['next'])
+
+    def test_cursor_pages_follow_deadline_then_id(self):
+        seen, last = self.walk(reverse('task-list'), {
+            'pagination': 'cursor', 'ordering': 'deadline', 'page_size': 4,
+        })
+        expected = list(Task.objects.order_by('deadline', 'id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+        self.assertNotIn('count', last.data)
+
+        previous = self.client.get(last.data['previous'])
+        self.assertEqual([task['id'] for task in previous.data['results']], expected[8:12])
+
+    def test_count_only_when_requested(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('task-list'), {'pagination': 'cursor', 'count': 'true'})
+        self.assertEqual(response.data['count'], 15)
+
+    def test_invalid_cursor_is_not_found(self):
+        response = self.client.get(reverse('task-list'), {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 404)
+
+
+class TaskListSerializationTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('owner')
+        self.tasks = create_tasks(self.user, 3)
+        Task.objects.filter(pk=self.tasks[0].pk).update(title='Line\u2028separator \u00e9')
+
+    def test_row_serializer_matches_task_serializer(self):
+        tasks = Task.objects.order_by('id')
+        expected = TaskSerializer(tasks, many=True).data
+        self.assertEqual(task_row_serializer.many(tasks.values(*task_row_serializer.fields)), expected)
+        with timezone.override('Asia/Kolkata'):
+            expected = TaskSerializer(tasks, many=True).data
+            self.assertTrue(expected[0]['created_at'].endswith('+05:30'))
+            self.assertEqual(task_row_serializer.many(tasks.values(*task_row_serializer.fields)), expected)
+
+    def test_fast_renderer_matches_json_renderer(self):
+        data = {'results': TaskSerializer(Task.objects.all(), many=True).data, 'count': 3, 'when': timezone.now()}
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_list_response_is_unchanged(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        for params in ({}, {'pagination': 'cursor', 'ordering': 'deadline'}):
+            response = client.get(reverse('task-list'), params)
+            results = response.json()['results']
+            self.assertEqual(
+                sorted(results, key=lambda task: task['id']),
+                TaskSerializer(Task.objects.order_by('id'), many=True).data,
+            )
+
+
+class TaskFilterIndexTests(APITestCase):
+    def test_choice_filters_use_exact_lookups(self):
+        user = User.objects.create_user('owner')
+        filterset = TaskFilter({'status': 'completed', 'priority': 'high'}, queryset=Task.objects.filter(user=user))
+        sql = str(filterset.qs.query)
+        self.assertIn('"tasks_task"."status" = completed', sql)
+        self.assertNotIn('LIKE', sql)
+
+    def test_explain_reports_no_table_scans(self):
+        create_tasks(User.objects.create_user('owner'), 5)
+        out = StringIO()
+        call_command('explain_task_filters', fail_on_scan=True, stdout=out)
+        self.assertIn('status+priority                  -created_at  index', out.getvalue())
+        self.assertIn('0 of the explained queries scan the tasks_task table', out.getvalue())
+
+
+class RecordingSink:
+    def __init__(self):
+        self.notifications = []
+
+    def send(self, notifications):
+        self.notifications.extend(notifications)
+
+
+class FailingSink:
+    def send(self, notifications):
+        raise OSError('webhook down')
+
+
+@override_settings(
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    DEADLINE_DUE_SOON_DAYS=1, DEADLINE_OVERDUE_LOOKBACK_DAYS=7,
+)
+class DeadlineScannerTests(APITestCase):
+    today = date(2030, 6, 10)
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('owner', 'owner@example.com')
+        self.other = User.objects.create_user('other', 'other@example.com')
+
+    def add(self, user, days, **kwargs):
+        return create_tasks(user, 1, deadline=self.today + timedelta(days=days), **kwargs)[0]
+
+    def scan(self, days=0, **kwargs):
+        sink = RecordingSink()
+        results = DeadlineScanner(sinks=[sink], today=self.today + timedelta(days=days), **kwargs).run()
+        return results, sink.notifications
+
+    def test_due_soon_and_overdue_tasks_are_notified_once(self):
+        due = [self.add(self.user, 0), self.add(self.user, 1), self.add(self.other, 1)]
+        overdue = self.add(self.user, -3)
+        self.add(self.user, 2)  # Not due yet
+        self.add(self.user, -20)  # Before the first run's lookback
+        self.add(self.user, -1, status='completed')
+
+        results, notifications = self.scan()
+        self.assertEqual(results, {
+            'due_soon': {'tasks': 3, 'notifications': 2},
+            'overdue': {'tasks': 1, 'notifications': 1},
+        })
+        mine = [n for n in notifications if n['user'] == self.user and n['kind'] == 'due_soon'][0]
+        self.assertEqual({task['id'] for task in mine['tasks']}, {due[0].id, due[1].id})
+        self.assertTrue(TaskReminder.objects.filter(task_id=overdue.id, kind='overdue').exists())
+
+        # Nothing new later the same day
+        results, notifications = self.scan()
+        self.assertEqual(notifications, [])
+
+        # The next day only scans the newly covered dates
+        results, notifications = self.scan(days=1)
+        self.assertEqual(results['due_soon']['tasks'], 1)
+        self.assertEqual(results['overdue']['tasks'], 1)
+
+    def test_edited_tasks_in_covered_range_are_rescanned(self):
+        task = self.add(self.user, 5)
+        self.scan()
+        # Moved into the range the previous run already covered
+        task = Task.objects.get(pk=task.pk)
+        task.deadline = self.today
+        task.save()
+        results, notifications = self.scan()
+        self.assertEqual(results['due_soon'], {'tasks': 1, 'notifications': 1})
+        self.assertEqual(notifications[0]['tasks'][0]['id'], task.id)
+
+    def test_batches_bound_memory_and_email_per_user(self):
+        for _ in range(5):
+            self.add(self.user, 1)
+        self.add(self.other, 0)
+        with self.settings(DEADLINE_NOTIFICATION_SINKS=['tasks.deadlines.EmailSink']):
+            results = DeadlineScanner(today=self.today, batch_size=2).run(['due_soon'])
+        # Keyset batches of 2 rows; each batch mails each of its users once
+        self.assertEqual(results['due_soon']['tasks'], 6)
+        self.assertEqual(sum(len(message.body.splitlines()) for message in mail.outbox), 6)
+        self.assertEqual(mail.outbox[0].to, ['other@example.com'])
+        self.assertEqual(mail.outbox[0].subject, 'Tasks due soon (1)')
+
+    def test_failing_sink_does_not_block_the_others(self):
+        task = self.add(self.user, 0)
+        sink = RecordingSink()
+        with self.assertLogs('tasks.deadlines', 'ERROR') as logs:
+            results = DeadlineScanner(sinks=[FailingSink(), sink], today=self.today).run(['due_soon'])
+        self.assertIn('FailingSink failed to send 1 due_soon notifications', logs.output[0])
+        self.assertEqual(results['due_soon']['tasks'], 1)
+        self.assertEqual(len(sink.notifications), 1)
+        self.assertTrue(TaskReminder.objects.filter(task_id=task.id).exists())
+
+        # Nothing delivered: the batch isn't recorded and the next run retries it
+        later = self.add(self.other, 2)
+        tomorrow = self.today + timedelta(days=1)
+        with self.assertLogs('tasks.deadlines', 'ERROR'), self.assertRaises(DeliveryFailed):
+            DeadlineScanner(sinks=[FailingSink()], today=tomorrow).run(['due_soon'])
+        self.assertFalse(TaskReminder.objects.filter(task_id=later.id).exists())
+        results = DeadlineScanner(sinks=[sink], today=tomorrow).run(['due_soon'])
+        self.assertEqual(results['due_soon']['tasks'], 1)
+
+    @override_settings(DEADLINE_NOTIFICATION_SINKS=['tasks.tests.FailingSink'])
+    def test_scan_command_keeps_looping_after_errors(self):
+        self.add(self.user, 0)
+        with patch('tasks.deadlines.timezone.localdate', return_value=self.today), \
+                patch('tasks.management.commands.scan_deadlines.time.sleep', side_effect=[None, KeyboardInterrupt]), \
+                self.assertLogs('tasks', 'ERROR') as logs, self.assertRaises(KeyboardInterrupt):
+            call_command('scan_deadlines', loop=True, stdout=StringIO())
+        failures = [line for line in logs.output if 'Deadline scan failed' in line]
+        self.assertEqual(len(failures), 2)
+
+
+class TaskSearchTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('owner')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create(self, title, description):
+        return Task.objects.create(user=self.user, title=title, description=description,
+                                   deadline=date(2030, 1, 1))
+
+    def search(self, query):
+        response = self.client.get(reverse('task-list'), {'search': query})
+        return [task['id'] for task in response.data['results']]
+
+    def test_search_ranks_title_matches_first(self):
+        in_description = self.create('Groceries', 'Remember the quarterly report')
+        in_title = self.create('Quarterly report', 'Send to finance')
+        self.create('Unrelated', 'Nothing here')
+        other = User.objects.create_user('other')
+        Task.objects.create(user=other, title='Quarterly report', description='', deadline=date(2030, 1, 1))
+
+        self.assertEqual(self.search('quarterly'), [in_title.id, in_description.id])
+
+    def test_index_follows_updates_and_deletes(self):
+        task = self.create('Draft', 'Write the draft')
+        task.title = 'Final'
+        task.description = 'Ship it'
+        task.save()
+        self.assertEqual(self.search('draft'), [])
+        self.assertEqual(self.search('ship'), [task.id])
+
+        task.delete()
+        self.assertFalse(TaskSearchTerm.objects.exists())
+
+
+class TaskBulkTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('owner')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_bulk_create_update_delete(self):
+        payload = [
+            {'title': f'Task {i}', 'description': 'Imported', 'deadline': '2030-01-01'}
+            for i in range(3)
+        ]
+        response = self.client.post(reverse('task-bulk'), payload, format='json')
+        self.assertEqual(response.status_code, 201)
+        ids = [item['task']['id'] for item in response.data['data']]
+        self.assertEqual(Task.objects.filter(user=self.user).count(), 3)
+
+        # SELECT, UPDATE, 2 x search index, 2 x TaskStats, plus creating the
+        # first 'completed' counter row, each wrapped in a savepoint
+        with self.assertNumQueries(11):
+            response = self.client.patch(reverse('task-bulk'), [
+                {'id': ids[0], 'status': 'completed'},
+                {'id': ids[1], 'title': 'Renamed'},
+            ], format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Task.objects.get(id=ids[0]).status, 'completed')
+        self.assertEqual(Task.objects.get(id=ids[1]).title, 'Renamed')
+
+        response = self.client.delete(reverse('task-bulk'), {'ids': [ids[0], ids[1], 999999]}, format='json')
+        self.assertEqual([item['status'] for item in response.data['data']], ['deleted', 'deleted', 'not_found'])
+        self.assertEqual(list(Task.objects.values_list('id', flat=True)), [ids[2]])
+
+    def test_invalid_item_rejects_whole_batch(self):
+        response = self.client.post(reverse('task-bulk'), [
+            {'title': 'Good', 'description': 'x', 'deadline': '2030-01-01'},
+            {'title': 'Bad', 'description': 'x', 'deadline': '2030-01-01', 'priority': 'urgent'},
+        ], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['errors'][0], {})
+        self.assertIn('priority', response.data['errors'][1])
+        self.assertFalse(Task.objects.exists())
+
+    def test_other_users_tasks_are_not_touched(self):
+        other = User.objects.create_user('other')
+        create_tasks(other, 1)
+        task = Task.objects.get()
+        response = self.client.patch(reverse('task-bulk'), [{'id': task.id, 'title': 'Mine'}], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.client.delete(reverse('task-bulk'), {'ids': [task.id]}, format='json')
+        self.assertTrue(Task.objects.filter(id=task.id, title='Task 0').exists())
+
+    @override_settings(TASK_BULK_MAX_ITEMS=2)
+    def test_batch_size_is_limited(self):
+        payload = [{'title': 'T', 'description': 'x', 'deadline': '2030-01-01'}] * 3
+        response = self.client.post(reverse('task-bulk'), payload, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_create_returns_ids_without_bulk_insert_returning(self):
+        # As on MySQL, where a multi-row INSERT doesn't give the new ids back
+        payload = [{'title': f'Task {i}', 'description': 'x', 'deadline': '2030-01-01'} for i in range(2)]
+        with patch.object(type(connection.features), 'can_return_rows_from_bulk_insert', False), \
+                patch('tasks.events.get_broker') as get_broker, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('task-bulk'), payload, format='json')
+        self.assertEqual(response.status_code, 201)
+        ids = [item['task']['id'] for item in response.data['data']]
+        self.assertEqual(ids, sorted(Task.objects.values_list('id', flat=True)))
+        published = [call.args for call in get_broker.return_value.publish.call_args_list]
+        self.assertEqual([(event, data['id']) for _, event, data in published], [('created', ids[0]), ('created', ids[1])])
+        self.assertEqual(TaskSearchTerm.objects.filter(task_id__in=ids, term='task').count(), 2)
+
+    def test_bulk_insert_ids_are_assigned_per_batch(self):
+        tasks = [Task(user=self.user, title=f'Task {i}', description='x', deadline=date(2030, 1, 1)) for i in range(5)]
+        with patch.object(type(connection.features), 'can_return_rows_from_bulk_insert', False), \
+                CaptureQueriesContext(connection) as queries:
+            bulk_create_tasks(tasks, batch_size=2)
+        self.assertEqual([task.id for task in tasks], sorted(Task.objects.values_list('id', flat=True)))
+        self.assertEqual(len([q for q in queries if q['sql'].startswith(f"INSERT INTO {connection.ops.quote_name('tasks_task')}")]), 3)
+
+    @override_settings(TASK_SEARCH_BACKEND='fulltext')
+    def test_bulk_insert_can_skip_ids(self):
+        tasks = [Task(user=self.user, title=f'Task {i}', description='x', deadline=date(2030, 1, 1)) for i in range(2)]
+        with patch.object(type(connection.features), 'can_return_rows_from_bulk_insert', False), \
+                patch('tasks.events.get_broker') as get_broker, \
+                self.captureOnCommitCallbacks(execute=True):
+            bulk_create_tasks(tasks, fetch_ids=False)
+        self.assertEqual([task.id for task in tasks], [None, None])
+        self.assertEqual(Task.objects.count(), 2)
+        get_broker.return_value.publish.assert_not_called()
+
+
+@override_settings(TASK_SYNC_OVERLAP_SECONDS=0)
+class TaskSyncTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('owner')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.tasks = create_tasks(self.user, 3)
+        create_tasks(User.objects.create_user('other'), 2)
+
+    def sync(self, cursor=None):
+        response = self.client.get(reverse('task-sync'), {'cursor': cursor} if cursor else {})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_sync_returns_only_changes_since_cursor(self):
+        data = self.sync()
+        self.assertEqual([task['id'] for task in data['tasks']], [task.id for task in self.tasks])
+        self.assertEqual((data['deleted'], data['has_more']), ([], False))
+        self.assertEqual(self.sync(data['cursor'])['tasks'], [])
+
+        edited, deleted = self.tasks[0], self.tasks[1]
+        edited.status = 'completed'
+        edited.save()
+        self.client.delete(reverse('task-delete', args=[deleted.id]))
+        admin = User.objects.create_user('admin', is_staff=True)
+        self.client.force_authenticate(admin)
+        self.client.delete(reverse('superuser-task-delete', args=[self.tasks[2].id]))
+        self.client.force_authenticate(self.user)
+
+        with self.assertNumQueries(2):
+            changes = self.sync(data['cursor'])
+        self.assertEqual([(task['id'], task['status']) for task in changes['tasks']], [(edited.id, 'completed')])
+        self.assertEqual(changes['deleted'], [deleted.id, self.tasks[2].id])
+        caught_up = self.sync(changes['cursor'])
+        self.assertEqual((caught_up['tasks'], caught_up['deleted']), ([], []))
+
+    @override_settings(TASK_SYNC_PAGE_SIZE=2)
+    def test_pages_until_caught_up(self):
+        first = self.sync()
+        self.assertEqual((len(first['tasks']), first['has_more']), (2, True))
+        second = self.sync(first['cursor'])
+        self.assertEqual((len(second['tasks']), second['has_more']), (1, False))
+
+    def test_bulk_delete_records_tombstones_in_one_query(self):
+        cursor = self.sync()['cursor']
+        ids = [task.id for task in self.tasks]
+        with CaptureQueriesContext(connection) as queries:
+            self.client.delete(reverse('task-bulk'), {'ids': ids}, format='json')
+        inserts = [q for q in queries if q['sql'].startswith(f'INSERT INTO {connection.ops.quote_name(TaskTombstone._meta.db_table)}')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(sorted(self.sync(cursor)['deleted']), ids)
+
+    def test_invalid_and_expired_cursors(self):
+        response = self.client.get(reverse('task-sync'), {'cursor': 'nope'})
+        self.assertEqual(response.status_code, 400)
+        cursor = self.sync()['cursor']
+        with override_settings(TASK_SYNC_TOMBSTONE_DAYS=0):
+            response = self.client.get(reverse('task-sync'), {'cursor': cursor})
+        self.assertEqual(response.status_code, 410)
+
+
+class StatelessJWTAuthenticationTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        create_tasks(self.user, 3)
+        self.access = str(UserRefreshToken.for_user(self.user).access_token)
+
+    def authenticate(self, backend):
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {self.access}')
+        return backend().authenticate(request)[0]
+
+    def test_queries_per_request(self):
+        # Stock backend: one User SELECT per request; stateless backend: none
+        with self.assertNumQueries(1):
+            self.authenticate(JWTAuthentication)
+        with self.assertNumQueries(0):
+            user = self.authenticate(StatelessJWTAuthentication)
+        self.assertEqual((user.pk, user.is_staff, user.is_superuser), (self.user.pk, False, False))
+
+        # Task list: COUNT + SELECT for the page, no User lookup
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access}')
+        with self.assertNumQueries(2):
+            response = client.get(reverse('task-list'))
+        self.assertEqual(response.data['count'], 3)
+
+    def test_full_user_is_loaded_lazily(self):
+        user = self.authenticate(StatelessJWTAuthentication)
+        with self.assertNumQueries(1):
+            self.assertEqual(user.email, 'owner@example.com')
+            self.assertEqual(user.username, 'owner')
+
+    def test_login_tokens_carry_role_claims(self):
+        response = APIClient().post(reverse('token_obtain_pair'), {'username': 'owner', 'password': 'password'})
+        token = AccessToken(response.data['access'])
+        self.assertIs(token['is_staff'], False)
+        self.assertIs(token['is_superuser'], False)
+
+
+class TokenRevocationTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('owner')
+        self.refresh = str(UserRefreshToken.for_user(self.user))
+        revocation_filter.sync(force=True)
+
+    def use(self, refresh):
+        return APIClient().post(reverse('token_refresh'), {'refresh': refresh})
+
+    def test_rotated_token_cannot_be_reused(self):
+        # Active-user check and the revocation INSERT (in a savepoint); the
+        # Bloom filter answers the "revoked?" check without a query
+        with self.assertNumQueries(4):
+            response = self.use(self.refresh)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.use(self.refresh).status_code, 401)
+        self.assertEqual(self.use(response.data['refresh']).status_code, 200)
+
+    def test_revocation_by_another_process_still_blocks_rotation(self):
+        token = UserRefreshToken(self.refresh)
+        RevokedToken.objects.create(jti=token['jti'], user_id=self.user.pk, expires_at=timezone.now() + timedelta(days=1))
+        self.assertNotIn(token['jti'], revocation_filter.bloom)
+        self.assertEqual(self.use(self.refresh).status_code, 401)
+
+    def test_logout_all_revokes_earlier_tokens(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {UserRefreshToken(self.refresh).access_token}')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(client.post(reverse('logout-all')).status_code, 200)
+        self.assertEqual(self.use(self.refresh).status_code, 401)
+        self.assertEqual(self.use(str(UserRefreshToken.for_user(self.user))).status_code, 200)
+
+    def test_superuser_logout_revokes_refresh_token(self):
+        admin = User.objects.create_user('admin', is_staff=True)
+        client = APIClient()
+        client.force_authenticate(admin)
+        response = client.post(reverse('superuser_logout'), {'refresh_token': self.refresh})
+        self.assertEqual(response.data['status'], 'success')
+        self.assertEqual(self.use(self.refresh).status_code, 401)
+
+    def test_prune_and_bloom_filter(self):
+        now = timezone.now()
+        RevokedToken.objects.create(jti='expired', expires_at=now - timedelta(seconds=1))
+        RevokedToken.objects.create(jti='live', expires_at=now + timedelta(days=1))
+        call_command('prune_revoked_tokens', stdout=StringIO())
+        self.assertEqual(list(RevokedToken.objects.values_list('jti', flat=True)), ['live'])
+
+        bloom = BloomFilter(1000, error_rate=0.01)
+        for i in range(1000):
+            bloom.add(f'jti-{i}')
+        self.assertTrue(all(f'jti-{i}' in bloom for i in range(1000)))
+        self.assertLess(sum(f'other-{i}' in bloom for i in range(1000)), 30)
+
+
+class TaskListCacheTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('owner')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        create_tasks(self.user, 3)
+
+    def test_repeat_list_is_served_from_cache(self):
+        first = self.client.get(reverse('task-list'), {'status': 'yet-to-start'})
+        with self.assertNumQueries(0):
+            second = self.client.get(reverse('task-list'), {'status': 'yet-to-start'})
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(first['ETag'], second['ETag'])
+
+    def test_if_none_match_returns_304_until_a_write(self):
+        etag = self.client.get(reverse('task-list'))['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('task-list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        task = Task.objects.first()
+        task.status = 'completed'
+        task.save()
+        response = self.client.get(reverse('task-list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn('completed', [item['status'] for item in response.data['results']])
+
+    def test_bulk_writes_invalidate(self):
+        self.client.get(reverse('task-list'))
+        self.client.delete(reverse('task-bulk'), {'ids': list(Task.objects.values_list('id', flat=True))}, format='json')
+        self.assertEqual(self.client.get(reverse('task-list')).data['count'], 0)
+        self.client.post(reverse('task-bulk'), [{'title': 'New', 'description': 'x', 'deadline': '2030-01-01'}], format='json')
+        self.assertEqual(self.client.get(reverse('task-list')).data['count'], 1)
+
+    def test_other_users_writes_keep_cache(self):
+        etag = self.client.get(reverse('task-list'))['ETag']
+        create_tasks(User.objects.create_user('other'), 1)
+        Task.objects.filter(user__username='other').get().save()
+        response = self.client.get(reverse('task-list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+
+class TaskStatsTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('owner')
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', None)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def stats(self):
+        return get_user_stats(self.user.pk)
+
+    def test_counters_follow_task_lifecycle(self):
+        response = self.client.post(reverse('task-create'), {
+            'title': 'T', 'description': 'x', 'deadline': '2030-01-01', 'priority': 'high',
+        })
+        task_id = response.data['id']
+        self.assertEqual(self.stats()['tasks_by_status'], {'yet-to-start': 1})
+
+        self.client.patch(reverse('task-update', args=[task_id]), {'status': 'in-progress'})
+        self.assertEqual(self.stats()['tasks_by_status'], {'in-progress': 1})
+
+        admin = APIClient()
+        admin.force_authenticate(self.admin)
+        admin.patch(reverse('superuser-task-update', args=[task_id]), {'status': 'completed', 'priority': 'low'})
+        self.assertEqual(self.stats(), {
+            'total_tasks': 1, 'tasks_by_status': {'completed': 1}, 'tasks_by_priority': {'low': 1},
+        })
+
+        self.client.delete(reverse('task-delete', args=[task_id]))
+        self.assertEqual(self.stats()['total_tasks'], 0)
+
+    def test_concurrent_status_changes_move_the_task_once(self):
+        create_tasks(self.user, 1)
+        # Two requests that loaded the task before either saved
+        first, second = Task.objects.get(), Task.objects.get()
+        for task in (first, second):
+            task.status = 'completed'
+            task.save()
+        self.assertEqual(self.stats()['tasks_by_status'], {'completed': 1})
+
+    def test_bulk_delete_writes_each_counter_once(self):
+        create_tasks(self.user, 5)
+        ids = list(Task.objects.values_list('id', flat=True))
+        self.client.delete(reverse('task-bulk'), {'ids': ids}, format='json')
+        self.assertEqual(TaskStats.objects.get(user=self.user).count, 0)
+
+    def test_deleting_user_removes_counters(self):
+        create_tasks(self.user, 2)
+        create_tasks(self.user, 1, status='completed', priority='high')
+        self.user.delete()
+        # The tasks' deletion must not recreate (negative) rows for the user
+        self.assertFalse(TaskStats.objects.exists())
+
+    def test_stats_endpoint_and_rebuild(self):
+        create_tasks(self.user, 2, status='hold')
+        TaskStats.objects.update(count=99)
+        call_command('rebuild_task_stats', stdout=StringIO())
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('task-stats'))
+        self.assertEqual(response.data['data']['tasks_by_status'], {'hold': 2})
+
+
+class TaskExportTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('owner')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        create_tasks(self.user, 5, status='completed')
+        create_tasks(self.user, 2, status='hold')
+        create_tasks(User.objects.create_user('other'), 3)
+
+    def download(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    @patch('tasks.export.EXPORT_CHUNK_SIZE', 2)
+    def test_csv_export_is_filtered_and_chunked(self):
+        with self.assertNumQueries(3):  # 5 rows in chunks of 2
+            content = self.download(reverse('task-export', args=['csv']) + '?status=completed')
+        rows = list(csv.reader(StringIO(content)))
+        self.assertEqual(rows[0][:3], ['id', 'title', 'description'])
+        self.assertEqual(len(rows), 6)
+        self.assertEqual({row[4] for row in rows[1:]}, {'completed'})
+
+    def test_ndjson_export(self):
+        lines = self.download(reverse('task-export', args=['ndjson'])).splitlines()
+        self.assertEqual(len(lines), 7)
+        self.assertEqual(json.loads(lines[0])['deadline'], '2030-01-01')
+
+    def test_superuser_export_includes_owner(self):
+        self.client.force_authenticate(User.objects.create_superuser('admin', 'admin@example.com', None))
+        lines = self.download(reverse('superuser-task-export', args=['ndjson'])).splitlines()
+        self.assertEqual(len(lines), 10)
+        self.assertEqual({json.loads(line)['user'] for line in lines}, {'owner', 'other'})
+
+    def test_unknown_format(self):
+        response = self.client.get(reverse('task-export', args=['xml']))
+        self.assertEqual(response.status_code, 400)
+
+
+class ImportTasksCommandTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('owner')
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def test_csv_import_validates_rows(self):
+        path = self.write('tasks.csv', (
+            'username,title,description,priority,status,deadline\n'
+            'owner,First,Imported,high,,2030-01-01\n'
+            'owner,Second,Imported,urgent,,2030-01-01\n'
+            'nobody,Third,Imported,,,2030-01-01\n'
+            'owner,Fourth,Imported,,completed,not-a-date\n'
+            'owner,Fifth,Imported,,hold,2030-02-01\n'
+        ))
+        rejects = os.path.join(self.directory.name, 'rejects.ndjson')
+        out = StringIO()
+        call_command('import_tasks', path, '--batch-size', '2', '--rejects', rejects, stdout=out)
+
+        self.assertIn('Imported 2 tasks, rejected 3 rows', out.getvalue())
+        self.assertEqual(
+            sorted(Task.objects.values_list('title', 'priority', 'status')),
+            [('Fifth', 'low', 'hold'), ('First', 'high', 'yet-to-start')],
+        )
+        with open(rejects) as f:
+            errors = [json.loads(line) for line in f]
+        self.assertEqual([error['line'] for error in errors], [3, 4, 5])
+        self.assertIn('priority', errors[0]['errors'])
+        self.assertEqual(get_user_stats(self.user.pk)['total_tasks'], 2)
+
+    def test_ndjson_import(self):
+        path = self.write('tasks.ndjson', (
+            '{"username": "owner", "title": "A", "description": "x", "deadline": "2030-01-01"}\n'
+            'not json\n'
+            '{"username": "owner", "title": "B", "description": "x", "deadline": "2030-01-01"}\n'
+        ))
+        out = StringIO()
+        call_command('import_tasks', path, stdout=out)
+        self.assertIn('Imported 2 tasks, rejected 1 rows', out.getvalue())
+
+    def test_ndjson_username_must_be_a_string(self):
+        path = self.write('tasks.ndjson', (
+            '{"username": ["owner"], "title": "A", "description": "x", "deadline": "2030-01-01"}\n'
+            '{"username": {"name": "owner"}, "title": "B", "description": "x", "deadline": "2030-01-01"}\n'
+            '{"username": "owner", "title": "C", "description": "x", "deadline": "2030-01-01"}\n'
+        ))
+        rejects = os.path.join(self.directory.name, 'rejects.ndjson')
+        out = StringIO()
+        call_command('import_tasks', path, '--rejects', rejects, stdout=out)
+        self.assertIn('Imported 1 tasks, rejected 2 rows', out.getvalue())
+        with open(rejects) as f:
+            errors = [json.loads(line) for line in f]
+        self.assertEqual([list(error['errors']) for error in errors], [['username'], ['username']])
+
+
+class AsyncTaskViewTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('owner')
+        create_tasks(self.user, 3)
+        create_tasks(User.objects.create_user('other'), 2)
+        access = UserRefreshToken.for_user(self.user).access_token
+        self.client = AsyncClient()
+        self.headers = {'Authorization': f'Bearer {access}'}
+
+    async def test_list_create_update_delete(self):
+        response = await self.client.get(reverse('async-task-list'), {'page_size': 2, 'count': 'true'}, headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data['count'], len(data['results'])), (3, 2))
+        response = await self.client.get(data['next'], headers=self.headers)
+        self.assertEqual(len(response.json()['results']), 1)
+
+        response = await self.client.post(reverse('async-task-create'), {
+            'title': 'Async', 'description': 'x', 'deadline': '2030-01-01',
+        }, content_type='application/json', headers=self.headers)
+        self.assertEqual(response.status_code, 201)
+        task_id = response.json()['id']
+
+        response = await self.client.patch(reverse('async-task-detail', args=[task_id]), {
+            'status': 'completed',
+        }, content_type='application/json', headers=self.headers)
+        self.assertEqual(response.json()['status'], 'completed')
+        self.assertEqual(await Task.objects.filter(user=self.user, status='completed').acount(), 1)
+
+        response = await self.client.delete(reverse('async-task-detail', args=[task_id]), headers=self.headers)
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(await Task.objects.filter(user=self.user).acount(), 3)
+
+    async def test_validation_and_scoping(self):
+        response = await self.client.post(reverse('async-task-create'), {
+            'title': 'Bad', 'description': 'x', 'deadline': '2030-01-01', 'priority': 'urgent',
+        }, content_type='application/json', headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('priority', response.json())
+
+        other_task = await Task.objects.filter(user__username='other').afirst()
+        response = await self.client.delete(reverse('async-task-detail', args=[other_task.pk]), headers=self.headers)
+        self.assertEqual(response.status_code, 404)
+
+    async def test_requires_authentication(self):
+        response = await AsyncClient().get(reverse('async-task-list'))
+        self.assertEqual(response.status_code, 401)
+        response = await AsyncClient().get(reverse('async-task-list'), headers={'Authorization': 'Bearer nope'})
+        self.assertEqual(response.status_code, 401)
+
+
+class TaskEventStreamTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('owner')
+        self.access = str(UserRefreshToken.for_user(self.user).access_token)
+        broker = get_broker()
+        # Publishing starts with the first stream the process serves
+        broker.active = True
+        self.cursor = broker.event_id(broker.last_sequence)
+
+    async def read_stream(self, count, **kwargs):
+        response = await AsyncClient().get(reverse('async-task-events'), **kwargs)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        messages = []
+        async for chunk in response.streaming_content:
+            messages.append(chunk.decode())
+            if len(messages) == count:
+                break
+        return messages
+
+    def parse(self, message):
+        fields = dict(line.split(': ', 1) for line in message.strip().split('\n'))
+        return fields['event'], json.loads(fields['data'])
+
+    def test_stream_is_not_served_under_wsgi(self):
+        response = self.client.get(reverse('async-task-events'), HTTP_AUTHORIZATION=f'Bearer {self.access}')
+        self.assertEqual(response.status_code, 501)
+
+    def test_resume_replays_committed_changes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            task = Task.objects.create(user=self.user, title='New', description='x', deadline=date(2030, 1, 1))
+        with self.captureOnCommitCallbacks(execute=True):
+            task.status = 'completed'
+            task.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            bulk_create_tasks([Task(user=self.user, title='Bulk', description='x', deadline=date(2030, 1, 1))])
+            create_tasks(User.objects.create_user('other'), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            Task.objects.filter(pk=task.pk).delete()
+
+        messages = async_to_sync(self.read_stream)(
+            5, headers={'Authorization': f'Bearer {self.access}', 'Last-Event-ID': self.cursor}
+        )
+        self.assertTrue(messages[0].startswith('retry: '))
+        events = [self.parse(message) for message in messages[1:]]
+        self.assertEqual([event for event, _ in events], ['created', 'updated', 'created', 'deleted'])
+        self.assertEqual(events[1][1]['status'], 'completed')
+        self.assertEqual(events[2][1]['title'], 'Bulk')
+        self.assertEqual(events[3][1], {'id': task.pk})
+
+    def test_unknown_event_id_resets_and_token_in_query(self):
+        messages = async_to_sync(self.read_stream)(
+            2, QUERY_STRING=f'access_token={self.access}', headers={'Last-Event-ID': 'stale-1'}
+        )
+        self.assertEqual(self.parse(messages[1]), ('reset', {}))
+        self.assertEqual(async_to_sync(AsyncClient().get)(reverse('async-task-events')).status_code, 401)
+
+    async def test_slow_consumer_is_reset(self):
+        broker = InProcessBroker(backlog=2, queue_size=2)
+        subscription = broker.subscribe(1)
+        for i in range(4):
+            broker.publish(1, 'updated', {'id': i})
+        await asyncio.sleep(0)
+        events = [subscription.queue.get_nowait() for _ in range(subscription.queue.qsize())]
+        self.assertEqual([event['type'] for event in events], ['updated', 'updated', 'reset'])
+        # Resuming from the reset replays what followed it; older ids were evicted
+        self.assertEqual(len(broker.replay(1, events[-1]['id'])), 1)
+        self.assertIsNone(broker.replay(1, events[0]['id']))
+        broker.unsubscribe(subscription)
+        self.assertEqual(broker.subscribers, {})
+
+    def test_history_is_kept_for_recent_writers_only(self):
+        broker = InProcessBroker(max_users=2)
+        first = broker.publish(1, 'created', {'id': 1})
+        broker.publish(2, 'created', {'id': 2})
+        broker.publish(1, 'updated', {'id': 1})
+        broker.publish(3, 'created', {'id': 3})
+        self.assertEqual(list(broker.history), [1, 3])
+        # User 2's event is gone, so a client that hadn't seen it must reset
+        self.assertIsNone(broker.replay(2, first['id']))
+        self.assertEqual(len(broker.replay(1, first['id'])), 1)
+
+    def test_nothing_is_published_before_a_stream_is_served(self):
+        broker = InProcessBroker()
+        with patch('tasks.events.get_broker', return_value=broker), \
+                self.captureOnCommitCallbacks(execute=True):
+            task = Task.objects.create(user=self.user, title='New', description='x', deadline=date(2030, 1, 1))
+            bulk_create_tasks([Task(user=self.user, title='Bulk', description='x', deadline=date(2030, 1, 1))])
+            task.delete()
+        self.assertEqual((broker.last_sequence, len(broker.history)), (0, 0))
+
+
+def make_image(size=(800, 600), exif=True, color='red'):
+    image = Image.new('RGB', size, color)
+    buffer = BytesIO()
+    if exif:
+        metadata = Image.Exif()
+        metadata[0x010F] = 'Camera maker'
+        image.save(buffer, format='JPEG', exif=metadata)
+    else:
+        image.save(buffer, format='JPEG')
+    return SimpleUploadedFile('photo.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+
+class ProfilePhotoPipelineTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.media_root = media.name
+        settings_override = override_settings(MEDIA_ROOT=media.name, PROFILE_PHOTO_PROCESSING='sync')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = User.objects.create_user('owner')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def fresh_client(self):
+        # A new User instance per request, as JWT authentication would load
+        self.client.force_authenticate(User.objects.get(pk=self.user.pk))
+        return self.client
+
+    def upload(self, image=None):
+        self.fresh_client()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            response = self.client.patch(
+                reverse('update-profile'), {'photo': image or make_image()}, format='multipart'
+            )
+        self.assertEqual(response.status_code, 200)
+        # The response is sent before the photo is processed
+        self.assertEqual(response.data['data']['photo_status'], 'processing')
+        self.assertEqual(len(callbacks), 1)
+
+    def stored_files(self):
+        return sorted(
+            os.path.relpath(os.path.join(root, name), self.media_root)
+            for root, _, names in os.walk(self.media_root) for name in names
+        )
+
+    def test_thumbnails_are_resized_and_stripped(self):
+        self.upload()
+        response = self.fresh_client().get(reverse('user-profile'))
+        self.assertEqual(response.data['photo_status'], 'ready')
+        self.assertEqual(set(response.data['thumbnails']), {'small', 'medium', 'large'})
+        self.assertTrue(response.data['photo'].endswith('_medium_256.jpg'))
+
+        profile = UserProfile.objects.get(user=self.user)
+        with Image.open(os.path.join(self.media_root, profile.thumbnails['large']['jpeg'])) as large:
+            self.assertEqual(large.size, (800, 600))
+            self.assertEqual(dict(large.getexif()), {})
+        with Image.open(os.path.join(self.media_root, profile.thumbnails['small']['webp'])) as small:
+            self.assertEqual((small.format, small.size), ('WEBP', (64, 48)))
+
+    def test_new_upload_deletes_superseded_files(self):
+        self.upload()
+        first = self.stored_files()
+        self.upload(make_image(color='blue'))
+        second = self.stored_files()
+        self.assertEqual(len(first), len(second))
+        self.assertFalse(set(first) & set(second))
+
+    def test_identical_uploads_share_files(self):
+        self.upload()
+        files = self.stored_files()
+        self.assertRegex(UserProfile.objects.get(user=self.user).photo.name, r'^profile_photos/[0-9a-f]{64}\.jpg$')
+
+        # Re-uploading the same photo keeps its files
+        self.upload()
+        self.assertEqual(self.stored_files(), files)
+
+        # Another user uploading it adds nothing, and the first user moving
+        # on doesn't delete what the second still uses
+        self.user, first_user = User.objects.create_user('other'), self.user
+        self.upload()
+        self.assertEqual(self.stored_files(), files)
+        self.user = first_user
+        self.upload(make_image(color='blue'))
+        other = UserProfile.objects.get(user__username='other')
+        self.assertTrue(set(profile_files(other)) <= set(self.stored_files()))
+
+
+class BenchmarkCommandTests(APITestCase):
+    def test_seed_is_reproducible(self):
+        call_command('seed_benchmark_data', users=3, tasks=4, seed=7, stdout=StringIO())
+        first = list(Task.objects.order_by('id').values_list('title', 'status', 'priority', 'deadline'))
+        self.assertEqual(len(first), 12)
+        self.assertEqual(get_user_stats(bench_users().first().pk)['total_tasks'], 4)
+        self.assertEqual(UserProfile.objects.filter(user__in=bench_users()).count(), 3)
+
+        # Deleting users cascades through their tasks and counters
+        call_command('seed_benchmark_data', users=3, tasks=4, seed=7, clear=True, stdout=StringIO())
+        second = list(Task.objects.order_by('id').values_list('title', 'status', 'priority', 'deadline'))
+        self.assertEqual(first, second)
+        self.assertEqual(TaskStats.objects.filter(count__lt=0).count(), 0)
+
+    def test_run_benchmarks_report_and_compare(self):
+        call_command('seed_benchmark_data', users=2, tasks=5, stdout=StringIO())
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'baseline.json')
+            call_command('run_benchmarks', iterations=2, output=path, stdout=StringIO())
+            with open(path) as f:
+                report = json.load(f)
+            self.assertEqual(report['kind'], 'micro')
+            self.assertEqual(report['environment']['tasks'], 10)
+            self.assertIn('superuser_dashboard', report['results'])
+            self.assertEqual(report['results']['jwt_auth_stateless']['n'], 2)
+
+            out = StringIO()
+            call_command('run_benchmarks', iterations=2, only=['serialize_100_tasks'], compare=path, stdout=out)
+            self.assertRegex(out.getvalue(), r'serialize_100_tasks +[\d.]+ +[\d.]+ +[+-][\d.]+%')
+
+
+@override_settings(REQUEST_METRICS_SAMPLE_RATE=1)
+class RequestMetricsTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        metrics_registry.reset()
+        self.addCleanup(metrics_registry.reset)
+        self.user = User.objects.create_user('owner')
+        create_tasks(self.user, 3)
+        self.headers = {'Authorization': f'Bearer {UserRefreshToken.for_user(self.user).access_token}'}
+
+    def test_sampled_requests_are_recorded(self):
+        response = self.client.get(reverse('task-list'), headers=self.headers)
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="2 queries", app;dur=[\d.]+, total;dur=[\d.]+$')
+        # Later requests are answered from the task list cache
+        for _ in range(2):
+            self.client.get(reverse('task-list'), headers=self.headers)
+
+        routes = metrics_registry.snapshot()
+        self.assertEqual(routes['GET /api/tasks/list/']['requests'], 3)
+        self.assertEqual(routes['GET /api/tasks/list/']['queries'], {'p50': 0, 'p95': 2, 'p99': 2})
+
+    def test_async_views_are_measured(self):
+        async_to_sync(AsyncClient().get)(reverse('async-task-list'), headers=self.headers)
+        self.assertEqual(metrics_registry.snapshot()['GET /api/async/tasks/list/']['queries']['p50'], 1)
+
+    @override_settings(REQUEST_METRICS_DUPLICATE_THRESHOLD=2)
+    def test_repeated_queries_are_flagged(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        tasks = Task.objects.filter(user=self.user)
+        with self.assertLogs('tasks.metrics', 'WARNING') as logs:
+            # One TaskStats UPDATE for the old and one for the new status
+            client.patch(reverse('task-bulk'), [{'id': task.id, 'status': 'completed'} for task in tasks], format='json')
+        self.assertIn('PATCH /api/tasks/bulk/ ran the same query', logs.output[0])
+        self.assertEqual(metrics_registry.snapshot()['PATCH /api/tasks/bulk/']['duplicate_query_requests'], 1)
+
+    @override_settings(REQUEST_METRICS_SAMPLE_RATE=0)
+    def test_sampling_off(self):
+        response = self.client.get(reverse('task-list'), headers=self.headers)
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(metrics_registry.snapshot(), {})
+
+    def test_metrics_endpoint_is_admin_only(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertEqual(client.get(reverse('superuser-request-metrics')).status_code, 403)
+
+        client.force_authenticate(User.objects.create_superuser('admin'))
+        response = client.get(reverse('superuser-request-metrics'))
+        self.assertEqual(response.data['data']['sample_rate'], 1)
+        self.assertIn('GET /api/superuser/metrics/', client.get(reverse('superuser-request-metrics')).data['data']['routes'])
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class UserProfileQueryTests(APITestCase):
+    def test_register_login_and_update_cost(self):
+        client = APIClient()
+        # Username check, user INSERT, profile INSERT and the user's token
+        # generation for the issued tokens (cached afterwards)
+        with self.assertNumQueries(4):
+            response = client.post(reverse('register'), {
+                'username': 'new', 'password': 'Secret-pass-123', 'email': 'new@example.com'
+            })
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(UserProfile.objects.filter(user__username='new').exists())
+
+        with self.assertNumQueries(1):
+            response = client.post(reverse('token_obtain_pair'), {'username': 'new', 'password': 'Secret-pass-123'})
+        self.assertEqual(response.status_code, 200)
+
+        # Session login: user lookup, last_login UPDATE, the session writes
+        # (7 with savepoints) and the token generation, with no profile queries
+        User.objects.create_superuser('admin', 'admin@example.com', 'Secret-pass-123')
+        with self.assertNumQueries(10):
+            response = APIClient().post(reverse('superuser_login'), {'username': 'admin', 'password': 'Secret-pass-123'})
+        self.assertEqual(response.status_code, 200)
+
+        # Email check, profile SELECT for the response, one UPDATE
+        client.force_authenticate(User.objects.get(username='new'))
+        with self.assertNumQueries(3):
+            response = client.patch(reverse('update-profile'), {'email': 'other@example.com'}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+
+    def test_replaced_photo_is_deleted_without_refetch(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        with override_settings(MEDIA_ROOT=media.name):
+            profile = UserProfile.objects.get(user=User.objects.create_user('owner'))
+            profile.photo.save('a.jpg', ContentFile(b'first'))
+            old_path = profile.photo.path
+
+            profile = UserProfile.objects.get(pk=profile.pk)
+            profile.photo.save('b.jpg', ContentFile(b'second'), save=False)
+            # UPDATE, then the reference check once committed
+            with self.assertNumQueries(2), self.captureOnCommitCallbacks(execute=True):
+                profile.save()
+            self.assertFalse(os.path.exists(old_path))
+            self.assertTrue(os.path.exists(profile.photo.path))
+
+
+# URLconf of MediaServingTests: the test runner turns DEBUG off, which unroutes media
+urlpatterns = media_urlpatterns
+
+
+@override_settings(MEDIA_SENDFILE=None, ROOT_URLCONF='tasks.tests')
+class MediaServingTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.name = photo_storage.save('profile_photos/photo.jpg', ContentFile(b'0123456789'))
+        with open(os.path.join(media.name, 'notes.txt'), 'wb') as f:
+            f.write(b'plain')
+        self.url = f'/media/{self.name}'
+
+    def test_content_addressed_files_are_immutable(self):
+        response = self.client.get(self.url)
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(response['ETag'], f'"{hashlib.sha256(b"0123456789").hexdigest()}"')
+
+        response = self.client.get('/media/notes.txt')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=3600')
+
+    def test_conditional_get(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_range_requests(self):
+        response = self.client.get(self.url, headers={'Range': 'bytes=2-5'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), b'2345')
+        self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+
+        response = self.client.get(self.url, headers={'Range': 'bytes=-3'})
+        self.assertEqual(b''.join(response.streaming_content), b'789')
+
+        response = self.client.get(self.url, headers={'Range': 'bytes=20-'})
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */10')
+
+        # A stale If-Range gets the whole file
+        response = self.client.get(self.url, headers={'Range': 'bytes=2-5', 'If-Range': '"stale"'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_sendfile_modes(self):
+        with override_settings(MEDIA_SENDFILE='x-accel-redirect', MEDIA_ACCEL_REDIRECT_PREFIX='/protected/'):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected/{self.name}')
+        self.assertEqual(response.content, b'')
+        self.assertIn('immutable', response['Cache-Control'])
+
+        with override_settings(MEDIA_SENDFILE='x-sendfile'):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Sendfile'], photo_storage.path(self.name))
+
+    def test_paths_outside_media_root_are_rejected(self):
+        self.assertEqual(self.client.get('/media/../manage.py').status_code, 400)
+        self.assertEqual(self.client.get('/media/missing.jpg').status_code, 404)
+
+    def test_media_is_only_routed_under_debug_or_sendfile(self):
+        self.addCleanup(importlib.reload, root_urls)
+        for debug, sendfile, routed in [(False, None, False), (True, None, True), (False, 'x-sendfile', True)]:
+            with self.settings(DEBUG=debug, MEDIA_SENDFILE=sendfile):
+                names = [getattr(pattern, 'name', None) for pattern in importlib.reload(root_urls).urlpatterns]
+            self.assertEqual('media' in names, routed)
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = self.rolled_back = False
+        self.alive = True
+
+    def close(self):
+        self.closed = True
+
+    def rollback(self):
+        self.rolled_back = True
+
+
+class ConnectionPoolTests(TestCase):
+    def make_pool(self, **options):
+        return ConnectionPool(
+            check=lambda connection: connection.alive,
+            reset=lambda connection: connection.rollback(),
+            **{'max_size': 2, 'timeout': 1, 'check_after': 0, **options},
+        )
+
+    def test_reuse_reset_and_health_check(self):
+        pool = self.make_pool()
+        first = pool.acquire(FakeConnection)
+        pool.release(first, reset=True)
+        self.assertTrue(first.rolled_back)
+        self.assertIs(pool.acquire(FakeConnection), first)
+
+        first.alive = False
+        pool.release(first)
+        replacement = pool.acquire(FakeConnection)
+        self.assertIsNot(replacement, first)
+        self.assertTrue(first.closed)
+        stats = pool.stats()
+        self.assertEqual((stats['created'], stats['reused'], stats['failed_checks']), (2, 1, 1))
+        self.assertEqual((stats['size'], stats['in_use']), (1, 1))
+
+    def test_bounded_size_waits_then_times_out(self):
+        pool = self.make_pool(max_size=1, timeout=0.05)
+        connection = pool.acquire(FakeConnection)
+        with self.assertRaises(PoolTimeout):
+            pool.acquire(FakeConnection)
+
+        pool.timeout = 5
+        timer = threading.Timer(0.05, pool.release, [connection])
+        timer.start()
+        self.assertIs(pool.acquire(FakeConnection), connection)
+        timer.join()
+        stats = pool.stats()
+        self.assertEqual((stats['timeouts'], stats['waits'], stats['created']), (1, 1, 1))
+        self.assertGreater(stats['max_wait_ms'], 0)
+
+    def test_expired_connections_are_closed(self):
+        pool = self.make_pool(max_lifetime=0)
+        connection = pool.acquire(FakeConnection)
+        pool.release(connection)
+        self.assertTrue(connection.closed)
+        self.assertEqual(pool.stats()['size'], 0)
+
+    def test_django_backend_returns_connections_to_pool(self):
+        with tempfile.TemporaryDirectory() as directory:
+            # A separate handler; the test database itself is in memory (never pooled)
+            handler = ConnectionHandler({'default': {
+                'ENGINE': 'tasks.db.backends.sqlite3',
+                'NAME': os.path.join(directory, 'pooled.sqlite3'),
+                'OPTIONS': {'pool': {'max_size': 1}},
+            }})
+            wrapper = handler['default']
+            try:
+                with wrapper.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+                raw = wrapper.connection
+                wrapper.close()
+                with wrapper.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+                self.assertIs(wrapper.connection, raw)
+                stats = get_pool_stats(handler)['default']
+                self.assertEqual((stats['created'], stats['checkouts'], stats['in_use']), (1, 2, 1))
+            finally:
+                wrapper.close()
+                wrapper.close_pool()
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], REPLICA_CHECK_INTERVAL=0)
+class ReplicaRouterTests(SimpleTestCase):
+    # No queries: the test transaction TestCase opens would keep reads on the primary
+    def setUp(self):
+        cache.clear()
+        replica_health.status.clear()
+        self.router = ReplicaRouter()
+
+    def in_request(self, user, *actions):
+        """Run the router methods named in actions during a request by user."""
+        middleware = ReplicaRoutingMiddleware(
+            lambda request: [getattr(self.router, action)(Task) for action in actions]
+        )
+        return middleware(SimpleNamespace(user=user))
+
+    @patch('tasks.routers.get_lag', return_value=0)
+    def test_reads_go_to_replica_and_writes_to_primary(self, get_lag):
+        self.assertEqual(self.router.db_for_read(Task), 'replica')
+        self.assertEqual(self.router.db_for_write(Task), 'default')
+        self.assertIs(self.router.allow_migrate('replica', 'tasks'), False)
+        self.assertIsNone(self.router.allow_migrate('default', 'tasks'))
+
+    def test_lagging_or_failing_replica_falls_back_to_primary(self):
+        with patch('tasks.routers.get_lag', return_value=60), self.assertLogs('tasks.routers', 'WARNING') as logs:
+            self.assertEqual(self.router.db_for_read(Task), 'default')
+        self.assertEqual(logs.output, ['WARNING:tasks.routers:Replica replica is not taking reads (lag: 60)'])
+
+        replica_health.status.clear()
+        with patch('tasks.routers.get_lag', side_effect=OperationalError('down')), \
+                self.assertLogs('tasks.routers', 'WARNING') as logs:
+            self.assertEqual(self.router.db_for_read(Task), 'default')
+        self.assertEqual(logs.output, ['WARNING:tasks.routers:Replica replica is not taking reads (lag: None, error: down)'])
+
+        with patch('tasks.routers.get_lag', return_value=1), self.assertLogs('tasks.routers', 'WARNING') as logs:
+            self.assertEqual(self.router.db_for_read(Task), 'replica')
+        self.assertEqual(logs.output, ['WARNING:tasks.routers:Replica replica is healthy again (lag: 1)'])
+
+    @patch('tasks.routers.get_lag', return_value=0)
+    def test_writer_reads_from_primary_for_sticky_window(self, get_lag):
+        writer, other = User(pk=1, username='writer'), User(pk=2, username='other')
+        self.assertEqual(self.in_request(writer, 'db_for_read', 'db_for_write', 'db_for_read'),
+                         ['replica', 'default', 'default'])
+        self.assertEqual(self.in_request(writer, 'db_for_read'), ['default'])
+        self.assertEqual(self.in_request(other, 'db_for_read'), ['replica'])
+        with override_settings(REPLICA_STICKY_SECONDS=0):
+            cache.delete(pin_key(writer.pk))
+            self.in_request(writer, 'db_for_write')
+        self.assertEqual(self.in_request(writer, 'db_for_read'), ['replica'])
+
+
+class ReplicaStickinessTests(APITestCase):
+    @override_settings(DATABASE_REPLICAS=['replica'])
+    def test_creating_a_task_pins_the_user(self):
+        user = User.objects.create_user('owner')
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+        self.client.get(reverse('task-list'))
+        self.assertIsNone(cache.get(pin_key(user.pk)))
+        self.client.post(reverse('task-create'), {
+            'title': 'T', 'description': 'x', 'deadline': '2030-01-01', 'priority': 'high',
+        })
+        self.assertTrue(cache.get(pin_key(user.pk)))
+
+
+@override_settings(TASK_SHARDS=['default', 'shard1'], TASK_SHARD_MOVE_GRACE=0)
+@skipUnless('shard1' in settings.DATABASES, 'needs the shard1 database of task_management.settings_test')
+class TaskShardingTests(APITestCase):
+    databases = {'default', 'shard1'}
+
+    def setUp(self):
+        super().setUp()
+        # Task ids must not overlap between shards
+        with connections['shard1'].cursor() as cursor:
+            cursor.execute("UPDATE sqlite_sequence SET seq = 1000000 WHERE name = 'tasks_task'")
+            if not cursor.rowcount:
+                cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('tasks_task', 1000000)")
+        self.user = User.objects.create_user('sharded')
+        set_placement(self.user.pk, 'shard1')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_task(self, title='Shard task'):
+        with self.captureOnCommitCallbacks(using='shard1', execute=True):
+            response = self.client.post(reverse('task-create'), {
+                'title': title, 'description': 'x', 'deadline': '2030-01-01', 'priority': 'high',
+            })
+        self.assertEqual(response.status_code, 201)
+        return Task.objects.using('shard1').get(title=title)
+
+    def test_user_constraints_are_kept_off_shards_only(self):
+        def user_fks(alias, table):
+            connection = connections[alias]
+            with connection.cursor() as cursor:
+                constraints = connection.introspection.get_constraints(cursor, table)
+            return [c for c in constraints.values() if c['foreign_key'] and c['foreign_key'][0] == 'auth_user']
+
+        for table in ('tasks_task', 'tasks_taskstats', 'tasks_tasksearchterm', 'tasks_archivedtask'):
+            self.assertEqual(len(user_fks('default', table)), 1)
+            self.assertEqual(user_fks('shard1', table), [])
+
+    def test_adding_a_shard_only_moves_keys_to_it(self):
+        before = HashRing(['default', 'shard1'])
+        after = HashRing(['default', 'shard1', 'shard2'])
+        moved = [key for key in range(1000) if before.get(key) != after.get(key)]
+        self.assertTrue(0 < len(moved) < 600)
+        self.assertEqual({after.get(key) for key in moved}, {'shard2'})
+
+    def test_new_users_are_placed_on_the_ring(self):
+        user = User.objects.create_user('new')
+        self.assertIn(UserShard.objects.get(user=user).shard, ['default', 'shard1'])
+
+    def test_user_tasks_live_on_their_shard(self):
+        task = self.create_task()
+        self.assertFalse(Task.objects.using('default').exists())
+        self.assertEqual(TaskStats.objects.using('shard1').get(user=self.user).count, 1)
+        self.assertTrue(TaskSearchTerm.objects.using('shard1').filter(task_id=task.pk).exists())
+
+        response = self.client.get(reverse('task-list'))
+        self.assertEqual([item['id'] for item in response.data['results']], [task.pk])
+
+        with self.captureOnCommitCallbacks(using='shard1', execute=True):
+            response = self.client.patch(reverse('task-update', args=[task.pk]), {'status': 'completed'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Task.objects.using('shard1').get().status, 'completed')
+
+        with self.captureOnCommitCallbacks(using='shard1', execute=True):
+            self.client.delete(reverse('task-delete', args=[task.pk]))
+        self.assertFalse(Task.objects.using('shard1').exists())
+        self.assertTrue(TaskTombstone.objects.using('shard1').filter(task_id=task.pk).exists())
+
+    def test_superuser_views_span_shards(self):
+        local = User.objects.create_user('local')
+        set_placement(local.pk, 'default')
+        create_tasks(local, 2)
+        task = self.create_task()
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_authenticate(admin)
+
+        response = self.client.get(reverse('superuser_dashboard'))
+        self.assertEqual(response.data['data']['stats']['total_tasks'], 3)
+        response = self.client.get(reverse('superuser_dashboard_tasks'))
+        self.assertEqual(len(response.data['results']), 3)
+        response = self.client.get(reverse('superuser_dashboard_users'))
+        counts = {item['username']: item['task_count'] for item in response.data['results']}
+        self.assertEqual((counts['sharded'], counts['local']), (1, 2))
+
+        response = self.client.patch(reverse('superuser-task-update', args=[task.pk]), {'title': 'Renamed'})
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(Task.objects.using('shard1').get().title, 'Renamed')
+
+    def test_writes_are_refused_while_moving(self):
+        set_placement(self.user.pk, 'shard1', moving=True)
+        response = self.client.post(reverse('task-create'), {
+            'title': 'T', 'description': 'x', 'deadline': '2030-01-01',
+        })
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.client.get(reverse('task-list')).status_code, 200)
+
+    def test_move_users_copies_and_switches(self):
+        with self.settings(TASK_SHARDS=[]):
+            user = User.objects.create_user('mover')
+            tasks = create_tasks(user, 3)
+            index_tasks(tasks)
+            archived = ArchivedTask.objects.create(
+                id=999, user=user, title='Old', description='x', priority='low', status='completed',
+                deadline=date(2020, 1, 1), created_at=timezone.now(), updated_at=timezone.now(),
+            )
+        self.assertEqual(get_placement(user.pk), ('default', False))
+
+        moved, failed = move_users([(user.pk, 'shard1')])
+        self.assertEqual((moved, failed), ({user.pk: 3}, {}))
+        self.assertEqual(get_placement(user.pk), ('shard1', False))
+        self.assertFalse(Task.objects.using('default').filter(user=user).exists())
+        copies = Task.objects.using('shard1').filter(user=user).order_by('id')
+        self.assertEqual(
+            [(task.pk, task.created_at) for task in copies],
+            [(task.pk, task.created_at) for task in tasks],
+        )
+        self.assertEqual(TaskStats.objects.using('shard1').get(user=user).count, 3)
+        self.assertTrue(ArchivedTask.objects.using('shard1').filter(id=archived.pk).exists())
+        self.assertFalse(ArchivedTask.objects.using('default').exists())
+        self.assertEqual(TaskSearchTerm.objects.using('shard1').filter(user=user, term='task').count(), 3)
+
+        out = StringIO()
+        call_command('rebalance_task_shards', user=[user.pk], to='default', stdout=out)
+        self.assertIn('Moved 3 tasks of 1 users', out.getvalue())
+        self.assertEqual(Task.objects.using('default').filter(user=user).count(), 3)
+
+
+class TaskArchiveTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('owner')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.old = create_tasks(self.user, 2, status='completed')
+        self.recent = create_tasks(self.user, 1, status='completed')
+        self.open = create_tasks(self.user, 1)
+        index_tasks(self.old + self.recent)
+        Task.objects.filter(id__in=[t.pk for t in self.old + self.open]).update(
+            updated_at=timezone.now() - timedelta(days=100)
+        )
+
+    def list_ids(self, **params):
+        response = self.client.get(reverse('task-list'), params)
+        return sorted(item['id'] for item in response.data['results'])
+
+    def test_archive_moves_old_completed_tasks(self):
+        old_ids = [t.pk for t in self.old]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(archive_tasks(batch_size=1), {None: 2})
+        self.assertEqual(sorted(ArchivedTask.objects.values_list('id', flat=True)), old_ids)
+        self.assertFalse(Task.objects.filter(id__in=old_ids).exists())
+        self.assertFalse(TaskSearchTerm.objects.filter(task_id__in=old_ids).exists())
+        self.assertEqual(get_user_stats(self.user.pk)['tasks_by_status']['completed'], 1)
+        self.assertEqual(sorted(TaskTombstone.objects.values_list('task_id', flat=True)), old_ids)
+
+        self.assertEqual(self.list_ids(), [self.recent[0].pk, self.open[0].pk])
+        every = sorted(t.pk for t in self.old + self.recent + self.open)
+        self.assertEqual(self.list_ids(include_archived='true'), every)
+        self.assertEqual(self.list_ids(include_archived='true', status='completed', search='task'),
+                         sorted(old_ids + [self.recent[0].pk]))
+
+        response = self.client.get(reverse('task-list'), {'include_archived': 'true', 'pagination': 'cursor', 'page_size': 3})
+        second = self.client.get(response.data['next'])
+        ids = [item['id'] for item in response.data['results'] + second.data['results']]
+        self.assertEqual(sorted(ids), every)
+
+    def test_restore_puts_tasks_back(self):
+        archive_tasks()
+        task = self.old[0]
+        response = self.client.post(reverse('task-restore'), {'ids': [task.pk, 999999]}, format='json')
+        self.assertEqual([item['status'] for item in response.data['data']], ['restored', 'not_found'])
+
+        restored = Task.objects.get(id=task.pk)
+        self.assertEqual(restored.created_at, task.created_at)
+        self.assertGreater(restored.updated_at, task.updated_at)
+        self.assertFalse(ArchivedTask.objects.filter(id=task.pk).exists())
+        self.assertFalse(TaskTombstone.objects.filter(task_id=task.pk).exists())
+        self.assertTrue(TaskSearchTerm.objects.filter(task_id=task.pk).exists())
+        self.assertEqual(get_user_stats(self.user.pk)['tasks_by_status']['completed'], 2)
+
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user('other'))
+        response = other.post(reverse('task-restore'), [self.old[1].pk], format='json')
+        self.assertEqual(response.data['data'][0]['status'], 'not_found')
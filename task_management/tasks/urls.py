@@ -4,10 +4,14 @@
 
 from django.urls import path
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
-from .views import RegisterView, LoginView, LogoutView
-from .views import TaskCreateView, TaskListView, TaskUpdateView, TaskDeleteView
+from .views import RegisterView, LoginView, LogoutView, LogoutAllView
+from .views import TaskCreateView, TaskListView, TaskUpdateView, TaskDeleteView, TaskBulkView, TaskStatsView, TaskExportView, TaskSyncView
+from .views import TaskRestoreView
 from .views import UserProfileView, UpdateProfileView
+from .async_views import AsyncTaskListView, AsyncTaskCreateView, AsyncTaskDetailView, AsyncTaskEventStreamView
 from .views import SuperuserLoginView,SuperuserDashboardView,SuperuserLogoutView,SuperuserTaskDeleteView,SuperuserUpdateView
+from .views import SuperuserDashboardUsersView, SuperuserDashboardTasksView, SuperuserTaskExportView
+from .views import SuperuserRequestMetricsView, SuperuserRevokeTokensView
 
 
 urlpatterns = [
@@ -22,6 +26,9 @@ urlpatterns = [
     
     # Logout view (invalidate session)
     path('logout/', LogoutView.as_view(), name='logout'),
+
+    # Revoke all of the user's refresh tokens (every device)
+    path('logout/all/', LogoutAllView.as_view(), name='logout-all'),
     
     # Endpoint for creating a new task
     path('tasks/', TaskCreateView.as_view(), name='task-create'),
@@ -35,6 +42,31 @@ urlpatterns = [
     # Endpoint to delete a task by ID
     path('tasks/delete/<int:pk>/', TaskDeleteView.as_view(), name='task-delete'),
 
+    # Endpoint for the user's task counts by status and priority
+    path('tasks/stats/', TaskStatsView.as_view(), name='task-stats'),
+
+    # Endpoint to download the user's tasks as csv or ndjson (accepts the task list filters)
+    path('tasks/export/<str:export_format>/', TaskExportView.as_view(), name='task-export'),
+
+    # Endpoint for incremental sync: tasks changed/deleted since a cursor
+    path('tasks/sync/', TaskSyncView.as_view(), name='task-sync'),
+
+    # Endpoint to create (POST), update (PATCH) or delete (DELETE) tasks in bulk
+    path('tasks/bulk/', TaskBulkView.as_view(), name='task-bulk'),
+
+    # Endpoint to move archived tasks back to the task list
+    path('tasks/archive/restore/', TaskRestoreView.as_view(), name='task-restore'),
+
+    # Async (ASGI) variants of the task endpoints above
+    path('async/tasks/', AsyncTaskCreateView.as_view(), name='async-task-create'),
+
+    path('async/tasks/list/', AsyncTaskListView.as_view(), name='async-task-list'),
+
+    path('async/tasks/<int:pk>/', AsyncTaskDetailView.as_view(), name='async-task-detail'),
+
+    # Server-Sent Events stream of changes to the user's tasks (ASGI only)
+    path('async/tasks/events/', AsyncTaskEventStreamView.as_view(), name='async-task-events'),
+
     # Endpoint to see user information
     path('user/profile/',UserProfileView.as_view(),name='user-profile'),
 
@@ -50,8 +82,21 @@ urlpatterns = [
     #Endpoint to superuser dashboard
     path('superuser/dashboard/', SuperuserDashboardView.as_view(), name='superuser_dashboard'),
 
+    #Endpoints to page through the users and tasks shown on the dashboard
+    path('superuser/dashboard/users/', SuperuserDashboardUsersView.as_view(), name='superuser_dashboard_users'),
+
+    path('superuser/dashboard/tasks/', SuperuserDashboardTasksView.as_view(), name='superuser_dashboard_tasks'),
+
     path('superuser/tasks/delete/<int:pk>/',SuperuserTaskDeleteView.as_view(),name='superuser-task-delete'),
 
     path('superuser/tasks/update/<int:pk>/',SuperuserUpdateView.as_view(),name='superuser-task-update'),
 
+    path('superuser/tasks/export/<str:export_format>/',SuperuserTaskExportView.as_view(),name='superuser-task-export'),
+
+    #Endpoint to revoke all refresh tokens of a user
+    path('superuser/users/<int:pk>/revoke-tokens/', SuperuserRevokeTokensView.as_view(), name='superuser-revoke-tokens'),
+
+    #Endpoint to per-route request latency and query percentiles
+    path('superuser/metrics/', SuperuserRequestMetricsView.as_view(), name='superuser-request-metrics'),
+
 ]
@@ -3,59 +3,350 @@ from rest_framework import status, generics
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
+from rest_framework.generics import get_object_or_404
 from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.settings import api_settings
+from django.conf import settings
 from django.contrib.auth.models import User
-from rest_framework_simplejwt.tokens import RefreshToken
+from django.db import connections, transaction
+from django.db.models import Count, Q
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import parse_etags
+from rest_framework_simplejwt.exceptions import TokenError
 from django_filters.rest_framework import DjangoFilterBackend
-from .models import Task,UserProfile
+from .models import ArchivedTask,Task,UserProfile
+from .renderers import FastJSONRenderer
 from .serializers import (
     TaskSerializer, UserRegisterSerializer, LoginSerializer, 
-    UserProfileSerializer, UpdateProfileSerializer, SuperuserLoginSerializer
+    UserProfileSerializer, UpdateProfileSerializer, SuperuserLoginSerializer,
+    DashboardUserSerializer, DashboardTaskSerializer, task_row_serializer
+)
+from .filters import ArchivedTaskFilter, TaskFilter
+from .authentication import StatelessJWTAuthentication, UserRefreshToken
+from .pagination import DashboardCursorPagination, TaskKeysetPagination
+from .bulk import bulk_create_tasks, bulk_update_tasks
+from .images import profile_photo_data, replace_profile_photo, user_photo_data
+from .export import CONTENT_TYPES, EXPORT_FIELDS, export_response, with_usernames
+from .stats import batched_stats, get_task_counts, get_totals_by, get_user_stats
+from .archive import restore_tasks
+from .sharding import ScatterQuerySet, get_shard, scatter, sharding_enabled
+from .sync import CursorExpired, InvalidCursor, batched_tombstones, get_changes
+from .metrics import registry as metrics_registry
+from .db.pool import get_pool_stats
+from .revocation import revoke_all_tokens
+from .cache import (
+    get_cache_timeout, get_task_cache, get_task_list_version, task_list_cache_key, task_list_etag
 )
-from .filters import TaskFilter
 
 
 # Task List View: View tasks belonging to the logged-in user
 class TaskListView(generics.ListAPIView):
     serializer_class = TaskSerializer
+    authentication_classes = [StatelessJWTAuthentication]
     permission_classes = [IsAuthenticated]
     filter_backends = (DjangoFilterBackend,)
     filterset_class = TaskFilter
     ordering_fields = ['created_at', 'deadline']
     ordering = ['created_at']
+    renderer_classes = [FastJSONRenderer, *api_settings.DEFAULT_RENDERER_CLASSES]
 
     def get_queryset(self):
         # Restrict tasks to those belonging to the logged-in user
-        return Task.objects.filter(user=self.request.user)
+        return Task.objects.filter(user_id=self.request.user.pk)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.request.query_params.get('include_archived') not in ('1', 'true'):
+            return queryset
+        # Same filters over the user's archived tasks, merged into one list
+        # (newest first; ?search= results lose their relevance order here)
+        archived = ArchivedTaskFilter(
+            self.request.query_params, queryset=ArchivedTask.objects.filter(user_id=self.request.user.pk),
+            request=self.request,
+        ).qs
+        ordering = ('-created_at', '-id')
+        return ScatterQuerySet([queryset.order_by(*ordering), archived.order_by(*ordering)])
+
+    def list_rows(self):
+        # Read-only fast path: plain .values() rows converted by
+        # task_row_serializer, same output as TaskSerializer
+        queryset = self.filter_queryset(self.get_queryset()).values(*task_row_serializer.fields)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(task_row_serializer.many(page))
+        return Response(task_row_serializer.many(queryset))
+
+    def list(self, request, *args, **kwargs):
+        # Serve repeat requests from the per-user cache, or with a bare 304 when
+        # the client already holds the current page (If-None-Match).
+        user_id = request.user.pk
+        cache_key = task_list_cache_key(request, user_id, get_task_list_version(user_id))
+        etag = task_list_etag(cache_key)
+        headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        cache = get_task_cache()
+        data = cache.get(cache_key)
+        if data is None:
+            response = self.list_rows()
+            cache.set(cache_key, response.data, get_cache_timeout())
+        else:
+            response = Response(data)
+        for name, value in headers.items():
+            response[name] = value
+        return response
+
+    @property
+    def paginator(self):
+        # ?pagination=cursor (or following a cursor link) switches to keyset
+        # pagination; page-number pagination stays the default.
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params
+            if params.get('pagination') == 'cursor' or 'cursor' in params:
+                self._paginator = TaskKeysetPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
 
 
 # Task Create View: Create a new task linked to the logged-in user
 class TaskCreateView(generics.CreateAPIView):
     serializer_class = TaskSerializer
+    authentication_classes = [StatelessJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def perform_create(self, serializer):
         # Save the task with the current logged-in user
-        serializer.save(user=self.request.user)
+        serializer.save(user_id=self.request.user.pk)
 
 
 # Task Update View: Update tasks belonging to the logged-in user
 class TaskUpdateView(generics.UpdateAPIView):
     serializer_class = TaskSerializer
+    authentication_classes = [StatelessJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
         # Restrict updates to tasks belonging to the logged-in user
-        return Task.objects.filter(user=self.request.user)
+        return Task.objects.filter(user_id=self.request.user.pk)
 
 
 # Task Delete View: Delete tasks belonging to the logged-in user
 class TaskDeleteView(generics.DestroyAPIView):
+    authentication_classes = [StatelessJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
         # Restrict deletions to tasks belonging to the logged-in user
-        return Task.objects.filter(user=self.request.user)
+        return Task.objects.filter(user_id=self.request.user.pk)
+
+
+# Task Stats View: counts of the logged-in user's tasks by status and priority
+class TaskStatsView(APIView):
+    authentication_classes = [StatelessJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return Response({
+            'status': 'success',
+            'data': get_user_stats(request.user.pk)
+        }, status=status.HTTP_200_OK)
+
+
+# Task Sync View: tasks changed and deleted since the client's last sync.
+# Call without a cursor for a full sync, then pass back the returned cursor
+# (repeating while has_more is true); see tasks/sync.py.
+class TaskSyncView(APIView):
+    authentication_classes = [StatelessJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [FastJSONRenderer, *api_settings.DEFAULT_RENDERER_CLASSES]
+
+    def get(self, request):
+        try:
+            data = get_changes(request.user.pk, request.query_params.get('cursor'))
+        except InvalidCursor:
+            return Response({
+                'status': 'error',
+                'message': 'Invalid sync cursor'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        except CursorExpired:
+            return Response({
+                'status': 'error',
+                'message': 'Sync cursor has expired, sync again without a cursor'
+            }, status=status.HTTP_410_GONE)
+        return Response(data, headers={'Cache-Control': 'private, no-cache'})
+
+
+# Task Export View: stream the logged-in user's tasks as CSV or NDJSON,
+# honoring the same filters as the task list
+class TaskExportView(APIView):
+    authentication_classes = [StatelessJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return Task.objects.filter(user_id=self.request.user.pk)
+
+    def get(self, request, export_format):
+        if export_format not in CONTENT_TYPES:
+            return Response({
+                'status': 'error',
+                'message': f'Unsupported export format, use one of: {", ".join(CONTENT_TYPES)}'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        filterset = TaskFilter(request.query_params, queryset=self.get_queryset(), request=request)
+        if not filterset.is_valid():
+            return Response({
+                'status': 'error',
+                'message': 'Invalid filters',
+                'errors': filterset.errors
+            }, status=status.HTTP_400_BAD_REQUEST)
+        return self.export(filterset.qs, export_format)
+
+    def export(self, queryset, export_format):
+        return export_response(queryset, export_format)
+
+
+# Bulk Task View: create, update or delete many of the logged-in user's tasks
+# in one request. Each batch is validated up front with TaskSerializer(many=True)
+# and written with a single bulk query inside one transaction.
+class TaskBulkView(APIView):
+    authentication_classes = [StatelessJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get_max_items(self):
+        return getattr(settings, 'TASK_BULK_MAX_ITEMS', 500)
+
+    def error_response(self, message, errors=None):
+        data = {'status': 'error', 'message': message}
+        if errors is not None:
+            data['errors'] = errors
+        return Response(data, status=status.HTTP_400_BAD_REQUEST)
+
+    def get_ids(self, items):
+        # Returns a list of ints, or None when any id is missing/invalid
+        try:
+            ids = [int(item['id']) if isinstance(item, dict) else int(item) for item in items]
+        except (KeyError, TypeError, ValueError):
+            return None
+        return ids if len(set(ids)) == len(ids) else None
+
+    def post(self, request):
+        serializer = TaskSerializer(data=request.data, many=True, max_length=self.get_max_items())
+        if not serializer.is_valid():
+            return self.error_response('Invalid data', serializer.errors)
+
+        tasks = [Task(user_id=request.user.pk, **item) for item in serializer.validated_data]
+        bulk_create_tasks(tasks)
+
+        return Response({
+            'status': 'success',
+            'message': f'{len(tasks)} tasks created',
+            'data': [
+                {'index': index, 'status': 'created', 'task': TaskSerializer(task).data}
+                for index, task in enumerate(tasks)
+            ]
+        }, status=status.HTTP_201_CREATED)
+
+    def patch(self, request):
+        items = request.data
+        if not isinstance(items, list):
+            return self.error_response('Expected a list of tasks')
+        if len(items) > self.get_max_items():
+            return self.error_response(f'At most {self.get_max_items()} tasks per request')
+        ids = self.get_ids(items)
+        if ids is None:
+            return self.error_response('Every task needs a unique integer id')
+
+        serializer = TaskSerializer(data=items, many=True, partial=True)
+        if not serializer.is_valid():
+            return self.error_response('Invalid data', serializer.errors)
+
+        with transaction.atomic(using=get_shard(request.user.pk)):
+            tasks = Task.objects.select_for_update().filter(user_id=request.user.pk, id__in=ids).in_bulk()
+            missing = [task_id for task_id in ids if task_id not in tasks]
+            if missing:
+                return self.error_response('Tasks not found', [
+                    {'index': ids.index(task_id), 'id': task_id, 'status': 'not_found'}
+                    for task_id in missing
+                ])
+
+            fields = {'updated_at'}
+            now = timezone.now()
+            for task_id, attrs in zip(ids, serializer.validated_data):
+                task = tasks[task_id]
+                for name, value in attrs.items():
+                    setattr(task, name, value)
+                # bulk_update doesn't apply auto_now
+                task.updated_at = now
+                fields.update(attrs)
+
+            updated = bulk_update_tasks([tasks[task_id] for task_id in ids], fields)
+
+        return Response({
+            'status': 'success',
+            'message': f'{len(updated)} tasks updated',
+            'data': [
+                {'index': index, 'status': 'updated', 'task': TaskSerializer(task).data}
+                for index, task in enumerate(updated)
+            ]
+        }, status=status.HTTP_200_OK)
+
+    def delete(self, request):
+        items = request.data.get('ids') if isinstance(request.data, dict) else request.data
+        if not isinstance(items, list):
+            return self.error_response('Expected a list of task ids')
+        if len(items) > self.get_max_items():
+            return self.error_response(f'At most {self.get_max_items()} tasks per request')
+        ids = self.get_ids(items)
+        if ids is None:
+            return self.error_response('Task ids must be unique integers')
+
+        with transaction.atomic(using=get_shard(request.user.pk)):
+            queryset = Task.objects.filter(user_id=request.user.pk, id__in=ids)
+            existing = set(queryset.values_list('id', flat=True))
+            with batched_stats(), batched_tombstones():
+                queryset.delete()
+
+        return Response({
+            'status': 'success',
+            'message': f'{len(existing)} tasks deleted',
+            'data': [
+                {'index': index, 'id': task_id,
+                 'status': 'deleted' if task_id in existing else 'not_found'}
+                for index, task_id in enumerate(ids)
+            ]
+        }, status=status.HTTP_200_OK)
+
+
+# Task Restore View: move archived tasks of the logged-in user back to the
+# task list (tasks/archive.py)
+class TaskRestoreView(TaskBulkView):
+    http_method_names = ['post', 'options']
+
+    def post(self, request):
+        items = request.data.get('ids') if isinstance(request.data, dict) else request.data
+        if not isinstance(items, list):
+            return self.error_response('Expected a list of task ids')
+        if len(items) > self.get_max_items():
+            return self.error_response(f'At most {self.get_max_items()} tasks per request')
+        ids = self.get_ids(items)
+        if ids is None:
+            return self.error_response('Task ids must be unique integers')
+
+        tasks = {task.pk: task for task in restore_tasks(request.user.pk, ids)}
+
+        return Response({
+            'status': 'success',
+            'message': f'{len(tasks)} tasks restored',
+            'data': [
+                {'index': index, 'id': task_id, 'status': 'restored', 'task': TaskSerializer(tasks[task_id]).data}
+                if task_id in tasks else {'index': index, 'id': task_id, 'status': 'not_found'}
+                for index, task_id in enumerate(ids)
+            ]
+        }, status=status.HTTP_200_OK)
 
 
 # Register View: Create a new user
@@ -72,7 +363,7 @@ class RegisterView(generics.CreateAPIView):
                 user = serializer.save()
                 
                 # Generate tokens
-                refresh = RefreshToken.for_user(user)
+                refresh = UserRefreshToken.for_user(user)
                 access_token = str(refresh.access_token)
 
                 return Response({
@@ -83,7 +374,9 @@ class RegisterView(generics.CreateAPIView):
                             "id": user.id,
                             "username": user.username,
                             "email": user.email,
-                            "photo": None
+                            "photo": None,
+                            "thumbnails": {},
+                            "photo_status": "none"
                         },
                         "tokens": {
                             "access": access_token,
@@ -113,15 +406,7 @@ class LoginView(APIView):
         if serializer.is_valid():
             user = serializer.validated_data
             login(request, user)
-            refresh = RefreshToken.for_user(user)
-            
-            # Get photo URL if exists
-            photo_url = None
-            try:
-                if user.profile.photo:
-                    photo_url = request.build_absolute_uri(user.profile.photo.url)
-            except UserProfile.DoesNotExist:
-                pass
+            refresh = UserRefreshToken.for_user(user)
 
             return Response({
                 "message": "Logged in successfully!",
@@ -132,7 +417,7 @@ class LoginView(APIView):
                 "user": {
                     "username": user.username,
                     "email": user.email,
-                    "photo": photo_url
+                    **user_photo_data(request, user)  # Thumbnail URLs, never the original upload
                 }
             }, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -143,8 +428,26 @@ class LogoutView(APIView):
     permission_classes = [AllowAny]
 
     def post(self, request):
+        # Revoke the refresh token too, if the client sends it
+        refresh_token = request.data.get('refresh_token')
+        if refresh_token:
+            try:
+                UserRefreshToken(refresh_token).blacklist()
+            except TokenError:
+                pass  # Already invalid
         logout(request)
         return Response({"message": "Logged out successfully!"}, status=status.HTTP_200_OK)
+
+
+# Logout All View: revoke every refresh token issued to the logged-in user,
+# logging out all their devices once their access tokens expire
+class LogoutAllView(APIView):
+    authentication_classes = [StatelessJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        revoke_all_tokens(request.user.pk)
+        return Response({"message": "Logged out of all devices"}, status=status.HTTP_200_OK)
     
 
 # To see the user
@@ -157,18 +460,10 @@ class UserProfileView(generics.RetrieveAPIView):
 
     def retrieve(self, request, *args, **kwargs):
         user = self.request.user
-        # Get photo URL if exists
-        photo_url = None
-        try:
-            if user.profile.photo:
-                photo_url = request.build_absolute_uri(user.profile.photo.url)
-        except UserProfile.DoesNotExist:
-            pass
-
         return Response({
             'username': user.username,
             'email': user.email,
-            'photo': photo_url
+            **user_photo_data(request, user)
         })
 
 # To Update Profile
@@ -186,29 +481,32 @@ class UpdateProfileView(generics.UpdateAPIView):
             profile, created = UserProfile.objects.get_or_create(user=user)
 
             # Update basic info if provided
+            update_fields = []
             if 'username' in serializer.validated_data:
                 user.username = serializer.validated_data['username']
+                update_fields.append('username')
             if 'email' in serializer.validated_data:
                 user.email = serializer.validated_data['email']
+                update_fields.append('email')
             if 'password' in serializer.validated_data:
                 user.set_password(serializer.validated_data['password'])
+                update_fields.append('password')
             
-            # Update photo if provided
+            # Store the new photo; resizing happens in the background and
+            # photo_status stays 'processing' until the thumbnails are ready
             if 'photo' in serializer.validated_data:
-                profile.photo = serializer.validated_data['photo']
-                profile.save()
+                replace_profile_photo(profile, serializer.validated_data['photo'])
             
-            user.save()
-
-            # Get photo URL if exists
-            photo_url = request.build_absolute_uri(profile.photo.url) if profile.photo else None
+            # A photo-only update doesn't rewrite the user row
+            if update_fields:
+                user.save(update_fields=update_fields)
 
             return Response({
                 'message': 'Profile updated successfully',
                 'data': {
                     'username': user.username,
                     'email': user.email,
-                    'photo': photo_url
+                    **profile_photo_data(request, profile)
                 }
             })
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -223,7 +521,7 @@ class SuperuserLoginView(APIView):
         if serializer.is_valid():
             user = serializer.validated_data
             login(request, user)
-            refresh = RefreshToken.for_user(user)
+            refresh = UserRefreshToken.for_user(user)
 
             return Response({
                 'status': 'success',
@@ -256,7 +554,7 @@ class SuperuserLogoutView(APIView):
         try:
             refresh_token = request.data.get('refresh_token')
             if refresh_token:
-                token = RefreshToken(refresh_token)
+                token = UserRefreshToken(refresh_token)
                 token.blacklist()
             logout(request)
             return Response({
@@ -274,53 +572,22 @@ class SuperuserDashboardView(APIView):
     permission_classes = [IsAdminUser]
 
     def get(self, request):
-        # Get regular users (excluding admins) with their tasks
-        regular_users = User.objects.filter(is_superuser=False)
-        users_data = []
-        for user in regular_users:
-            user_tasks = Task.objects.filter(user=user)
-            tasks_data = [
-                {
-                    'id': task.id,
-                    'title': task.title,
-                    'description': task.description,
-                    'status': task.status,
-                    'deadline': task.deadline,
-                    'created_at': task.created_at
-                } for task in user_tasks
-            ]
-            
-            users_data.append({
-                'id': user.id,
-                'username': user.username,
-                'email': user.email,
-                'tasks': tasks_data
-            })
-
-        # Get admin users
-        admin_users = User.objects.filter(is_superuser=True)
-        admin_data = [
-            {
-                'id': admin.id,
-                'username': admin.username,
-                'email': admin.email
-            } for admin in admin_users
-        ]
-
-        # Get all tasks
-        all_tasks = Task.objects.all()
-        tasks_list = [
-            {
-                'id': task.id,
-                'title': task.title,
-                'description': task.description,
-                'priority':task.priority,
-                'status': task.status,
-                'deadline': task.deadline,
-                'created_at': task.created_at,
-                'user': task.user.username
-            } for task in all_tasks
-        ]
+        # Every stat comes from a grouped aggregate, so the dashboard runs a
+        # fixed number of queries no matter how many users or tasks exist.
+        # Users and tasks themselves are paged through the sub-resources below.
+        user_stats = User.objects.aggregate(
+            total_users=Count('id', filter=Q(is_superuser=False)),  # Only count regular users
+            total_admins=Count('id', filter=Q(is_superuser=True)),
+            active_users=Count('id', filter=Q(is_superuser=False, is_active=True)),
+        )
+        # Task counts come from the TaskStats counters, not the Task table
+        tasks_by_status = get_totals_by('status')
+        tasks_by_priority = get_totals_by('priority')
+
+        # Admin accounts are few, so they are still listed inline
+        admin_data = list(
+            User.objects.filter(is_superuser=True).order_by('id').values('id', 'username', 'email')
+        )
 
         return Response({
             'status': 'success',
@@ -333,19 +600,122 @@ class SuperuserDashboardView(APIView):
                     'is_staff': request.user.is_staff,
                 },
                 'stats': {
-                    'total_users': regular_users.count(),  # Only count regular users
-                    'total_tasks': Task.objects.count(),
-                    'total_admins': admin_users.count(),
-                    'active_users': regular_users.filter(is_active=True).count(),
+                    **user_stats,
+                    'total_tasks': sum(tasks_by_status.values()),
+                    'tasks_by_status': tasks_by_status,
+                    'tasks_by_priority': tasks_by_priority,
                 },
-                'users': users_data,  # Regular users with their tasks
                 'admin_users': admin_data,  # List of admin users
-                'all_tasks': tasks_list  # All tasks in the system
+                'links': {
+                    'users': request.build_absolute_uri(reverse('superuser_dashboard_users')),
+                    'tasks': request.build_absolute_uri(reverse('superuser_dashboard_tasks')),
+                },
             }
         }, status=status.HTTP_200_OK)
-    
+
+
+# Super user request metrics: per-route latency/query percentiles from the
+# sampled requests of this process (REQUEST_METRICS_SAMPLE_RATE)
+class SuperuserRequestMetricsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response({
+            'status': 'success',
+            'data': {
+                'sample_rate': settings.REQUEST_METRICS_SAMPLE_RATE,
+                'routes': metrics_registry.snapshot(),
+                # Connection pool usage and checkout waits of this process
+                'database_pools': get_pool_stats(connections),
+            }
+        }, status=status.HTTP_200_OK)
+
+    def delete(self, request):
+        metrics_registry.reset()
+        return Response({
+            'status': 'success',
+            'message': 'Request metrics reset'
+        }, status=status.HTTP_200_OK)
+
+
+# Super user dashboard: regular users with their task counts, cursor paginated
+class SuperuserDashboardUsersView(generics.ListAPIView):
+    permission_classes = [IsAdminUser]
+    serializer_class = DashboardUserSerializer
+    pagination_class = DashboardCursorPagination
+    filter_backends = ()
+
+    def get_queryset(self):
+        users = User.objects.filter(is_superuser=False)
+        if sharding_enabled():
+            # Tasks aren't on the users' database: counted per page instead
+            return users
+        return users.annotate(task_count=Count('tasks'))
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        if page is not None and sharding_enabled():
+            counts = get_task_counts([user.pk for user in page])
+            for user in page:
+                user.task_count = counts.get(user.pk, 0)
+        return page
+
+
+# Super user dashboard: all tasks in the system, cursor paginated
+class SuperuserDashboardTasksView(generics.ListAPIView):
+    permission_classes = [IsAdminUser]
+    serializer_class = DashboardTaskSerializer
+    pagination_class = DashboardCursorPagination
+    filter_backends = (DjangoFilterBackend,)
+    filterset_class = TaskFilter
+
+    def get_queryset(self):
+        if sharding_enabled():
+            # Owners are on 'default': one lookup per shard and page, not a join
+            return Task.objects.prefetch_related('user')
+        # Join the owner in the same query instead of one lookup per task
+        return Task.objects.select_related('user')
+
+    def paginate_queryset(self, queryset):
+        # Merges the page from every shard when sharded
+        return super().paginate_queryset(scatter(queryset))
+
         
-class SuperuserTaskDeleteView(generics.DestroyAPIView):
+# Super user export: stream every task in the system with its owner
+class SuperuserTaskExportView(TaskExportView):
+    authentication_classes = api_settings.DEFAULT_AUTHENTICATION_CLASSES
+    permission_classes = [IsAdminUser]
+
+    def get_queryset(self):
+        return Task.objects.all()
+
+    def export(self, queryset, export_format):
+        if sharding_enabled():
+            # Every shard's tasks, owners looked up per chunk instead of joined
+            return export_response(
+                scatter(queryset), export_format,
+                fields=EXPORT_FIELDS + ['user_id'],
+                headers=EXPORT_FIELDS + ['user'],
+                transform=with_usernames,
+            )
+        return export_response(
+            queryset, export_format,
+            fields=EXPORT_FIELDS + ['user__username'],
+            headers=EXPORT_FIELDS + ['user'],
+        )
+
+
+# Superuser task views act on any user's task: look it up on every shard
+class AnyShardTaskMixin:
+    def get_object(self):
+        queryset = scatter(self.filter_queryset(self.get_queryset()))
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        obj = get_object_or_404(queryset, **{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+
+class SuperuserTaskDeleteView(AnyShardTaskMixin, generics.DestroyAPIView):
     permission_classes=[IsAdminUser]
     queryset=Task.objects.all()
 
@@ -363,7 +733,7 @@ class SuperuserTaskDeleteView(generics.DestroyAPIView):
                 'message':str(e)
             },status=status.HTTP_400_BAD_REQUEST)
         
-class SuperuserUpdateView(generics.UpdateAPIView):
+class SuperuserUpdateView(AnyShardTaskMixin, generics.UpdateAPIView):
     permission_classes=[IsAdminUser]
     serializer_class=TaskSerializer
     queryset=Task.objects.all()
@@ -389,4 +759,20 @@ class SuperuserUpdateView(generics.UpdateAPIView):
             return Response({
                 'status':'error',
                 'message':str(e)
-            },status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+            },status=status.HTTP_400_BAD_REQUEST)
+
+# Revoke every refresh token of a user (e.g. a stolen device or a deactivated account)
+class SuperuserRevokeTokensView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def post(self, request, pk):
+        if not User.objects.filter(pk=pk).exists():
+            return Response({
+                'status': 'error',
+                'message': 'User not found'
+            }, status=status.HTTP_404_NOT_FOUND)
+        revoke_all_tokens(pk)
+        return Response({
+            'status': 'success',
+            'message': 'All refresh tokens of the user have been revoked'
+        }, status=status.HTTP_200_OK)